@@ -1,11 +1,14 @@
 package api
 
 import (
+	"bufio"
 	"bytes"
 	"context"
 	"encoding/json"
+	"fmt"
 	"io"
 	"net/http"
+	"strings"
 	"time"
 
 	"github.com/avangerus/kalita/internal/eventstore"
@@ -20,6 +23,15 @@ import (
 // scope entity (e.g. Workspace) -> POST {question, scope_ids} to the worker
 // -> journal the query as a record -> return the worker's answer.
 //
+// Streaming is opt-in ({"stream": true} or Accept: text/event-stream): the
+// worker's server-sent events (sources, token..., done) are relayed as they
+// arrive, so the first bytes reach the UI right after retrieval instead of
+// after the whole generation. The default stays one JSON body.
+//
+// The worker sheds load: when it is at capacity it answers 503 with
+// Retry-After, which is passed on as SEARCH_BUSY (503, same Retry-After);
+// an upstream timeout is SEARCH_TIMEOUT (504); any other failure is 502.
+//
 // Generic by config (knowvault is just the first user):
 //   --search-backend  worker URL
 //   --search-scope    entity whose visible records bound the search (Workspace)
@@ -39,6 +51,7 @@ func (s *Server) enableRAG(cfg ragConfig) {
 
 type searchRequest struct {
 	Question string `json:"question"`
+	Stream   bool   `json:"stream"`
 }
 
 func (s *Server) search(w http.ResponseWriter, r *http.Request) {
@@ -66,7 +79,8 @@ func (s *Server) search(w http.ResponseWriter, r *http.Request) {
 	}
 
 	// delegate the heavy lifting to the worker
-	body, _ := json.Marshal(map[string]any{"question": req.Question, "scope_ids": scopeIDs})
+	stream := req.Stream || strings.Contains(r.Header.Get("Accept"), "text/event-stream")
+	body, _ := json.Marshal(map[string]any{"question": req.Question, "scope_ids": scopeIDs, "stream": stream})
 	ctx, cancel := context.WithTimeout(r.Context(), 180*time.Second)
 	defer cancel()
 	proxyReq, _ := http.NewRequestWithContext(ctx, "POST", s.rag.Backend+"/search", bytes.NewReader(body))
@@ -79,19 +93,92 @@ func (s *Server) search(w http.ResponseWriter, r *http.Request) {
 		return
 	}
 	defer resp.Body.Close()
+	if resp.StatusCode >= 400 {
+		s.logSearch(r, actor, req.Question, scopeIDs, 0)
+		writeSearchFailure(w, resp)
+		return
+	}
+	if stream && strings.HasPrefix(resp.Header.Get("Content-Type"), "text/event-stream") {
+		s.logSearch(r, actor, req.Question, scopeIDs, relayEvents(w, resp.Body))
+		return
+	}
 	raw, _ := io.ReadAll(resp.Body)
 	var answer map[string]any
 	_ = json.Unmarshal(raw, &answer)
 
-	// journal the query as a record (provenance: who asked what)
-	if s.rag.LogEntity != "" {
-		nResults := 0
-		if srcs, ok := answer["sources"].([]any); ok {
-			nResults = len(srcs)
-		}
-		_, _ = s.eng.Create(r.Context(), actor, s.rag.LogEntity, map[string]any{
-			"workspace": scopeIDs[0], "query": req.Question, "actor_role": actor.Role, "results": nResults,
-		}, &eventstore.Basis{Type: "human", ID: actor.ID}, "")
+	nResults := 0
+	if srcs, ok := answer["sources"].([]any); ok {
+		nResults = len(srcs)
 	}
+	s.logSearch(r, actor, req.Question, scopeIDs, nResults)
 	writeJSON(w, http.StatusOK, answer)
 }
+
+// logSearch journals the query as a record (provenance: who asked what).
+func (s *Server) logSearch(r *http.Request, actor eventstore.Actor, question string, scopeIDs []string, nResults int) {
+	if s.rag.LogEntity == "" {
+		return
+	}
+	_, _ = s.eng.Create(r.Context(), actor, s.rag.LogEntity, map[string]any{
+		"workspace": scopeIDs[0], "query": question, "actor_role": actor.Role, "results": nResults,
+	}, &eventstore.Basis{Type: "human", ID: actor.ID}, "")
+}
+
+// writeSearchFailure maps a failed worker response to the node's error shape.
+func writeSearchFailure(w http.ResponseWriter, resp *http.Response) {
+	var fail struct {
+		Code    string `json:"code"`
+		Message string `json:"message"`
+	}
+	raw, _ := io.ReadAll(resp.Body)
+	_ = json.Unmarshal(raw, &fail)
+	if fail.Message == "" {
+		fail.Message = fmt.Sprintf("search worker answered %d", resp.StatusCode)
+	}
+	status, code, hint := http.StatusBadGateway, "SEARCH_UNAVAILABLE", "the search service failed — try again shortly"
+	switch resp.StatusCode {
+	case http.StatusServiceUnavailable:
+		status, code, hint = resp.StatusCode, "SEARCH_BUSY", "the search service is at capacity — retry after the Retry-After delay"
+		if ra := resp.Header.Get("Retry-After"); ra != "" {
+			w.Header().Set("Retry-After", ra)
+		}
+	case http.StatusGatewayTimeout:
+		status, code, hint = resp.StatusCode, "SEARCH_TIMEOUT", "the model or vector store did not answer in time — try again"
+	}
+	writeJSON(w, status, map[string]string{"code": code, "message": fail.Message, "fix_hint": hint})
+}
+
+// relayEvents copies the worker's server-sent events to the client, flushing
+// after every event, and returns the number of sources it announced.
+func relayEvents(w http.ResponseWriter, body io.Reader) int {
+	w.Header().Set("Content-Type", "text/event-stream")
+	w.Header().Set("Cache-Control", "no-cache")
+	w.WriteHeader(http.StatusOK)
+	flusher, _ := w.(http.Flusher)
+	nResults, event := 0, ""
+	sc := bufio.NewScanner(body)
+	sc.Buffer(make([]byte, 64*1024), 4<<20)
+	for sc.Scan() {
+		line := sc.Text()
+		if name, ok := strings.CutPrefix(line, "event: "); ok {
+			event = name
+		} else if data, ok := strings.CutPrefix(line, "data: "); ok && event == "sources" {
+			var ev struct {
+				Sources []any `json:"sources"`
+			}
+			if json.Unmarshal([]byte(data), &ev) == nil {
+				nResults = len(ev.Sources)
+			}
+		}
+		if _, err := io.WriteString(w, line+"\n"); err != nil {
+			break // the client went away
+		}
+		if line == "" && flusher != nil {
+			flusher.Flush()
+		}
+	}
+	if flusher != nil {
+		flusher.Flush()
+	}
+	return nResults
+}
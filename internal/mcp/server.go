@@ -3,11 +3,14 @@
 // same engine, same permission checks, same journal (MCP-CONTRACT-v0).
 //
 // v0 implements the protocol subset every MCP client uses: initialize,
-// tools/list, tools/call over streamable HTTP (single JSON responses).
+// tools/list, tools/call over streamable HTTP (single JSON responses), one
+// request or a JSON-RPC batch per POST.
 package mcp
 
 import (
+	"bytes"
 	"encoding/json"
+	"fmt"
 	"net/http"
 	"strings"
 	"sync"
@@ -60,25 +63,74 @@ type rpcResponse struct {
 	Error   *rpcError       `json:"error,omitempty"`
 }
 
+// maxBatch bounds one JSON-RPC batch: each call still counts against the
+// agent's rate limit, this only keeps a single request from holding a handler.
+const maxBatch = 100
+
 func (s *Server) ServeHTTP(w http.ResponseWriter, r *http.Request) {
 	if r.Method != http.MethodPost {
 		http.Error(w, "POST only", http.StatusMethodNotAllowed)
 		return
 	}
-	var req rpcRequest
-	if err := json.NewDecoder(r.Body).Decode(&req); err != nil {
+	var raw json.RawMessage
+	if err := json.NewDecoder(r.Body).Decode(&raw); err != nil {
 		writeRPC(w, rpcResponse{JSONRPC: "2.0", Error: &rpcError{Code: -32700, Message: "parse error"}})
 		return
 	}
-	// notifications get no response body
-	if req.ID == nil {
+	// a batch is an array of requests, answered by an array of responses
+	// (notifications omitted), matched by id: workers send independent
+	// bookkeeping calls (report_progress + complete_task) in one round-trip
+	if trimmed := bytes.TrimLeft(raw, " \t\r\n"); len(trimmed) > 0 && trimmed[0] == '[' {
+		var batch []json.RawMessage
+		if err := json.Unmarshal(raw, &batch); err != nil {
+			writeRPC(w, rpcResponse{JSONRPC: "2.0", Error: &rpcError{Code: -32700, Message: "parse error"}})
+			return
+		}
+		if len(batch) == 0 || len(batch) > maxBatch {
+			writeRPC(w, rpcResponse{JSONRPC: "2.0", Error: &rpcError{Code: -32600,
+				Message: fmt.Sprintf("invalid request: a batch holds 1 to %d calls", maxBatch)}})
+			return
+		}
+		out := make([]rpcResponse, 0, len(batch))
+		for _, item := range batch {
+			if resp := s.handleRaw(r, item); resp != nil {
+				out = append(out, *resp)
+			}
+		}
+		if len(out) == 0 {
+			w.WriteHeader(http.StatusAccepted)
+			return
+		}
+		w.Header().Set("Content-Type", "application/json")
+		_ = json.NewEncoder(w).Encode(out)
+		return
+	}
+	resp := s.handleRaw(r, raw)
+	if resp == nil {
+		// notifications get no response body
 		w.WriteHeader(http.StatusAccepted)
 		return
 	}
+	writeRPC(w, *resp)
+}
 
+// handleRaw decodes and handles one request; nil for a notification.
+func (s *Server) handleRaw(r *http.Request, raw json.RawMessage) *rpcResponse {
+	var req rpcRequest
+	if err := json.Unmarshal(raw, &req); err != nil {
+		return &rpcResponse{JSONRPC: "2.0", Error: &rpcError{Code: -32600, Message: "invalid request"}}
+	}
+	if req.ID == nil {
+		return nil
+	}
+	resp := s.handle(r, &req)
+	return &resp
+}
+
+func (s *Server) handle(r *http.Request, req *rpcRequest) rpcResponse {
 	switch req.Method {
 	case "initialize":
-		writeRPC(w, rpcResponse{JSONRPC: "2.0", ID: req.ID, Result: map[string]any{
+		return rpcResponse{JSONRPC: "2.0", ID: req.ID, Result: map[string]any{
 			"protocolVersion": protocolVersion,
 			"capabilities":    map[string]any{"tools": map[string]any{}},
 			"serverInfo":      map[string]any{"name": "kalita", "version": "0.1.0"},
@@ -86,29 +138,27 @@ func (s *Server) ServeHTTP(w http.ResponseWriter, r *http.Request) {
 			// agent at the grammar — the compact normative summary of the whole
 			// language — plus a canonical example to pattern-match against.
 			"instructions": "To author a pack, call `get_grammar` once: it returns the kalita DSL grammar summary (every block and type) plus a canonical example. Write packs against it, then `validate_dsl` to compile-check (fix by the structured errors), and `propose_change` to apply (a human signs). Field syntax is `name: type [modifiers]`. For structured authoring without DSL text you may instead use `compose_pack` (JSON in, validated DSL out).",
-		}})
+		}}
 	case "ping":
-		writeRPC(w, rpcResponse{JSONRPC: "2.0", ID: req.ID, Result: map[string]any{}})
+		return rpcResponse{JSONRPC: "2.0", ID: req.ID, Result: map[string]any{}}
 	case "tools/list":
-		writeRPC(w, rpcResponse{JSONRPC: "2.0", ID: req.ID, Result: map[string]any{"tools": toolDefs}})
+		return rpcResponse{JSONRPC: "2.0", ID: req.ID, Result: map[string]any{"tools": toolDefs}}
 	case "tools/call":
-		s.toolsCall(w, r, &req)
+		return s.toolsCall(r, req)
 	default:
-		writeRPC(w, rpcResponse{JSONRPC: "2.0", ID: req.ID,
-			Error: &rpcError{Code: -32601, Message: "method not found: " + req.Method}})
+		return rpcResponse{JSONRPC: "2.0", ID: req.ID,
+			Error: &rpcError{Code: -32601, Message: "method not found: " + req.Method}}
 	}
 }
 
-func (s *Server) toolsCall(w http.ResponseWriter, r *http.Request, req *rpcRequest) {
+func (s *Server) toolsCall(r *http.Request, req *rpcRequest) rpcResponse {
 	actor, errObj := s.authenticate(r)
 	if errObj != nil {
-		writeToolError(w, req.ID, errObj)
-		return
+		return toolError(req.ID, errObj)
 	}
 	if !s.allowRate(actor.ID) {
-		writeToolError(w, req.ID, map[string]any{
+		return toolError(req.ID, map[string]any{
 			"code": "RATE_LIMITED", "message": "rate limit exceeded", "retry_after": 60})
-		return
 	}
 
 	var call struct {
@@ -116,16 +166,14 @@ func (s *Server) toolsCall(w http.ResponseWriter, r *http.Request, req *rpcReque
 		Arguments json.RawMessage `json:"arguments"`
 	}
 	if err := json.Unmarshal(req.Params, &call); err != nil {
-		writeRPC(w, rpcResponse{JSONRPC: "2.0", ID: req.ID,
-			Error: &rpcError{Code: -32602, Message: "invalid params"}})
-		return
+		return rpcResponse{JSONRPC: "2.0", ID: req.ID,
+			Error: &rpcError{Code: -32602, Message: "invalid params"}}
 	}
 	result, terr := s.dispatch(r, actor, call.Name, call.Arguments)
 	if terr != nil {
-		writeToolError(w, req.ID, terr)
-		return
+		return toolError(req.ID, terr)
 	}
-	writeToolResult(w, req.ID, result, false)
+	return toolResult(req.ID, result, false)
 }
 
 // authenticate maps Bearer token → actor. Anonymous agents do not exist.
@@ -170,21 +218,20 @@ func writeRPC(w http.ResponseWriter, resp rpcResponse) {
 	_ = json.NewEncoder(w).Encode(resp)
 }
 
-// writeToolResult wraps a value as MCP tool content (single text block of JSON).
-func writeToolResult(w http.ResponseWriter, id json.RawMessage, v any, isErr bool) {
+// toolResult wraps a value as MCP tool content (single text block of JSON).
+func toolResult(id json.RawMessage, v any, isErr bool) rpcResponse {
 	text, _ := json.Marshal(v)
-	writeRPC(w, rpcResponse{JSONRPC: "2.0", ID: id, Result: map[string]any{
+	return rpcResponse{JSONRPC: "2.0", ID: id, Result: map[string]any{
 		"content": []map[string]any{{"type": "text", "text": string(text)}},
 		"isError": isErr,
-	}})
+	}}
 }
 
-// writeToolError reports a structured, self-correction-grade error as tool
+// toolError reports a structured, self-correction-grade error as tool
 // output (isError=true), not as a protocol failure: the agent reads it.
-func writeToolError(w http.ResponseWriter, id json.RawMessage, errObj any) {
+func toolError(id json.RawMessage, errObj any) rpcResponse {
 	if e, ok := errObj.(*engine.Err); ok {
-		writeToolResult(w, id, e, true)
-		return
+		return toolResult(id, e, true)
 	}
-	writeToolResult(w, id, errObj, true)
+	return toolResult(id, errObj, true)
 }
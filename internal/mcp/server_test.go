@@ -241,3 +241,57 @@ func TestMCPGrammar(t *testing.T) {
 		t.Fatalf("grammar example must compile: %v", errs[0])
 	}
 }
+
+// A JSON-RPC batch is answered by an array matched by id: notifications get
+// no entry, and one call's error does not fail its neighbours.
+func TestMCPBatch(t *testing.T) {
+	srv, collectorToken, _ := newMCP(t)
+	body := `[
+		{"jsonrpc": "2.0", "id": "a", "method": "tools/call", "params": {"name": "describe_system", "arguments": {}}},
+		{"jsonrpc": "2.0", "method": "notifications/initialized"},
+		{"jsonrpc": "2.0", "id": 7, "method": "tools/call", "params": {"name": "take_task", "arguments": {"task_id": "nope"}}},
+		{"jsonrpc": "2.0", "id": "c", "method": "no/such"}
+	]`
+	req, _ := http.NewRequest("POST", srv.URL, strings.NewReader(body))
+	req.Header.Set("Authorization", "Bearer "+collectorToken)
+	resp, err := http.DefaultClient.Do(req)
+	if err != nil {
+		t.Fatal(err)
+	}
+	defer resp.Body.Close()
+	var out []struct {
+		ID     json.RawMessage `json:"id"`
+		Result map[string]any  `json:"result"`
+		Error  *rpcError       `json:"error"`
+	}
+	if err := json.NewDecoder(resp.Body).Decode(&out); err != nil {
+		t.Fatal(err)
+	}
+	if len(out) != 3 {
+		t.Fatalf("want 3 responses (the notification has none), got %d", len(out))
+	}
+	byID := map[string]int{}
+	for i, r := range out {
+		byID[string(r.ID)] = i
+	}
+	if r := out[byID[`"a"`]]; r.Error != nil || r.Result["isError"] != false {
+		t.Fatalf("describe_system in a batch: %+v", r)
+	}
+	if r := out[byID[`7`]]; r.Error != nil || r.Result["isError"] != true {
+		t.Fatalf("take_task of an unknown task must be a tool error of its own: %+v", r)
+	}
+	if r := out[byID[`"c"`]]; r.Error == nil || r.Error.Code != -32601 {
+		t.Fatalf("unknown method in a batch: %+v", r)
+	}
+
+	req, _ = http.NewRequest("POST", srv.URL, strings.NewReader(`[]`))
+	resp, err = http.DefaultClient.Do(req)
+	if err != nil {
+		t.Fatal(err)
+	}
+	defer resp.Body.Close()
+	var empty rpcResponse
+	if err := json.NewDecoder(resp.Body).Decode(&empty); err != nil || empty.Error == nil || empty.Error.Code != -32600 {
+		t.Fatalf("an empty batch is an invalid request: %+v %v", empty, err)
+	}
+}
@@ -16,16 +16,34 @@ Run:
     KALITA_TOKEN=<engineer bearer token> \
     python runner.py
 or self-register with KALITA_BOOTSTRAP_SECRET + KALITA_WORKER_ID + _ROLE.
+MCP and LLM calls reuse keep-alive connections (httppool.py).
+
+Concurrency: KALITA_RUNNER_CONCURRENCY=N handles up to N tasks at once and
+keeps polling for more while busy. LLM calls in flight are capped separately
+(KALITA_RUNNER_LLM_CONCURRENCY, default 1 — one local model) from MCP calls
+(KALITA_RUNNER_MCP_CONCURRENCY, default 8). The default of 1 is the classic
+one-task-at-a-time loop.
+
+Settling a task (report_progress + complete_task) and leasing several offered
+tasks at once are each one JSON-RPC batch round-trip (mcpclient.py).
+
+MCP calls (by tool), LLM calls and whole tasks are timed (metrics.py); set
+KALITA_METRICS_LISTEN=host:port to serve them on /metrics.
 """
+import itertools
 import json
 import os
 import sys
+import threading
 import time
-import urllib.request
 import urllib.error
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from bootstrap import get_token  # noqa: E402
+from httppool import POOL  # noqa: E402
+import mcpclient  # noqa: E402
+import metrics  # noqa: E402
 
 NODE = os.environ.get("KALITA_URL", "http://127.0.0.1:8095")
 MCP_URL = NODE + "/mcp"
@@ -34,32 +52,36 @@ MCP_URL = NODE + "/mcp"
 LLM_URL = os.environ.get("KALITA_LLM_URL", "")
 LLM_MODEL = os.environ.get("KALITA_LLM_MODEL", "openai/gpt-oss-20b")
 LLM_KEY = os.environ.get("KALITA_LLM_KEY", "lm-studio")
-_id = 0
+CONCURRENCY = max(1, int(os.environ.get("KALITA_RUNNER_CONCURRENCY", "1")))
+_llm_slots = threading.BoundedSemaphore(max(1, int(os.environ.get("KALITA_RUNNER_LLM_CONCURRENCY", "1"))))
+_mcp_slots = threading.BoundedSemaphore(max(1, int(os.environ.get("KALITA_RUNNER_MCP_CONCURRENCY", "8"))))
+TASKS = metrics.histogram("kalita_runner_task_seconds", "Task handling time, take to settle, by result", ["result"])
+_ids = itertools.count(1)
+_ids_lock = threading.Lock()
+
+
+def next_id():
+    """JSON-RPC request id, unique across handler threads."""
+    with _ids_lock:
+        return next(_ids)
 
 
 def llm(messages):
     """One chat completion against the local OpenAI-compatible endpoint."""
-    body = json.dumps({"model": LLM_MODEL, "messages": messages,
-                       "temperature": 0.3, "max_tokens": 400}).encode()
-    req = urllib.request.Request(LLM_URL.rstrip("/") + "/chat/completions", data=body, headers={
-        "Content-Type": "application/json", "Authorization": "Bearer " + LLM_KEY})
-    with urllib.request.urlopen(req, timeout=180) as resp:
-        out = json.load(resp)
+    with _llm_slots, metrics.LLM_CALLS.time(op="chat"):
+        out = POOL.json(LLM_URL.rstrip("/") + "/chat/completions", {
+            "model": LLM_MODEL, "messages": messages, "temperature": 0.3, "max_tokens": 400,
+        }, {"Authorization": "Bearer " + LLM_KEY}, timeout=180)
     return out["choices"][0]["message"]["content"].strip()
 
 
 def mcp(token, name, arguments):
     """Call one MCP tool; return (payload, is_error). Payload is the tool's JSON."""
-    global _id
-    _id += 1
-    body = json.dumps({
-        "jsonrpc": "2.0", "id": _id, "method": "tools/call",
-        "params": {"name": name, "arguments": arguments},
-    }).encode()
-    req = urllib.request.Request(MCP_URL, data=body, headers={
-        "Authorization": "Bearer " + token, "Content-Type": "application/json"})
-    with urllib.request.urlopen(req, timeout=60) as resp:
-        out = json.load(resp)
+    with _mcp_slots, metrics.MCP_CALLS.time(tool=name):
+        out = POOL.json(MCP_URL, {
+            "jsonrpc": "2.0", "id": next_id(), "method": "tools/call",
+            "params": {"name": name, "arguments": arguments},
+        }, {"Authorization": "Bearer " + token}, timeout=60)
     if "error" in out:
         return out["error"], True
     res = out.get("result", {})
@@ -68,6 +90,12 @@ def mcp(token, name, arguments):
     return payload, bool(res.get("isError"))
 
 
+def mcp_batch(token, calls):
+    """Independent tool calls in one round-trip (mcpclient.py): [(payload, is_error)] in call order."""
+    with _mcp_slots:
+        return mcpclient.batch(MCP_URL, token, calls)
+
+
 def handle(token, task):
     """Do the work for one task. Returns (ok, message).
 
@@ -101,32 +129,90 @@ def handle(token, task):
     return True, ("worked + " if LLM_URL else "performed ") + action
 
 
+def process(token, t):
+    """Handle one taken task and settle its lease either way."""
+    started = time.perf_counter()
+    try:
+        ok, msg = handle(token, t)
+    except Exception as ex:  # never silently hang on the lease
+        ok, msg = False, "handler crashed: " + str(ex)
+    if ok:
+        mcp_batch(token, [("report_progress", {"task_id": t["id"], "note": msg}),
+                          ("complete_task", {"task_id": t["id"], "result": msg})])
+    else:
+        mcp(token, "fail_task", {"task_id": t["id"], "reason": msg})
+    TASKS.observe(time.perf_counter() - started, result="done" if ok else "failed")
+    print(("done " if ok else "failed ") + t["id"] + ": " + msg)
+
+
+def take(token, t):
+    """Lease one task; False if another worker got it first — fine, skip it."""
+    _, err = mcp(token, "take_task", {"task_id": t["id"]})
+    return not err
+
+
+def take_up_to(token, tasks, limit):
+    """Lease up to `limit` of the offered tasks, each round one batch of
+    take_task calls; the rest stay in the pool."""
+    offered, taken = list(tasks.get("tasks", [])), []
+    while offered and len(taken) < limit:
+        want, offered = offered[:limit - len(taken)], offered[limit - len(taken):]
+        results = mcp_batch(token, [("take_task", {"task_id": t["id"]}) for t in want])
+        taken += [t for t, (_, err) in zip(want, results) if not err]
+    return taken
+
+
 def run_once(token):
     tasks, _ = mcp(token, "wait_for_task", {"timeout_sec": 25})
-    for t in tasks.get("tasks", []):
-        _, err = mcp(token, "take_task", {"task_id": t["id"]})
-        if err:
-            continue  # lost the lease to another worker — fine, skip it
-        try:
-            ok, msg = handle(token, t)
-        except Exception as ex:  # never silently hang on the lease
-            ok, msg = False, "handler crashed: " + str(ex)
-        if ok:
-            mcp(token, "report_progress", {"task_id": t["id"], "note": msg})
-            mcp(token, "complete_task", {"task_id": t["id"], "result": msg})
-        else:
-            mcp(token, "fail_task", {"task_id": t["id"], "reason": msg})
-        print(("done " if ok else "failed ") + t["id"] + ": " + msg)
+    if CONCURRENCY == 1:
+        for t in tasks.get("tasks", []):
+            if take(token, t):
+                process(token, t)
+        return
+    taken = take_up_to(token, tasks, CONCURRENCY)
+    with ThreadPoolExecutor(CONCURRENCY, thread_name_prefix="task") as ex:
+        for f in [ex.submit(process, token, t) for t in taken]:
+            f.result()
+
+
+def run_concurrent(token):
+    """Keep up to CONCURRENCY tasks in flight; poll for more while busy."""
+    running = set()
+    with ThreadPoolExecutor(CONCURRENCY, thread_name_prefix="task") as ex:
+        while True:
+            for f in [f for f in running if f.done()]:
+                running.discard(f)
+                if f.exception() is not None:  # settling the lease failed; its TTL frees it
+                    print("task error:", f.exception())
+            if len(running) == CONCURRENCY:
+                wait(running, return_when=FIRST_COMPLETED)
+                continue
+            try:
+                # short polls while busy, so a freed slot is refilled promptly
+                tasks, _ = mcp(token, "wait_for_task", {"timeout_sec": 5 if running else 25})
+                for t in take_up_to(token, tasks, CONCURRENCY - len(running)):
+                    running.add(ex.submit(process, token, t))
+            except urllib.error.URLError as err:
+                print("node unreachable, retrying:", err)
+                time.sleep(5)
+            except Exception as err:
+                print("loop error:", err)
+                time.sleep(5)
 
 
 def main():
+    metrics.serve()
     token = get_token()
     role = os.environ.get("KALITA_WORKER_ROLE", "?")
     print("agent-runner online for role", role, "at", NODE,
-          ("with model " + LLM_MODEL) if LLM_URL else "(deterministic)")
+          ("with model " + LLM_MODEL) if LLM_URL else "(deterministic)",
+          "x%d" % CONCURRENCY if CONCURRENCY > 1 else "")
     if os.environ.get("KALITA_ONCE"):  # one cycle then exit — for demos and cron
         run_once(token)
         return
+    if CONCURRENCY > 1:
+        run_concurrent(token)
+        return
     while True:
         try:
             run_once(token)
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""End-to-end benchmark of the KnowVault workers and the agent runner.
+
+Starts stubs.py (node MCP, LM server, Qdrant) in a subprocess with the given
+latencies, writes a synthetic corpus, then runs the real worker code in this
+process against it:
+
+  index     indexer.index_source over the corpus (cold: empty caches)
+  reindex   the same source again — nothing changed, everything skipped
+  search    service.answer_question, --queries questions from --clients threads
+  runner    runner.run_once until --tasks tasks are done
+
+and prints one JSON object: docs/s, chunks/s, search p50/p95/p99, runner
+tasks/s, and the process's peak RSS after each phase (the stubs are a separate
+process and not counted). Compare the output across commits; the git commit
+and all parameters are in it.
+
+Usage:  python bench.py [--docs 200] [--doc-kb 8] [--chunk-size 512] [--queries 200]
+                        [--clients 8] [--tasks 100] [--embed-ms 5] [--chat-ms 20]
+                        [--qdrant-ms 1] [--dim 32] [--backend qdrant|local] [--out FILE]
+Worker env (KV_LAYOUT, KV_EMBED_BATCH, KALITA_RUNNER_CONCURRENCY, ...) is
+passed through, so a setting can be benchmarked by exporting it.
+Zero dependencies: stdlib only.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+WORKERS = os.path.dirname(HERE)
+SOURCE, WORKSPACE = "bench-source", "bench-ws"
+
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+
+def percentile(samples, p):
+    s = sorted(samples)
+    return round(s[min(len(s) - 1, int(len(s) * p / 100))], 2) if s else None
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_corpus(folder, docs, doc_kb, seed):
+    """`docs` text files of ~doc_kb KiB: paragraphs of common words plus a
+    few tokens unique to each document (ids, codes) for questions to hit."""
+    rng = random.Random(seed)
+    words = [f"w{i}" for i in range(2000)]
+    facts = []
+    for d in range(docs):
+        code = f"INV-{d:05d}/{rng.randint(10, 99)}"
+        facts.append(code)
+        paras, size = [], 0
+        while size < doc_kb * 1024:
+            para = " ".join(rng.choice(words) for _ in range(rng.randint(30, 90)))
+            if not paras:
+                para = f"Contract {code} amount {rng.randint(100, 99999)}. " + para
+            paras.append(para)
+            size += len(para) + 2
+        sub = os.path.join(folder, f"d{d % 10}")
+        os.makedirs(sub, exist_ok=True)
+        with open(os.path.join(sub, f"doc{d:05d}.txt"), "w", encoding="utf-8") as f:
+            f.write("\n\n".join(paras))
+    return facts
+
+
+def start_stubs(args):
+    proc = subprocess.Popen([sys.executable, os.path.join(HERE, "stubs.py"), "--dim", str(args.dim),
+                             "--embed-ms", str(args.embed_ms), "--embed-item-ms", str(args.embed_item_ms),
+                             "--chat-ms", str(args.chat_ms), "--qdrant-ms", str(args.qdrant_ms)],
+                            stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline().split()
+    if line[:1] != ["listening"]:
+        proc.kill()
+        sys.exit("stubs did not start")
+    return proc, f"http://127.0.0.1:{line[1]}"
+
+
+def stub(url, path, body=None):
+    req = urllib.request.Request(url + path, data=json.dumps(body).encode() if body is not None else None,
+                                 headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req) as resp:
+        return json.load(resp)
+
+
+def bench_index(indexer, url, task_id, corpus, status):
+    stub(url, "/_stub/seed", {"records": {SOURCE: {"entity": "Source", "values": {
+        "status": status, "workspace": WORKSPACE, "kind": "Files", "path": corpus}}}})
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        indexer.index_source({"id": task_id, "record_id": SOURCE})
+    seconds = time.perf_counter() - started
+    manifest = indexer.kvstate.load_json(indexer.manifest_path(SOURCE)) or {}
+    files = manifest.get("files", {})
+    docs, chunks = len(files), sum(e["chunks"] for e in files.values())
+    return {"docs": docs, "chunks": chunks, "seconds": round(seconds, 3),
+            "docs_per_s": round(docs / seconds, 1), "chunks_per_s": round(chunks / seconds, 1),
+            "peak_rss_mb": peak_rss_mb()}
+
+
+def bench_search(service, facts, queries, clients, seed):
+    rng = random.Random(seed)
+    questions = [f"What is the amount in contract {rng.choice(facts)}?" for _ in range(queries)]
+    latencies, errors, lock = [], [0], threading.Lock()
+    todo = iter(questions)
+
+    def client():
+        while True:
+            with lock:
+                q = next(todo, None)
+            if q is None:
+                return
+            t = time.perf_counter()
+            try:
+                service.answer_question(q, [WORKSPACE])
+            except Exception:  # noqa: BLE001 — counted, not fatal
+                with lock:
+                    errors[0] += 1
+                continue
+            with lock:
+                latencies.append((time.perf_counter() - t) * 1000)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    seconds = time.perf_counter() - started
+    return {"queries": queries, "clients": clients, "errors": errors[0], "qps": round(len(latencies) / seconds, 1),
+            "p50_ms": percentile(latencies, 50), "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99), "peak_rss_mb": peak_rss_mb()}
+
+
+def bench_runner(runner, url, tasks):
+    stub(url, "/_stub/seed", {
+        "records": {f"ticket-{i}": {"entity": "Ticket", "values": {"title": f"Ticket {i}", "status": "Open"}}
+                    for i in range(tasks)},
+        "tasks": [{"id": f"task-{i}", "entity": "Ticket", "record_id": f"ticket-{i}", "action": "close"}
+                  for i in range(tasks)]})
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        while stub(url, "/_stub/stats")["tasks_open"]:
+            runner.run_once("bench")
+    seconds = time.perf_counter() - started
+    return {"tasks": tasks, "concurrency": runner.CONCURRENCY, "seconds": round(seconds, 3),
+            "tasks_per_s": round(tasks / seconds, 1), "peak_rss_mb": peak_rss_mb()}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--docs", type=int, default=200)
+    ap.add_argument("--doc-kb", type=float, default=8)
+    ap.add_argument("--chunk-size", type=int, default=512)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--clients", type=int, default=8)
+    ap.add_argument("--tasks", type=int, default=100)
+    ap.add_argument("--embed-ms", type=float, default=5)
+    ap.add_argument("--embed-item-ms", type=float, default=0.2)
+    ap.add_argument("--chat-ms", type=float, default=20)
+    ap.add_argument("--qdrant-ms", type=float, default=1)
+    ap.add_argument("--dim", type=int, default=32)
+    ap.add_argument("--backend", choices=("qdrant", "local"), default="qdrant")
+    ap.add_argument("--answer-cache", action="store_true", help="keep the answer cache on (default off)")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", help="write the JSON here as well as to stdout")
+    args = ap.parse_args()
+
+    proc, url = start_stubs(args)
+    try:
+        with tempfile.TemporaryDirectory(prefix="kv-bench-") as tmp:
+            corpus = os.path.join(tmp, "corpus")
+            facts = write_corpus(corpus, args.docs, args.doc_kb, args.seed)
+            os.environ.update({
+                "KALITA_URL": url, "KALITA_TOKEN": "bench", "KALITA_LLM_URL": url + "/v1",
+                "KV_QDRANT": url, "KV_LM": url, "KV_STATE": os.path.join(tmp, "state"),
+                "KV_VECTOR_BACKEND": args.backend,
+            })
+            if not args.answer_cache:
+                os.environ["KV_ANSWER_CACHE_MAX"] = "0"
+            stub(url, "/_stub/seed", {"records": {
+                "bench-settings": {"entity": "VaultSettings", "values": {"chunk_size": args.chunk_size}}}})
+            # the workers read their env at import time
+            for sub in ("knowvault_indexer", "knowvault_search", "agent_runner"):
+                sys.path.insert(0, os.path.join(WORKERS, sub))
+            import indexer
+            import service
+            import runner
+
+            result = {"commit": git_commit(), "params": vars(args), "env": {
+                k: v for k, v in os.environ.items() if k.startswith(("KV_", "KALITA_RUNNER_", "KALITA_HTTP_"))
+                and k not in ("KV_QDRANT", "KV_LM", "KV_STATE")}}
+            result["index"] = bench_index(indexer, url, "bench-index", corpus, "New")
+            result["reindex"] = bench_index(indexer, url, "bench-reindex", corpus, "Failed")  # -> retry_index
+            result["search"] = bench_search(service, facts, args.queries, args.clients, args.seed)
+            result["runner"] = bench_runner(runner, url, args.tasks)
+            result["stub_counts"] = stub(url, "/_stub/stats")["counts"]
+    finally:
+        proc.kill()
+    out = json.dumps(result, indent=2)
+    print(out)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(out + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""Stand-ins for everything a KnowVault worker talks to, in one HTTP server:
+
+  /mcp                  the node's MCP JSON-RPC, single calls or batches:
+                        wait_for_task, take_task, get_record, query, act,
+                        update_record, comment, report_progress,
+                        complete_task, fail_task
+  /v1/embeddings        deterministic vectors (a hash of the text), --dim wide
+  /v1/chat/completions  a fixed answer, plain or streamed (SSE)
+  /collections/...      enough of Qdrant: create, info, update (PATCH),
+                        payload index, upsert, delete, scroll, payload
+                        overwrite, search (brute-force cosine, `must` filters)
+
+Latency is configurable per service, so a benchmark measures the worker's
+own overhead on top of a known floor. The bench seeds records and tasks over
+/_stub/seed and reads counters from /_stub/stats.
+
+Usage:  python stubs.py [--port 0] [--dim 32] [--embed-ms 0] [--embed-item-ms 0]
+                        [--chat-ms 0] [--qdrant-ms 0]
+Prints "listening <port>" once ready. Zero dependencies: stdlib only.
+"""
+import argparse
+import hashlib
+import heapq
+import json
+import math
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ANSWER = "According to the documents, the answer is in the cited sources."
+
+
+class State:
+    def __init__(self, dim):
+        self.dim = dim
+        self.lock = threading.Lock()
+        self.records = {}  # id -> {"values": {...}}
+        self.tasks = {}  # id -> task, in offer order
+        self.taken = set()
+        self.collections = {}  # name -> {id: (vector, payload)}
+        self.configs = {}  # name -> the creation body, as updated by PATCH
+        self.counts = {}
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+
+def vector(text, dim):
+    out, i = [], 0
+    while len(out) < dim:
+        digest = hashlib.sha256(f"{i}|{text}".encode()).digest()
+        out += [(b - 127.5) / 127.5 for b in digest]
+        i += 1
+    out = out[:dim]
+    norm = math.sqrt(sum(x * x for x in out)) or 1.0
+    return [x / norm for x in out]
+
+
+def matches(payload, flt):
+    for cond in (flt or {}).get("must", []):
+        match = cond["match"]
+        allowed = match["any"] if "any" in match else [match["value"]]
+        if payload.get(cond["key"]) not in allowed:
+            return False
+    return True
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real services
+    wbufsize = 1 << 16
+
+    def log_message(self, *_):
+        pass
+
+    def reply(self, obj, status=200):
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.route("GET")
+
+    def do_PUT(self):
+        self.route("PUT")
+
+    def do_POST(self):
+        self.route("POST")
+
+    def do_PATCH(self):
+        self.route("PATCH")
+
+    def do_DELETE(self):
+        self.route("DELETE")
+
+    def route(self, method):
+        n = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(n)) if n else {}
+        path = self.path.split("?", 1)[0]
+        if path == "/mcp":
+            if isinstance(body, list):  # a JSON-RPC batch: one round-trip, one response each
+                S.count("mcp.batch")
+                return self.reply([self.mcp(rpc) for rpc in body])
+            return self.reply(self.mcp(body))
+        if path == "/v1/embeddings":
+            return self.embeddings(body)
+        if path == "/v1/chat/completions":
+            return self.chat(body)
+        if path.startswith("/collections"):
+            return self.qdrant(method, path, body)
+        if path == "/_stub/seed":
+            with S.lock:
+                S.records.update(body.get("records", {}))
+                S.tasks.update((t["id"], t) for t in body.get("tasks", []))
+            return self.reply({"ok": True})
+        if path == "/_stub/stats":
+            with S.lock:
+                return self.reply({"counts": S.counts, "points": {c: len(p) for c, p in S.collections.items()},
+                                   "tasks_open": len(S.tasks) - len(S.taken)})
+        self.reply({"error": "not found"}, 404)
+
+    def mcp(self, rpc):
+        name, args = rpc["params"]["name"], rpc["params"].get("arguments", {})
+        S.count("mcp." + name)
+        out, err = {}, False
+        with S.lock:
+            if name == "wait_for_task":
+                out = {"tasks": [t for tid, t in S.tasks.items() if tid not in S.taken][:20]}
+            elif name == "take_task":
+                err = args["task_id"] in S.taken or args["task_id"] not in S.tasks
+                S.taken.add(args["task_id"])
+            elif name == "get_record":
+                out = S.records.get(args["id"], {"values": {}})
+            elif name == "query":
+                out = {"records": [{"id": rid, **r} for rid, r in S.records.items()
+                                   if r.get("entity") == args.get("entity")]}
+            elif name == "act":
+                rec = S.records.get(args["id"])
+                status = {"start_index": "Indexing", "retry_index": "Indexing", "finish_index": "Indexed",
+                          "fail_index": "Failed"}.get(args["action"])
+                if rec is not None and status:
+                    rec["values"]["status"] = status
+                out = {"status": "ok"}
+            elif name == "update_record":
+                S.records.setdefault(args["id"], {"values": {}})["values"].update(args.get("values", {}))
+        return {"jsonrpc": "2.0", "id": rpc.get("id"), "result": {
+            "content": [{"type": "text", "text": json.dumps(out)}], "isError": err}}
+
+    def embeddings(self, body):
+        texts = body["input"]
+        S.count("embeddings")
+        S.count("embedded_texts", len(texts))
+        time.sleep((ARGS.embed_ms + ARGS.embed_item_ms * len(texts)) / 1000)
+        self.reply({"data": [{"index": i, "embedding": vector(t, S.dim)} for i, t in enumerate(texts)]})
+
+    def chat(self, body):
+        S.count("chat")
+        time.sleep(ARGS.chat_ms / 1000)
+        if not body.get("stream"):
+            return self.reply({"choices": [{"message": {"role": "assistant", "content": ANSWER}}]})
+        out = b"".join(b"data: " + json.dumps({"choices": [{"delta": {"content": w + " "}}]}).encode() + b"\n\n"
+                       for w in ANSWER.split()) + b"data: [DONE]\n\n"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def qdrant(self, method, path, body):
+        time.sleep(ARGS.qdrant_ms / 1000)
+        if path == "/collections":
+            return self.reply({"result": {"collections": [{"name": c} for c in S.collections]}})
+        m = re.fullmatch(r"/collections/([^/]+)(/.*)?", path)
+        name, rest = m.group(1), m.group(2) or ""
+        S.count(f"qdrant.{method} {re.sub(r'/collections/[^/]+', '', path) or '/'}")
+        with S.lock:
+            if rest == "" and method == "PUT":
+                if name in S.collections:
+                    return self.reply({"status": {"error": "exists"}}, 409)
+                S.collections[name], S.configs[name] = {}, body
+                return self.reply({"result": True})
+            points = S.collections.get(name)
+            if points is None:
+                return self.reply({"status": {"error": f"Collection {name} not found"}}, 404)
+            config = S.configs[name]
+            if rest == "" and method == "DELETE":
+                del S.collections[name], S.configs[name]
+                return self.reply({"result": True})
+            if rest == "" and method == "GET":
+                return self.reply({"result": {"points_count": len(points), "config": {
+                    "params": {"vectors": config["vectors"], "on_disk_payload": config.get("on_disk_payload", False)},
+                    "quantization_config": config.get("quantization_config")}}})
+            if rest == "" and method == "PATCH":
+                config["vectors"].update(body.get("vectors", {}).get("", {}))
+                config.update(body.get("params", {}))
+                if "quantization_config" in body:
+                    q = body["quantization_config"]
+                    config["quantization_config"] = None if q == "Disabled" else q
+                return self.reply({"result": True})
+            if rest == "/index":
+                return self.reply({"result": {"status": "completed"}})
+            if rest == "/points" and method == "PUT":
+                for p in body["points"]:
+                    v = p["vector"]
+                    norm = math.sqrt(sum(x * x for x in v)) or 1.0
+                    points[str(p["id"])] = ([x / norm for x in v], p.get("payload") or {})
+                return self.reply({"result": {"status": "completed"}})
+            if rest == "/points/delete":
+                for pid in body["points"]:
+                    points.pop(str(pid), None)
+                return self.reply({"result": {"status": "completed"}})
+            if rest == "/points/scroll":
+                ids = sorted(points)
+                start = ids.index(body["offset"]) if body.get("offset") in points else 0
+                page = ids[start:start + body.get("limit", 10)]
+                nxt = ids[start + len(page)] if start + len(page) < len(ids) else None
+                return self.reply({"result": {"next_page_offset": nxt, "points": [
+                    {"id": pid, "payload": points[pid][1]} for pid in page]}})
+            if rest == "/points/batch":
+                for op in body["operations"]:
+                    for pid in op["overwrite_payload"]["points"]:
+                        if str(pid) in points:
+                            points[str(pid)] = (points[str(pid)][0], op["overwrite_payload"]["payload"])
+                return self.reply({"result": [{"status": "completed"}] * len(body["operations"])})
+            if rest != "/points/search":
+                return self.reply({"status": {"error": "unsupported"}}, 400)
+            items = list(points.items())  # score outside the lock: searches run in parallel
+        q = body["vector"]
+        norm = math.sqrt(sum(x * x for x in q)) or 1.0
+        q = [x / norm for x in q]
+        flt = body.get("filter")
+        best = heapq.nlargest(body["limit"], (
+            (sum(a * b for a, b in zip(q, v)), pid, payload)
+            for pid, (v, payload) in items if matches(payload, flt)))
+        self.reply({"result": [{"id": pid, "score": s, "payload": payload} for s, pid, payload in best]})
+
+
+def main():
+    global ARGS, S
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--port", type=int, default=0)
+    ap.add_argument("--dim", type=int, default=32)
+    ap.add_argument("--embed-ms", type=float, default=0, help="per embeddings request")
+    ap.add_argument("--embed-item-ms", type=float, default=0, help="per text in an embeddings request")
+    ap.add_argument("--chat-ms", type=float, default=0, help="per chat completion")
+    ap.add_argument("--qdrant-ms", type=float, default=0, help="per Qdrant request")
+    ARGS = ap.parse_args()
+    S = State(ARGS.dim)
+    srv = ThreadingHTTPServer(("127.0.0.1", ARGS.port), Handler)
+    srv.daemon_threads = True
+    print("listening", srv.server_address[1], flush=True)
+    srv.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
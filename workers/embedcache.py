@@ -0,0 +1,119 @@
+"""Content-addressed embedding cache shared by the KnowVault workers.
+
+Key is (model, sha256(text)), value the float32 vector — so a duplicate
+paragraph, a re-indexed unchanged chunk or a popular question is embedded
+once, and switching the embedding model simply misses. Backed by one SQLite
+file (WAL, safe across the indexer and search processes sharing the state
+dir) with least-recently-used eviction past a size bound.
+
+Env: KV_EMBED_CACHE     (default <KV_STATE>/embed-cache.sqlite; "off" disables)
+     KV_EMBED_CACHE_MAX (default 200000 vectors)
+"""
+import array
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import kvstate
+
+
+class EmbedCache:
+    def __init__(self, path, max_entries=200000):
+        self.max_entries = max_entries
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+        self._db = None
+        if not path:
+            return
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS vectors (model TEXT, digest BLOB, vec BLOB, "
+                         "used REAL, PRIMARY KEY (model, digest)) WITHOUT ROWID")
+        self._db.execute("CREATE INDEX IF NOT EXISTS vectors_used ON vectors(used)")
+        self._size = self._db.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+
+    def embed(self, model, texts, fetch, counts=None):
+        """Vectors for `texts`; only the misses go to fetch(list_of_texts).
+        `counts` (a caller's {"hits", "misses"}) is bumped too, for a per-run tally."""
+        if self._db is None:
+            with self._lock:
+                self.misses += len(texts)
+                if counts is not None:
+                    counts["misses"] += len(texts)
+            return fetch(texts)
+        digests = [hashlib.sha256(t.encode("utf-8")).digest() for t in texts]
+        found = self._get(model, set(digests))
+        out = [found.get(d) for d in digests]
+        todo = {}  # digest -> text; a batch's duplicates are fetched once
+        for d, t, v in zip(digests, texts, out):
+            if v is None:
+                todo.setdefault(d, t)
+        missing = sum(1 for v in out if v is None)
+        with self._lock:
+            self.hits += len(texts) - missing
+            self.misses += missing
+            if counts is not None:
+                counts["hits"] += len(texts) - missing
+                counts["misses"] += missing
+        if todo:
+            fetched = dict(zip(todo, fetch(list(todo.values()))))
+            self._put(model, fetched)
+            out = [v if v is not None else fetched[d] for d, v in zip(digests, out)]
+        return out
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                    "entries": self._size if self._db is not None else 0}
+
+    def _get(self, model, digests):
+        found = {}
+        keys = list(digests)
+        with self._lock:
+            for i in range(0, len(keys), 500):  # SQLite host-parameter limit
+                part = keys[i:i + 500]
+                rows = self._db.execute(
+                    f"SELECT digest, vec FROM vectors WHERE model = ? AND digest IN ({','.join('?' * len(part))})",
+                    [model, *part]).fetchall()
+                for d, blob in rows:
+                    found[d] = array.array("f", blob).tolist()
+            if found:
+                now = time.time()
+                self._db.executemany("UPDATE vectors SET used = ? WHERE model = ? AND digest = ?",
+                                     [(now, model, d) for d in found])
+        return found
+
+    def _put(self, model, fetched):
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                before = self._db.total_changes
+                self._db.executemany("INSERT OR IGNORE INTO vectors VALUES (?, ?, ?, ?)",
+                                     [(model, d, array.array("f", v).tobytes(), now) for d, v in fetched.items()])
+                self._size += self._db.total_changes - before
+                if self._size > self.max_entries:
+                    # evict down to 90% so eviction runs per batch, not per row
+                    drop = self._size - int(self.max_entries * 0.9)
+                    self._db.execute("DELETE FROM vectors WHERE (model, digest) IN (SELECT model, digest "
+                                     "FROM vectors ORDER BY used LIMIT ?)", (drop,))
+                    self._size = self._db.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+
+def open_cache():
+    """The process-wide cache configured by env."""
+    path = os.environ.get("KV_EMBED_CACHE", "")
+    if path.lower() == "off":
+        path = ""
+    elif not path:
+        path = kvstate.path("embed-cache.sqlite")
+    return EmbedCache(path, int(os.environ.get("KV_EMBED_CACHE_MAX", "200000")))
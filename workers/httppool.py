@@ -0,0 +1,201 @@
+"""Shared keep-alive HTTP client for all kalita workers.
+
+urlopen() opens a fresh TCP (and TLS) connection per call; every MCP tool
+call, embedding, Qdrant upsert and chat completion paid for that. This client
+keeps idle connections per host and reuses them, thread-safe, stdlib only.
+Loaded like bootstrap.py (the workers dir on sys.path).
+
+Errors look like urllib's, so existing handlers keep working: a status >= 400
+raises urllib.error.HTTPError (.code, .read()), a failure to connect raises
+urllib.error.URLError, and so does a connect or read timeout (its .reason the
+TimeoutError, as with urlopen). Idempotent requests
+(GET/HEAD/PUT/DELETE, or idempotent=True) are retried with exponential
+backoff on connection errors and 502/503/504. An idle connection the server
+has closed is noticed before reuse and dropped; one that is closed just as a
+request goes out gets the request replayed once on another connection — an
+idempotent one always, any other only if it failed before it was fully
+sent (a POST that reached the server may have been acted on). Callers with
+a retry loop of their own send inside POOL.caller_retries(): each request
+is then tried once, so the two layers do not multiply.
+
+Env: KALITA_HTTP_POOL    (default 8 idle connections kept per host)
+     KALITA_HTTP_RETRIES (default 2)
+     KALITA_HTTP_BACKOFF (default 0.5 seconds, doubled per retry)
+"""
+import contextlib
+import http.client
+import io
+import json
+import os
+import select
+import socket
+import threading
+import time
+import urllib.error
+import urllib.parse
+
+IDEMPOTENT = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
+RETRY_STATUS = {502, 503, 504}
+
+
+class _NoDelay:
+    """Small request/response pairs on a kept-alive socket must not wait on Nagle."""
+    def connect(self):
+        super().connect()
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+class _HTTPConnection(_NoDelay, http.client.HTTPConnection):
+    pass
+
+
+class _HTTPSConnection(_NoDelay, http.client.HTTPSConnection):
+    pass
+
+
+def _dropped(conn):
+    """An idle connection that is readable has been closed by the server (or
+    sent bytes nobody asked for): either way it is not fit for a request."""
+    if conn.sock is None:
+        return True
+    try:
+        return bool(select.select([conn.sock], [], [], 0)[0])
+    except (OSError, ValueError):
+        return True
+
+
+class Pool:
+    def __init__(self, size=8, retries=2, backoff=0.5, timeout=60):
+        self.size, self.retries, self.backoff, self.timeout = size, retries, backoff, timeout
+        self._idle = {}  # (scheme, host, port) -> [connection]
+        self._lock = threading.Lock()
+        self._local = threading.local()  # .once: inside caller_retries() on this thread
+        self.opened = self.reused = self.retried = 0
+
+    def stats(self):
+        with self._lock:
+            return {"opened": self.opened, "reused": self.reused, "retried": self.retried,
+                    "idle": sum(len(v) for v in self._idle.values())}
+
+    @contextlib.contextmanager
+    def caller_retries(self):
+        """Requests this thread sends inside are tried once — no retries, no
+        replay on a dropped connection: the caller's own loop is the budget."""
+        outer = getattr(self._local, "once", False)
+        self._local.once = True
+        try:
+            yield
+        finally:
+            self._local.once = outer
+
+    def json(self, url, body=None, headers=None, method=None, timeout=None, idempotent=None):
+        """Drop-in for the workers' http(): JSON in, parsed JSON out."""
+        data = json.dumps(body).encode() if body is not None else None
+        method = method or ("POST" if data is not None else "GET")
+        with self.stream(method, url, data, {"Content-Type": "application/json", **(headers or {})},
+                         timeout, idempotent) as resp:
+            return json.load(resp)
+
+    @contextlib.contextmanager
+    def stream(self, method, url, data=None, headers=None, timeout=None, idempotent=None):
+        """The response (an http.client.HTTPResponse) to read incrementally.
+        The connection goes back to the pool only when the body was read to the end."""
+        conn, resp = self._send(method, url, data, headers or {}, timeout, idempotent)
+        try:
+            yield resp
+        except BaseException:
+            conn.close()
+            raise
+        if resp.isclosed() and not resp.will_close:
+            self._release(conn)
+        else:
+            conn.close()
+
+    def _send(self, method, url, data, headers, timeout, idempotent):
+        u = urllib.parse.urlsplit(url)
+        key = (u.scheme, u.hostname, u.port)
+        path = u.path or "/"
+        if u.query:
+            path += "?" + u.query
+        retry_ok = method in IDEMPOTENT if idempotent is None else idempotent
+        once = getattr(self._local, "once", False)
+        retries = 0 if once else self.retries
+        attempt, replayed = 0, once  # replayed: no (further) replay of a dropped connection
+        while True:
+            conn, reused = self._acquire(key, timeout)
+            sent = False
+            try:
+                conn.request(method, path, body=data, headers=headers)
+                sent = True
+                resp = conn.getresponse()
+            except TimeoutError as e:
+                conn.close()
+                raise urllib.error.URLError(e) from e
+            except (ConnectionError, http.client.HTTPException, OSError) as e:
+                conn.close()
+                # the server dropped a keep-alive connection as it was reused: not a real failure
+                stale = reused and not replayed and (retry_ok or not sent) and isinstance(
+                    e, (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError))
+                if stale:
+                    replayed = True
+                    self._count_retry()
+                    continue
+                if retry_ok and attempt < retries:
+                    attempt += 1
+                    self._count_retry()
+                    time.sleep(self.backoff * 2 ** (attempt - 1))
+                    continue
+                raise urllib.error.URLError(e) from e
+            if resp.status >= 400:
+                body = resp.read()
+                if resp.will_close:
+                    conn.close()
+                else:
+                    self._release(conn)
+                if retry_ok and resp.status in RETRY_STATUS and attempt < retries:
+                    attempt += 1
+                    self._count_retry()
+                    time.sleep(self.backoff * 2 ** (attempt - 1))
+                    continue
+                raise urllib.error.HTTPError(url, resp.status, resp.reason, resp.headers, io.BytesIO(body))
+            return conn, resp
+
+    def _acquire(self, key, timeout):
+        timeout = timeout or self.timeout
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                conn = idle.pop() if idle else None
+                if conn is None:
+                    self.opened += 1
+                    break
+            if _dropped(conn):
+                conn.close()
+                continue
+            with self._lock:
+                self.reused += 1
+            conn.timeout = timeout
+            conn.sock.settimeout(timeout)
+            return conn, True
+        scheme, host, port = key
+        cls = _HTTPSConnection if scheme == "https" else _HTTPConnection
+        conn = cls(host, port, timeout=timeout)
+        conn._pool_key = key
+        return conn, False
+
+    def _release(self, conn):
+        with self._lock:
+            idle = self._idle.setdefault(conn._pool_key, [])
+            if len(idle) < self.size:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def _count_retry(self):
+        with self._lock:
+            self.retried += 1
+
+
+POOL = Pool(size=int(os.environ.get("KALITA_HTTP_POOL", "8")),
+            retries=int(os.environ.get("KALITA_HTTP_RETRIES", "2")),
+            backoff=float(os.environ.get("KALITA_HTTP_BACKOFF", "0.5")))
@@ -0,0 +1,90 @@
+"""Streaming, paragraph-aware chunking with a hard size cap.
+
+iter_chunks() consumes text in blocks (a file read incrementally, an HTTP body
+decoded as it arrives) and yields chunks as soon as they are complete, so peak
+memory is ~ chunk size + block size whatever the file size, and a huge
+paragraph is cut in linear time. Output is identical to chunk() on the whole
+text: paragraphs (split on a blank line) are packed while they fit; one that
+does not fit closes the current chunk and is cut into size-long pieces, its
+tail opening the next chunk.
+
+Stdlib only.
+"""
+
+BLOCK = 1 << 16
+
+
+def iter_chunks(blocks, size):
+    out = _Chunker(size)
+    for block in blocks:
+        yield from out.feed(block)
+    yield from out.close()
+
+
+def chunk(text, size):
+    """All chunks of an in-memory text."""
+    return list(iter_chunks([text], size))
+
+
+def read_blocks(f, block=BLOCK):
+    """Blocks of an open text file, read incrementally."""
+    while True:
+        data = f.read(block)
+        if not data:
+            return
+        yield data
+
+
+class _Chunker:
+    def __init__(self, size):
+        self.size = size
+        self.cur = ""        # chunk being packed
+        self.pending = ""    # start of the paragraph not yet terminated
+        self.spilled = False  # pending paragraph already overflowed: cur flushed, pieces emitted
+
+    def feed(self, data):
+        self.pending += data
+        start = 0
+        while True:
+            end = self.pending.find("\n\n", start)
+            if end < 0:
+                break
+            yield from self._paragraph(self.pending[start:end])
+            start = end + 2
+        if start:
+            self.pending = self.pending[start:]
+        # an unterminated paragraph longer than size cannot fit anywhere: flush
+        # what is packed and emit its full-size pieces now. The last char stays
+        # back — it may be the first half of a "\n\n" split across blocks.
+        if len(self.pending) - 1 > self.size:
+            if not self.spilled:
+                if self.cur:
+                    yield self.cur
+                self.cur, self.spilled = "", True
+            pos = 0
+            while len(self.pending) - 1 - pos > self.size:
+                yield self.pending[pos:pos + self.size]
+                pos += self.size
+            self.pending = self.pending[pos:]
+
+    def close(self):
+        yield from self._paragraph(self.pending)
+        self.pending = ""
+        if self.cur.strip():
+            yield self.cur.strip()
+        self.cur = ""
+
+    def _paragraph(self, para):
+        size = self.size
+        if self.spilled:
+            self.spilled = False  # cur was flushed when the paragraph overflowed
+        elif len(self.cur) + len(para) + 2 <= size:
+            self.cur = (self.cur + "\n\n" + para).strip()
+            return
+        elif self.cur:
+            yield self.cur
+        pos = 0
+        while len(para) - pos > size:
+            yield para[pos:pos + size]
+            pos += size
+        self.cur = para[pos:]
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Bring existing kv_* collections in line with the current collection options.
+
+The indexer applies KV_QUANTIZATION and KV_ON_DISK_VECTORS / KV_ON_DISK_PAYLOAD
+only when it creates a collection, and KV_COMPACT_PAYLOAD only to the points
+it upserts from then on. Run this once with the same env as the indexer after
+changing them: quantization and on-disk storage are switched in place (Qdrant
+rebuilds its segments in the background; the local backend re-packs its
+rows), and payloads move their chunk text into the text store (compact on) or
+get it back from there (compact off). Nothing is re-embedded. Best run
+between index runs — a point upserted meanwhile is simply converted next time.
+
+Usage:  python convert_collections.py [--gc] [collection ...]
+        (default: every kv_* collection and KV_SHARED_COLLECTION)
+        --gc  then delete the stored texts no collection references anymore
+Env:    as the indexer: KV_VECTOR_BACKEND, KV_QDRANT, KV_LOCAL_VECTORS, KV_QUANTIZATION,
+        KV_RESCORE, KV_OVERSAMPLING, KV_ON_DISK_VECTORS, KV_ON_DISK_PAYLOAD
+        (see vectorstore.py), KV_COMPACT_PAYLOAD, KV_TEXT_STORE (see textstore.py),
+        KV_SHARED_COLLECTION, KV_STATE
+Zero dependencies: stdlib only.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import kvlayout  # noqa: E402
+from textstore import open_texts  # noqa: E402
+from vectorstore import open_store  # noqa: E402
+
+STORE = open_store()
+TEXTS = open_texts()
+
+
+def knowvault_collections():
+    """Every collection the indexer writes: kv_<workspace> ones and the shared one, whatever its name."""
+    return [n for n in STORE.collections() if n.startswith("kv_") or n == kvlayout.SHARED_COLLECTION]
+
+
+def convert_payloads(name):
+    """Moves chunk text to or from the text store; returns (converted, missing)."""
+    converted = missing = 0
+    for page in STORE.scroll(name):
+        if TEXTS.compact:
+            todo = [p for p in page if "text" in p["payload"]]
+            refs = TEXTS.put([p["payload"]["text"] for p in todo])
+            new = {p["id"]: {**{k: v for k, v in p["payload"].items() if k != "text"}, "text_ref": r}
+                   for p, r in zip(todo, refs)}
+        else:
+            todo = [p for p in page if "text" not in p["payload"] and "text_ref" in p["payload"]]
+            texts = TEXTS.get([p["payload"]["text_ref"] for p in todo])
+            new = {p["id"]: {**{k: v for k, v in p["payload"].items() if k != "text_ref"},
+                             "text": texts[p["payload"]["text_ref"]]}
+                   for p in todo if p["payload"]["text_ref"] in texts}
+            missing += len(todo) - len(new)
+        STORE.set_payloads(name, new)
+        converted += len(new)
+    return converted, missing
+
+
+def sweep():
+    """Deletes stored texts that no collection references; returns how many."""
+    started, live = time.time(), set()
+    for name in knowvault_collections():
+        for page in STORE.scroll(name):
+            live.update(p["payload"]["text_ref"] for p in page if "text_ref" in p["payload"])
+    return TEXTS.sweep(live, started)
+
+
+def main():
+    args = sys.argv[1:]
+    gc = "--gc" in args
+    names = [a for a in args if a != "--gc"] or knowvault_collections()
+    for name in sorted(names):
+        changed = STORE.configure(name)
+        for option, (was, now) in sorted(changed.items()):
+            print(f"{name}: {option} {was} -> {now}")
+        converted, missing = convert_payloads(name)
+        print(f"{name}: {converted} payloads {'compacted' if TEXTS.compact else 'given their text back'}"
+              + (f", {missing} texts missing from the text store (re-index those files)" if missing else ""))
+    if gc:
+        print(f"text store: {sweep()} unreferenced texts deleted, {TEXTS.stats()['texts']} kept")
+
+
+if __name__ == "__main__":
+    main()
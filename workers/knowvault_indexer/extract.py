@@ -0,0 +1,344 @@
+"""Text out of binary document formats (PDF, DOCX, HTML), in worker processes.
+
+Plain text files the indexer streams itself; a file whose extension has a
+registered extractor is converted to text first. Extraction is CPU-bound
+pure Python, so it runs in separate processes — fresh interpreters running
+this module, not forks of the threaded indexer, reused from file to file — at
+most KV_EXTRACT_WORKERS at once. A file gets KV_EXTRACT_TIMEOUT seconds, then its
+process is killed and replaced; every process is capped at
+KV_EXTRACT_MEMORY_MB of address space (setrlimit). One pathological document
+fails alone instead of stalling the Source.
+
+The text is cached by content: <KV_STATE>/extracted/<sha256>-<format>-v<version>.txt,
+so an unchanged file (or the same file in another Source) is never extracted
+twice, and bumping an extractor's version re-extracts. Least recently used
+entries go past KV_EXTRACT_CACHE_MB.
+
+More formats: a module named in KV_EXTRACTORS (comma-separated, imported here
+and in every extraction process) registers fn(path) -> str with
+@register("name", ".ext", version=N) — the same way the built-in ones do.
+
+Env: KV_EXTRACT_WORKERS (default 2), KV_EXTRACT_TIMEOUT (default 60 seconds),
+     KV_EXTRACT_MEMORY_MB (default 1024), KV_EXTRACT_CACHE_MB (default 2048),
+     KV_EXTRACTORS, KV_STATE
+Stdlib only.
+"""
+import codecs
+import contextlib
+import html.parser
+import importlib
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import uuid
+import xml.etree.ElementTree as ET
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import kvstate  # noqa: E402
+from pdftext import pdf_text  # noqa: E402
+
+FORMATS = {}  # ".ext" -> (format name, version, fn)
+
+
+class ExtractError(Exception):
+    """Extraction failed. `retry` is True when the document itself may be
+    fine (timeout, a killed process) and the next run should try again."""
+
+    def __init__(self, message, retry=False):
+        super().__init__(message)
+        self.retry = retry
+
+
+def register(name, *exts, version=1):
+    def deco(fn):
+        for ext in exts:
+            FORMATS[ext.lower()] = (name, version, fn)
+        return fn
+    return deco
+
+
+def _format(filename):
+    return FORMATS.get(os.path.splitext(filename)[1].lower())
+
+
+@register("pdf", ".pdf")
+def _pdf(path):
+    return pdf_text(path)
+
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+@register("docx", ".docx", ".docm", ".dotx")
+def _docx(path):
+    out = []
+    with zipfile.ZipFile(path) as z:
+        names = set(z.namelist())
+        for part in ("word/document.xml", "word/footnotes.xml", "word/endnotes.xml"):
+            if part not in names:
+                continue
+            with z.open(part) as f:
+                for _event, el in ET.iterparse(f):
+                    tag = el.tag
+                    if tag == _W + "t":
+                        out.append(el.text or "")
+                    elif tag == _W + "tab":
+                        out.append("\t")
+                    elif tag in (_W + "br", _W + "cr"):
+                        out.append("\n")
+                    elif tag == _W + "p":
+                        out.append("\n\n")
+                        el.clear()  # paragraphs are done with: keep memory flat
+    return re.sub(r"\n{3,}", "\n\n", "".join(out)).strip()
+
+
+class _HTMLText(html.parser.HTMLParser):
+    SKIP = {"script", "style", "noscript", "template", "svg"}
+    PARAGRAPH = {"p", "div", "section", "article", "header", "footer", "main", "aside", "nav", "blockquote",
+                 "pre", "table", "ul", "ol", "dl", "form", "figure", "hr", "title",
+                 "h1", "h2", "h3", "h4", "h5", "h6"}
+    LINE = {"br", "li", "tr", "dt", "dd", "caption"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out, self.skip, self.pre = [], 0, 0
+        self.head = self.title = False  # of <head>, only the <title> is text
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self.skip += 1
+        self.head = tag == "head" or (self.head and tag != "body")
+        self.title = self.title or tag == "title"
+        self.pre += tag == "pre"
+        self._break(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP and self.skip:
+            self.skip -= 1
+        self.head = self.head and tag != "head"
+        self.title = self.title and tag != "title"
+        if tag == "pre" and self.pre:
+            self.pre -= 1
+        if tag in self.PARAGRAPH:
+            self.out.append("\n\n")
+
+    def handle_startendtag(self, tag, attrs):
+        self._break(tag)
+
+    def handle_data(self, data):
+        if self.skip or (self.head and not self.title):
+            return
+        self.out.append(data if self.pre else re.sub(r"\s+", " ", data))
+
+    def _break(self, tag):
+        if tag in self.PARAGRAPH:
+            self.out.append("\n\n")
+        elif tag in self.LINE:
+            self.out.append("\n")
+        elif tag in ("td", "th"):
+            self.out.append(" ")
+
+
+def _decode_html(raw):
+    for bom, enc in ((codecs.BOM_UTF8, "utf-8"), (codecs.BOM_UTF16_LE, "utf-16-le"),
+                     (codecs.BOM_UTF16_BE, "utf-16-be")):
+        if raw.startswith(bom):
+            return raw[len(bom):].decode(enc, "replace")
+    m = re.search(rb"""<meta[^>]+charset\s*=\s*["']?\s*([\w.:-]+)""", raw[:4096], re.I)
+    enc = m.group(1).decode("ascii") if m else "utf-8"
+    try:
+        codecs.lookup(enc)
+    except LookupError:
+        enc = "utf-8"
+    return raw.decode(enc, "replace")
+
+
+@register("html", ".html", ".htm", ".xhtml")
+def _html(path):
+    with open(path, "rb") as f:
+        raw = f.read()
+    p = _HTMLText()
+    p.feed(_decode_html(raw))
+    p.close()
+    text = "".join(p.out)
+    text = re.sub(r"[ \t]*\n[ \t]*", "\n", text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def _serve(memory_mb):
+    """Extraction process loop: a JSON job per line on stdin ({ext, src, tmp,
+    dst}), a JSON answer per line on stdout ({"ok": chars} or {"error": why})."""
+    if memory_mb:
+        try:
+            import resource
+            cap = memory_mb << 20
+            resource.setrlimit(resource.RLIMIT_AS, (cap, cap))
+        except (ImportError, ValueError, OSError):
+            pass  # no rlimits here (not POSIX): timeout only
+    answers = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    os.dup2(2, 1)  # a chatty extractor's prints must not corrupt the answers
+    for line in sys.stdin:
+        job = json.loads(line)
+        try:
+            text = FORMATS[job["ext"]][2](job["src"])
+            with open(job["tmp"], "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(job["tmp"], job["dst"])
+            answer = {"ok": len(text)}
+        except MemoryError:
+            answer = {"error": f"over the {memory_mb} MB extraction memory cap"}
+        except Exception as e:  # noqa: BLE001 — a corrupt document is this document's problem
+            answer = {"error": f"{type(e).__name__}: {e}"}
+        answers.write(json.dumps(answer) + "\n")
+        answers.flush()
+
+
+class Extractor:
+    def __init__(self, root, workers=2, timeout=60.0, memory_mb=1024, cache_mb=2048):
+        self.root, self.timeout, self.memory_mb = root, timeout, memory_mb
+        self.cache_bytes = cache_mb << 20
+        self._slots = threading.BoundedSemaphore(max(1, workers))
+        self._idle = []  # extraction processes waiting for a job
+        self._lock = threading.Lock()
+        self._cache_size = None  # bytes under root, counted on first write
+        self.counts = {"extracted": 0, "cached": 0, "failed": 0, "killed": 0}
+
+    def handles(self, filename):
+        return _format(filename) is not None
+
+    def version(self, filename):
+        """Which extractor (and version) makes the text of `filename` — e.g.
+        "pdf/1" — or None for plain text. The manifest keeps it per file."""
+        fmt = _format(filename)
+        return f"{fmt[0]}/{fmt[1]}" if fmt else None
+
+    def extract(self, sha, filename, source):
+        """Path of the text of `filename`, whose content hash is `sha`:
+        from the cache, or extracted from the file `source()` enters
+        (a context manager yielding a local path)."""
+        name, version, _fn = _format(filename)
+        dst = os.path.join(self.root, sha[:2], f"{sha}-{name}-v{version}.txt")
+        try:
+            os.utime(dst)  # recently used: last to be evicted
+            with self._lock:
+                self.counts["cached"] += 1
+            return dst
+        except OSError:
+            pass
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        tmp = f"{dst}.{uuid.uuid4().hex}.part"
+        try:
+            with source() as src:
+                self._run(os.path.splitext(filename)[1].lower(), src, tmp, dst)
+        except ExtractError:
+            with self._lock:
+                self.counts["failed"] += 1
+            raise
+        finally:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp)
+        with self._lock:
+            self.counts["extracted"] += 1
+        self._account(os.path.getsize(dst))
+        return dst
+
+    def _run(self, ext, src, tmp, dst):
+        with self._slots:
+            with self._lock:
+                proc = self._idle.pop() if self._idle else None
+            if proc is None or proc.poll() is not None:
+                proc = self._spawn()
+            answer = []
+            try:
+                proc.stdin.write(json.dumps({"ext": ext, "src": src, "tmp": tmp, "dst": dst}) + "\n")
+                proc.stdin.flush()
+                reader = threading.Thread(target=lambda: answer.append(proc.stdout.readline()), daemon=True)
+                reader.start()
+                reader.join(self.timeout)
+            except OSError:
+                pass
+            if not answer or not answer[0]:
+                timed_out = proc.poll() is None
+                self._kill(proc)
+                if timed_out:
+                    raise ExtractError(f"extraction timed out after {self.timeout:g}s", retry=True)
+                raise ExtractError(f"extraction process died (exit {proc.returncode})", retry=True)
+            with self._lock:
+                self._idle.append(proc)
+        reply = json.loads(answer[0])
+        if "error" in reply:
+            raise ExtractError(reply["error"])
+
+    def _spawn(self):
+        # a fresh interpreter, not a fork of the threaded indexer; it can
+        # import whatever the indexer can (KV_EXTRACTORS modules included)
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+        return subprocess.Popen([sys.executable, os.path.abspath(__file__), str(self.memory_mb)],
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env,
+                                text=True, encoding="utf-8", bufsize=1)
+
+    def _kill(self, proc):
+        proc.kill()
+        proc.wait()
+        for f in (proc.stdin, proc.stdout):
+            with contextlib.suppress(OSError):
+                f.close()
+        with self._lock:
+            self.counts["killed"] += 1
+
+    def _account(self, added):
+        """Evict least recently used texts once the cache outgrows its bound."""
+        with self._lock:
+            if self._cache_size is None:
+                self._cache_size = sum(e[2] for e in self._entries())
+            else:
+                self._cache_size += added
+            if self._cache_size <= self.cache_bytes:
+                return
+            for path, _used, size in sorted(self._entries(), key=lambda e: e[1]):
+                if self._cache_size <= self.cache_bytes * 0.9:
+                    break
+                with contextlib.suppress(OSError):
+                    os.unlink(path)
+                    self._cache_size -= size
+
+    def _entries(self):
+        for d in os.scandir(self.root):
+            if d.is_dir():
+                for e in os.scandir(d.path):
+                    if e.name.endswith(".txt"):
+                        st = e.stat()
+                        yield e.path, st.st_mtime, st.st_size
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for proc in idle:
+            proc.stdin.close()  # the process sees EOF and exits
+            proc.wait(5)
+            proc.stdout.close()
+
+
+for _mod in filter(None, (m.strip() for m in os.environ.get("KV_EXTRACTORS", "").split(","))):
+    importlib.import_module(_mod)
+
+
+def open_extractor():
+    return Extractor(os.path.join(kvstate.STATE, "extracted"),
+                     int(os.environ.get("KV_EXTRACT_WORKERS", "2")),
+                     float(os.environ.get("KV_EXTRACT_TIMEOUT", "60")),
+                     int(os.environ.get("KV_EXTRACT_MEMORY_MB", "1024")),
+                     int(os.environ.get("KV_EXTRACT_CACHE_MB", "2048")))
+
+
+if __name__ == "__main__":
+    import extract  # the registry KV_EXTRACTORS modules add to, not this __main__ copy
+    extract._serve(int(sys.argv[1]) if len(sys.argv) > 1 else 0)
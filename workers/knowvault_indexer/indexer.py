@@ -3,33 +3,93 @@
 
 Pipeline per source: walk files -> extract text -> chunk -> embed (LM Studio,
 model name comes from the VaultSettings singleton ON THE NODE — humans manage
-it in the UI, every change is journaled) -> upsert to Qdrant (one collection
-per workspace: kv_<workspace_id>).
+it in the UI, every change is journaled) -> upsert to the vector store (one
+collection per workspace, kv_<workspace_id>, or a shared one: kvlayout.py).
+Re-indexing is incremental and checkpointed; --watch also follows Indexed
+Files sources between tasks. How a run behaves and every KV_* setting:
+docs/KNOWVAULT-INDEXER.md.
 
 Env (worker-level config, the secrets tier):
   KALITA_URL   (default http://127.0.0.1:8095)
   KALITA_TOKEN (required, role Indexer)
-  KV_QDRANT    (default http://192.168.1.4:6333)
   KV_LM        (default http://localhost:1234)
+  KV_VECTOR_BACKEND / KV_QDRANT  (see vectorstore.py)
+  KV_STATE     (default ~/.kalita/knowvault, see kvstate.py)
 
 Zero dependencies: stdlib only.
 """
+import codecs
+import contextlib
+import hashlib
+import itertools
 import json
 import os
+import random
 import sys
+import tempfile
+import threading
 import time
-import urllib.request
 import urllib.error
 import uuid
 from datetime import datetime, timezone
 
+try:
+    import fcntl
+except ImportError:  # Windows: the per-process lock alone
+    fcntl = None
+
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 from bootstrap import get_token  # noqa: E402
+import kvlayout  # noqa: E402
+import kvstate  # noqa: E402
+from httppool import POOL  # noqa: E402
+from embedcache import open_cache  # noqa: E402
+from vectorstore import StoreError, open_store  # noqa: E402
+from lexical import open_lexical  # noqa: E402
+import metrics  # noqa: E402
+from pipeline import Pipeline  # noqa: E402
+from chunker import BLOCK, iter_chunks, read_blocks  # noqa: E402
+from extract import ExtractError, open_extractor  # noqa: E402
+from textstore import open_texts  # noqa: E402
+import mcpclient  # noqa: E402
+import watch  # noqa: E402
 
 NODE = os.environ.get("KALITA_URL", "http://127.0.0.1:8095")
 TOKEN = get_token()
-QDRANT = os.environ.get("KV_QDRANT", "http://192.168.1.4:6333")
 LM = os.environ.get("KV_LM", "http://localhost:1234")
+READ_WORKERS = int(os.environ.get("KV_READ_WORKERS", "4"))
+CHUNK_WORKERS = int(os.environ.get("KV_CHUNK_WORKERS", "2"))
+EMBED_CONCURRENCY = int(os.environ.get("KV_EMBED_CONCURRENCY", "4"))
+UPSERT_CONCURRENCY = int(os.environ.get("KV_UPSERT_CONCURRENCY", "2"))
+QUEUE_DEPTH = int(os.environ.get("KV_QUEUE_DEPTH", "8"))
+EMBED_BATCH = int(os.environ.get("KV_EMBED_BATCH", "64"))
+EMBED_BATCH_CHARS = int(os.environ.get("KV_EMBED_BATCH_CHARS", "32000"))
+CHECKPOINT_SECONDS = float(os.environ.get("KV_CHECKPOINT_SECONDS", "15"))
+RETRIES = int(os.environ.get("KV_RETRIES", "3"))
+RETRY_BACKOFF = float(os.environ.get("KV_RETRY_BACKOFF", "2"))
+WATCH = "--watch" in sys.argv[1:] or os.environ.get("KV_WATCH", "off").lower() in ("1", "on", "true", "yes")
+WATCH_DEBOUNCE = float(os.environ.get("KV_WATCH_DEBOUNCE", "2"))
+WATCH_MAX_DELAY = float(os.environ.get("KV_WATCH_MAX_DELAY", "30"))
+WATCH_REFRESH = float(os.environ.get("KV_WATCH_REFRESH", "60"))
+WATCH_TICK = 0.5
+WATCH_BASIS = {"type": "rule", "id": "knowvault-watch"}
+STATUS_SECONDS = float(os.environ.get("KV_WATCH_STATUS_SECONDS", "10"))
+CACHE = open_cache()
+STORE = open_store()
+LEXICAL = open_lexical()
+EXTRACT = open_extractor()
+TEXTS = open_texts()
+STAGES = metrics.histogram("kalita_index_stage_seconds",
+                           "Indexer time per item, by pipeline stage "
+                           "(hash, extract, read, chunk, embed, upsert, lexical, delete)",
+                           ["stage"])
+RUNS = metrics.counter("kalita_index_runs_total", "Source indexing runs, by result (ok, fail, stopped, watch)",
+                       ["result"])
+CHUNKS = metrics.counter("kalita_index_chunks_total", "Chunks embedded and upserted")
+RETRIED = metrics.counter("kalita_index_retries_total", "Transient failures retried, by stage", ["stage"])
+WATCHED = metrics.counter("kalita_index_watch_paths_total", "Changed paths picked up by watch mode")
+
+_LOCKS, _LOCKS_GUARD = {}, threading.Lock()
 
 TEXT_EXT = {".txt", ".md", ".rst", ".csv", ".log"}
 
@@ -40,26 +100,102 @@ class ToolError(Exception):
         self.payload = payload
 
 
-def http(url, body=None, headers=None, method=None):
-    data = json.dumps(body).encode() if body is not None else None
-    req = urllib.request.Request(url, data=data, method=method,
-                                 headers={"Content-Type": "application/json", **(headers or {})})
-    with urllib.request.urlopen(req, timeout=120) as resp:
-        return json.load(resp)
+def http(url, body=None, headers=None, method=None, idempotent=None):
+    return POOL.json(url, body, headers, method, timeout=120, idempotent=idempotent)
+
+
+def http_text(url):
+    """Stream an uploaded document as decoded text blocks, with the worker's bearer token."""
+    decoder = codecs.getincrementaldecoder("utf-8")("ignore")
+    with POOL.stream("GET", url, headers={"Authorization": f"Bearer {TOKEN}"}, timeout=120) as resp:
+        while True:
+            raw = resp.read(BLOCK)
+            if not raw:
+                break
+            yield decoder.decode(raw)
+    yield decoder.decode(b"", final=True)
+
+
+@contextlib.contextmanager
+def http_file(url):
+    """Download an uploaded document to a temporary file (for extraction); removed on exit."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(kvstate.path("tmp", "upload")), prefix="upload-")
+    try:
+        with os.fdopen(fd, "wb") as f, \
+                POOL.stream("GET", url, headers={"Authorization": f"Bearer {TOKEN}"}, timeout=120) as resp:
+            for block in iter(lambda: resp.read(1 << 20), b""):
+                f.write(block)
+        yield tmp
+    finally:
+        os.unlink(tmp)
+
+
+def file_text(path):
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        yield from read_blocks(f)
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def timed(blocks, spent, key):
+    """Pass `blocks` through, adding the time spent producing them to spent[key]."""
+    it = iter(blocks)
+    while True:
+        t = time.perf_counter()
+        try:
+            block = next(it)
+        except StopIteration:
+            return
+        finally:
+            spent[key] += time.perf_counter() - t
+        yield block
+
+
+def transient(e):
+    """Worth another try: the server or the network, not the request."""
+    if isinstance(e, urllib.error.HTTPError):
+        return e.code in (408, 429) or e.code >= 500
+    return isinstance(e, (urllib.error.URLError, TimeoutError, ConnectionError))
+
+
+def timed_out(e):
+    """A timeout, bare or as the reason of a URLError (httppool.py, urlopen)."""
+    return isinstance(e, TimeoutError) or isinstance(getattr(e, "reason", None), TimeoutError)
 
 
-def http_bytes(url):
-    """Download raw bytes (uploaded document) with the worker's bearer token."""
-    req = urllib.request.Request(url, headers={"Authorization": f"Bearer {TOKEN}"})
-    with urllib.request.urlopen(req, timeout=120) as resp:
-        return resp.read()
+def pause(stage, attempt, e):
+    delay = RETRY_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5)  # jittered: batches do not retry in step
+    RETRIED.inc(stage=stage)
+    print(f"[retry] {stage}: {e}; again in {delay:.1f}s")
+    time.sleep(delay)
+
+
+def retrying(stage, fn):
+    """fn(), called again after a growing pause while it fails transiently.
+    Its requests are each sent once (the pool's own retries are off inside),
+    so a call makes at most KV_RETRIES + 1 attempts."""
+    for attempt in itertools.count():
+        try:
+            with POOL.caller_retries():
+                return fn()
+        except Exception as e:
+            if attempt >= RETRIES or not transient(e):
+                raise
+            pause(stage, attempt, e)
 
 
 def tool(name, args=None):
-    rpc = http(NODE + "/mcp", {
-        "jsonrpc": "2.0", "id": 1, "method": "tools/call",
-        "params": {"name": name, "arguments": args or {}},
-    }, {"Authorization": f"Bearer {TOKEN}"})
+    with metrics.MCP_CALLS.time(tool=name):
+        rpc = http(NODE + "/mcp", {
+            "jsonrpc": "2.0", "id": 1, "method": "tools/call",
+            "params": {"name": name, "arguments": args or {}},
+        }, {"Authorization": f"Bearer {TOKEN}"})
     result = rpc["result"]
     decoded = json.loads(result["content"][0]["text"]) if result.get("content") else {}
     if result.get("isError"):
@@ -67,6 +203,16 @@ def tool(name, args=None):
     return decoded
 
 
+def tools(*calls):
+    """Independent tool calls in one round-trip (mcpclient.py), all run even
+    if one fails; their payloads, or the first failure as a ToolError."""
+    results = mcpclient.batch(NODE + "/mcp", TOKEN, list(calls))
+    for payload, is_error in results:
+        if is_error:
+            raise ToolError(payload)
+    return [payload for payload, _ in results]
+
+
 def settings():
     """Business settings live on the node, not in the worker."""
     rows = tool("query", {"entity": "VaultSettings"}).get("records") or []
@@ -76,36 +222,410 @@ def settings():
     return "text-embedding-nomic-embed-text-v1.5", 512
 
 
-def chunk(text, size):
-    """Paragraph-aware chunking with a hard size cap."""
-    out, cur = [], ""
-    for para in text.split("\n\n"):
-        if len(cur) + len(para) + 2 <= size:
-            cur = (cur + "\n\n" + para).strip()
-            continue
-        if cur:
-            out.append(cur)
-        while len(para) > size:
-            out.append(para[:size])
-            para = para[size:]
-        cur = para
-    if cur.strip():
-        out.append(cur.strip())
-    return out
-
-
-def embed(model, texts):
-    resp = http(LM + "/v1/embeddings", {"model": model, "input": texts})
+def embed_request(model, texts):
+    with metrics.LLM_CALLS.time(op="embed"):
+        resp = http(LM + "/v1/embeddings", {"model": model, "input": texts}, idempotent=True)
     return [d["embedding"] for d in resp["data"]]
 
 
-def ensure_collection(name, dim):
+def embed(model, texts, counts=None):
+    """Vectors for texts; cache misses go to the server in split-on-failure
+    batches. `counts` tallies this run's cache hits and misses."""
+    return CACHE.embed(model, texts, lambda missing: embed_split(model, missing), counts)
+
+
+def embed_split(model, texts):
+    """embed_request() that halves a batch the server finds too large (400,
+    413) or times out on, down to single texts — only a lone text's error is
+    real. Overload (429, 5xx) is not the batch's fault: it goes to retrying()."""
     try:
-        http(f"{QDRANT}/collections/{name}", method="PUT",
-             body={"vectors": {"size": dim, "distance": "Cosine"}})
-    except urllib.error.HTTPError as e:
-        if e.code != 409:  # already exists
+        return embed_request(model, texts)
+    except (urllib.error.URLError, TimeoutError) as e:
+        too_big = e.code in (400, 413) if isinstance(e, urllib.error.HTTPError) else timed_out(e)
+        if len(texts) == 1 or not too_big:
             raise
+    half = len(texts) // 2
+    return embed_split(model, texts[:half]) + embed_split(model, texts[half:])
+
+
+def point_id(sid, fname, i):
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{sid}|{fname}|{i}"))
+
+
+def manifest_path(sid):
+    return kvstate.path("manifests", f"{sid}.json")
+
+
+def load_manifest(sid, model, chunk_size, collection):
+    """The previous run's file table — or an empty one when anything that
+    shapes the vectors changed (model, chunk size, target collection)."""
+    m = kvstate.load_json(manifest_path(sid)) or {}
+    files = m.get("files") or {}
+    if (m.get("model"), m.get("chunk_size"), m.get("collection")) != (model, chunk_size, collection):
+        # different vectors: everything is re-embedded; stale ids in the same
+        # collection are still known and get overwritten or removed
+        for entry in files.values():
+            entry["stale"] = True
+        if m.get("collection") != collection:
+            files = {}
+    elif LEXICAL is not None and not m.get("lexical"):
+        # indexed before the BM25 index existed (or while it was off): redo
+        # once; the embedding cache answers for the unchanged chunks
+        for entry in files.values():
+            entry["stale"] = True
+    for entry in files.values():
+        if entry.get("extractor") != EXTRACT.version(entry["name"]):
+            entry["stale"] = True  # read as plain text before, or by an older extractor
+    return files
+
+
+def save_manifest(sid, model, chunk_size, collection, files):
+    kvstate.save_json(manifest_path(sid), {
+        "model": model, "chunk_size": chunk_size, "collection": collection, "files": files,
+        "lexical": LEXICAL is not None})
+
+
+def checkpoint_path(sid):
+    return kvstate.path("checkpoints", f"{sid}.json")
+
+
+def load_checkpoint(sid, model, chunk_size, collection):
+    """Files an interrupted run already upserted — if it produced the same
+    vectors this run would (model, chunk size, collection, extractors)."""
+    c = kvstate.load_json(checkpoint_path(sid)) or {}
+    if (c.get("model"), c.get("chunk_size"), c.get("collection"), c.get("lexical")) != (
+            model, chunk_size, collection, LEXICAL is not None):
+        return {}
+    return {key: e for key, e in (c.get("files") or {}).items()
+            if not e.get("stale") and e.get("extractor") == EXTRACT.version(e["name"])}
+
+
+def unchanged(entry, fp):
+    """The cheap check: same size and mtime (or node hash) as when indexed."""
+    return bool(entry) and not entry.get("stale") and entry["size"] == fp["size"] and (
+        fp["sha256"] == entry["sha256"] if fp["sha256"] else entry["mtime"] == fp["mtime"])
+
+
+def wanted(name):
+    """A file the indexer reads: plain text, or a format extract.py converts."""
+    return os.path.splitext(name)[1].lower() in TEXT_EXT or EXTRACT.handles(name)
+
+
+def source_units(src, only=None):
+    """A Source's indexable units: (key, filename, fingerprint, sha256(), text(), raw()).
+
+    Either a single uploaded document or every text or extractable file
+    under a crawled path — or, with `only` (paths relative to it, files or
+    directories; "" is all of it), under just those. The fingerprint is cheap
+    (stat / the node's file hash); sha256() only runs when it moved, text()
+    streams blocks only when content changed. raw() enters a local copy of
+    the bytes, for extraction.
+    """
+    doc = src["values"].get("document")
+    if src["values"].get("kind") == "Upload" and doc:
+        name, url = doc.get("name", "document"), f"{NODE}/api/files/{doc['hash']}"
+        yield (name, name, {"size": doc.get("size"), "mtime": None, "sha256": doc["hash"]},
+               lambda: doc["hash"], lambda: http_text(url), lambda: http_file(url))
+        return
+    base = src["values"].get("path", "")
+    seen = set()
+    for top in [base] if only is None else [os.path.join(base, rel) if rel else base for rel in sorted(only)]:
+        walk = [(os.path.dirname(top), [], [os.path.basename(top)])] if os.path.isfile(top) else os.walk(top)
+        for root, _dirs, files in walk:
+            for name in files:
+                full = os.path.join(root, name)
+                key = os.path.relpath(full, base)
+                if not wanted(name) or key in seen:
+                    continue
+                seen.add(key)
+                try:
+                    st = os.stat(full)
+                except OSError:
+                    continue
+                yield (key, name, {"size": st.st_size, "mtime": st.st_mtime_ns, "sha256": None},
+                       lambda full=full: file_sha256(full), lambda full=full: file_text(full),
+                       lambda full=full: contextlib.nullcontext(full))
+
+
+def covers(only, key):
+    return any(not rel or key == rel or key.startswith(rel + os.sep) for rel in only)
+
+
+def status_guard(sid, allowed):
+    """A stop() for sync_source: the Source's status once it has left
+    `allowed` (asked of the node at most every KV_WATCH_STATUS_SECONDS), else None."""
+    asked, status = [time.monotonic()], [None]
+
+    def stop():
+        if time.monotonic() - asked[0] >= STATUS_SECONDS:
+            asked[0] = time.monotonic()
+            with contextlib.suppress(ToolError, urllib.error.URLError):  # unknown is not a reason to stop
+                status[0] = tool("get_record", {"entity": "Source", "id": sid})["values"].get("status")
+        return status[0] if status[0] is not None and status[0] not in allowed else None
+    return stop
+
+
+@contextlib.contextmanager
+def source_lock(sid, wait=True):
+    """One run per Source at a time, task or watch: a lock in this process and,
+    where there is flock, one across indexers sharing KV_STATE. Yields whether
+    it is held (always True when waiting)."""
+    with _LOCKS_GUARD:
+        lock = _LOCKS.setdefault(sid, threading.Lock())
+    if not lock.acquire(wait):
+        yield False
+        return
+    try:
+        if fcntl is None:
+            yield True
+            return
+        with open(kvstate.path("locks", f"{sid}.lock"), "a") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False
+                return
+            yield True
+    finally:
+        lock.release()
+
+
+def sync_source(sid, src, tid=None, only=None, stop=None):
+    """Brings the Source's points in line with its files: the pipeline run,
+    stale points deleted, the manifest saved. With `only`, just those paths
+    are looked at (the rest of the manifest carries over). stop() is asked
+    before each file; once it names a status, no more files are started —
+    what was indexed so far is kept, the rest stays as it was. Returns the
+    run's counts and progress note; raises after checkpointing on failure.
+    """
+    workspace = src["values"].get("workspace", "")
+    collection = kvlayout.collection(workspace)
+    model, chunk_size = settings()
+    prev = load_manifest(sid, model, chunk_size, collection)
+    done = load_checkpoint(sid, model, chunk_size, collection)
+    seen, stopped = set(), []
+
+    def units():
+        for unit in source_units(src, only):
+            why = stop() if stop is not None else None
+            if why:
+                stopped.append(why)
+                return
+            seen.add(unit[0])
+            yield unit
+
+    files = {}
+    stats = {"embedded": 0, "skipped": 0, "chunks": 0, "unreadable": 0, "resumed": 0}
+    stages, cached = metrics.Tally(STAGES), {"hits": 0, "misses": 0}  # this run's alone, not the process's
+    lock = threading.Lock()
+    created, create_lock = [], threading.Lock()
+    saved = [time.monotonic()]
+    save_lock = threading.Lock()
+
+    def checkpoint(force=False):
+        """Persist the files fully upserted so far (throttled unless forced)."""
+        with save_lock:
+            with lock:
+                if not force and time.monotonic() - saved[0] < CHECKPOINT_SECONDS:
+                    return
+                saved[0] = time.monotonic()
+                snapshot = dict(files)
+            kvstate.save_json(checkpoint_path(sid), {
+                "task": tid, "model": model, "chunk_size": chunk_size, "collection": collection,
+                "lexical": LEXICAL is not None, "files": snapshot})
+
+    def settle(job, upserted=0, sealed=False):
+        """A file is indexed once it is fully chunked AND every chunk upserted;
+        its chunks may travel in batches together with other files'."""
+        with lock:
+            job["done"] += upserted
+            job["sealed"] = job["sealed"] or sealed
+            if not job["sealed"] or job["done"] < job["entry"]["chunks"]:
+                return
+            files[job["key"]] = job["entry"]
+            if job["done"]:
+                stats["embedded"] += 1
+                stats["chunks"] += job["done"]
+        checkpoint()
+
+    def read_stage(unit, emit):
+        key, fname, fp, sha256, text, raw = unit
+        old = prev.get(key)
+        if unchanged(done.get(key), fp):  # upserted by the interrupted run before this one
+            with lock:
+                files[key] = done[key]
+                stats["resumed"] += 1
+            return
+        if unchanged(old, fp):
+            with lock:
+                files[key] = old
+                stats["skipped"] += 1
+            return
+        try:
+            with stages.time(stage="hash"):
+                sha = sha256()
+        except OSError:
+            if old:
+                with lock:
+                    files[key] = old  # unreadable right now is not deleted
+            return
+        entry = {"name": fname, "size": fp["size"], "mtime": fp["mtime"], "sha256": sha, "chunks": 0}
+        if old and not old.get("stale") and old["sha256"] == sha:
+            entry["chunks"] = old["chunks"]  # touched, not changed
+            entry.update({k: old[k] for k in ("extractor", "error") if k in old})
+            with lock:
+                files[key] = entry
+                stats["skipped"] += 1
+            return
+        if EXTRACT.handles(fname):
+            entry["extractor"] = EXTRACT.version(fname)
+            try:
+                with stages.time(stage="extract"):
+                    extracted = EXTRACT.extract(sha, fname, raw)
+            except ExtractError as e:
+                # recorded with no chunks, so the old version's points go; a
+                # broken document waits for new content, a timeout is retried
+                entry.update({"error": str(e), "stale": e.retry})
+                with lock:
+                    files[key] = entry
+                    stats["unreadable"] += 1
+                print(f"[warn] {key}: {e}")
+                return
+            except OSError:  # the upload could not be fetched: like unreadable above
+                if old:
+                    with lock:
+                        files[key] = old
+                return
+            text = lambda: file_text(extracted)  # noqa: E731
+        emit(({"key": key, "entry": entry, "done": 0, "sealed": False}, text))
+
+    def chunk_stage(item, emit):
+        job, text = item
+        spent = {"read": 0.0, "emit": 0.0}  # chunk time is what is left
+        t0 = time.perf_counter()
+        sent = 0
+        for attempt in itertools.count():
+            try:
+                for i, piece in enumerate(iter_chunks(timed(text(), spent, "read"), chunk_size)):
+                    if i < sent:
+                        continue  # already sent before the read broke off: chunking is deterministic
+                    with lock:
+                        job["entry"]["chunks"] = i + 1
+                    t = time.perf_counter()
+                    emit((job, i, piece))  # blocks while downstream is full
+                    spent["emit"] += time.perf_counter() - t
+                    sent = i + 1
+                break
+            except OSError as e:
+                if attempt < RETRIES and transient(e):
+                    pause("read", attempt, e)
+                    continue
+                job["entry"]["stale"] = True  # vanished mid-read: keep what was sent, redo next run
+                break
+        stages.observe(spent["read"], stage="read")
+        stages.observe(time.perf_counter() - t0 - spent["read"] - spent["emit"], stage="chunk")
+        settle(job, sealed=True)
+
+    batch, batch_chars = [], [0]
+
+    def batch_stage(item, emit):
+        batch.append(item)
+        batch_chars[0] += len(item[2])
+        if len(batch) >= EMBED_BATCH or batch_chars[0] >= EMBED_BATCH_CHARS:
+            batch_flush(emit)
+
+    def batch_flush(emit):
+        if batch:
+            emit(batch[:])
+            batch.clear()
+            batch_chars[0] = 0
+
+    def embed_stage(items, emit):
+        pieces = [piece for _j, _i, piece in items]
+        with stages.time(stage="embed"):
+            vectors = retrying("embed", lambda: embed(model, pieces, cached))
+        if not created:  # checked again under its own lock; the shared one is never held across a retry
+            with create_lock:
+                if not created:
+                    retrying("upsert", lambda: STORE.ensure_collection(collection, len(vectors[0]), kvlayout.indexes()))
+                    created.append(collection)
+        texts = TEXTS.put(pieces) if TEXTS.compact else pieces
+        field = "text_ref" if TEXTS.compact else "text"
+        emit([(job, {
+            "id": point_id(sid, job["entry"]["name"], i),
+            "vector": vec,
+            "payload": {"source": sid, "workspace": workspace, "file": job["entry"]["name"], field: text},
+        }, piece) for (job, i, piece), vec, text in zip(items, vectors, texts)])
+
+    def upsert_stage(items, _emit):
+        points = [p for _job, p, _piece in items]
+        with stages.time(stage="upsert"):
+            retrying("upsert", lambda: STORE.upsert(collection, points))
+        if LEXICAL is not None:
+            with stages.time(stage="lexical"):  # BM25 needs the text itself, compact or not
+                LEXICAL.add(workspace, [{"id": p["id"], "payload": {**p["payload"], "text": piece}}
+                                        for _job, p, piece in items])
+        CHUNKS.inc(len(points))
+        per_job = {}
+        for job, _p, _piece in items:
+            per_job.setdefault(id(job), [job, 0])[1] += 1
+        for job, n in per_job.values():
+            settle(job, upserted=n)
+
+    try:
+        started = time.monotonic()
+        (Pipeline(QUEUE_DEPTH)
+         .stage("read", read_stage, READ_WORKERS)
+         .stage("chunk", chunk_stage, CHUNK_WORKERS)
+         .stage("batch", batch_stage, 1, flush=batch_flush)
+         .stage("embed", embed_stage, EMBED_CONCURRENCY)
+         .stage("upsert", upsert_stage, UPSERT_CONCURRENCY)
+         .run(units()))
+    except BaseException:
+        checkpoint(force=True)  # retry_index resumes from here
+        raise
+    elapsed = max(time.monotonic() - started, 1e-6)
+    embedded, skipped, resumed = stats["embedded"], stats["skipped"], stats["resumed"]
+    chunks_total = stats["chunks"]
+
+    # files not looked at this time (outside `only`, or not reached before a
+    # stop) stay as they were; looked for and not found means deleted
+    for key, old in prev.items():
+        if key not in seen and (stopped or not covers(only or {""}, key)):
+            files.setdefault(key, old)
+    # ids are derived from the file NAME, so a vanished a/x.txt must not
+    # take the points of a live b/x.txt with it
+    live = {point_id(sid, e["name"], i) for e in files.values() for i in range(e["chunks"])}
+    stale = []
+    for key, old in prev.items():
+        cur = files.get(key)
+        if cur is old:
+            continue
+        keep = cur["chunks"] if cur and cur["name"] == old["name"] else 0
+        stale += [pid for i in range(keep, old["chunks"])
+                  if (pid := point_id(sid, old["name"], i)) not in live]
+    removed = sum(1 for key in prev if key not in files)
+    with stages.time(stage="delete"):
+        retrying("delete", lambda: STORE.delete(collection, stale))
+        if LEXICAL is not None:
+            LEXICAL.remove(workspace, stale)
+    save_manifest(sid, model, chunk_size, collection, files)
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(checkpoint_path(sid))  # the manifest has it all now
+    if embedded or resumed or stale:
+        kvstate.bump_generation(workspace)  # cached answers over it are now stale
+
+    docs = sum(1 for e in files.values() if e["chunks"])
+    note = (f"{docs} docs -> {collection} (model {model}): re-embedded {embedded} "
+            f"({chunks_total} chunks, {chunks_total / elapsed:.1f} chunks/s), "
+            f"skipped {skipped} unchanged, resumed {resumed} from a checkpoint, removed {removed}, "
+            f"unreadable {stats['unreadable']}; "
+            f"embed cache {cached['hits']} hits / {cached['misses']} misses; "
+            f"stages: {stages.breakdown() or 'none'}"
+            + (f"; stopped early: source is {stopped[0]}" if stopped else ""))
+    return {"docs": docs, "embedded": embedded, "skipped": skipped, "removed": removed, "chunks": chunks_total,
+            "collection": collection, "note": note, "stopped": stopped[0] if stopped else None,
+            "changed": bool(embedded or resumed or stale or removed or stats["unreadable"])}
 
 
 def index_source(task):
@@ -121,64 +641,118 @@ def index_source(task):
         tool("complete_task", {"task_id": tid, "result": f"stale: source is {status}"})
         return
 
-    workspace = src["values"].get("workspace", "")
-    collection = f"kv_{workspace}"
-    model, chunk_size = settings()
-
-    # an indexable unit is (filename, text): either a single uploaded document
-    # or every text file under a crawled path
-    def units():
-        doc = src["values"].get("document")
-        if src["values"].get("kind") == "Upload" and doc:
-            raw = http_bytes(f"{NODE}/api/files/{doc['hash']}")
-            yield doc.get("name", "document"), raw.decode("utf-8", "ignore")
-            return
-        for root, _dirs, files in os.walk(src["values"].get("path", "")):
-            for name in files:
-                if os.path.splitext(name)[1].lower() not in TEXT_EXT:
-                    continue
-                try:
-                    with open(os.path.join(root, name), encoding="utf-8", errors="ignore") as f:
-                        yield name, f.read()
-                except OSError:
-                    continue
-
     try:
-        docs, chunks_total = 0, 0
-        for fname, text in units():
-            pieces = chunk(text, chunk_size)
-            if not pieces:
-                continue
-            vectors = embed(model, pieces)
-            ensure_collection(collection, len(vectors[0]))
-            points = [{
-                "id": str(uuid.uuid5(uuid.NAMESPACE_URL, f"{sid}|{fname}|{i}")),
-                "vector": vec,
-                "payload": {"source": sid, "file": fname, "text": piece},
-            } for i, (piece, vec) in enumerate(zip(pieces, vectors))]
-            http(f"{QDRANT}/collections/{collection}/points?wait=true", method="PUT",
-                 body={"points": points})
-            docs += 1
-            chunks_total += len(points)
-
-        tool("report_progress", {"task_id": tid,
-             "note": f"{docs} docs -> {chunks_total} chunks -> {collection} (model {model})"})
+        with source_lock(sid):
+            r = sync_source(sid, src, tid, stop=status_guard(sid, ("Indexing",)))
+        if r["stopped"]:  # paused mid-run: no finish_index from there, the work done is kept
+            tools(("report_progress", {"task_id": tid, "note": r["note"]}),
+                  ("complete_task", {"task_id": tid, "result": f"stopped: source is {r['stopped']}"}))
+            RUNS.inc(result="stopped")
+            print(f"[stop] {sid[:8]}: source is {r['stopped']}")
+            return
         tool("update_record", {"entity": "Source", "id": sid, "basis": basis, "values": {
-            "documents": docs,
+            "documents": r["docs"],
             "last_indexed": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
         }})
         tool("act", {"entity": "Source", "id": sid, "action": "finish_index", "basis": basis})
-        tool("complete_task", {"task_id": tid, "result": f"indexed {docs} docs, {chunks_total} chunks"})
-        print(f"[ok] {sid[:8]}: {docs} docs, {chunks_total} chunks -> {collection}")
-    except (OSError, urllib.error.URLError, urllib.error.HTTPError) as e:
-        tool("act", {"entity": "Source", "id": sid, "action": "fail_index", "basis": basis})
-        tool("fail_task", {"task_id": tid, "reason": str(e)})
+        tools(("report_progress", {"task_id": tid, "note": r["note"]}),
+              ("complete_task", {"task_id": tid, "result": f"indexed {r['docs']} docs: re-embedded {r['embedded']} "
+                                 f"({r['chunks']} chunks), skipped {r['skipped']}, removed {r['removed']}"}))
+        RUNS.inc(result="ok")
+        pool = POOL.stats()
+        print(f"[ok] {sid[:8]}: {r['embedded']} re-embedded, {r['skipped']} skipped, {r['removed']} removed "
+              f"-> {r['collection']} (http: {pool['opened']} connections opened, {pool['reused']} reused)")
+    except (OSError, urllib.error.URLError, urllib.error.HTTPError, StoreError) as e:
+        tools(("act", {"entity": "Source", "id": sid, "action": "fail_index", "basis": basis}),
+              ("fail_task", {"task_id": tid, "reason": str(e)}))  # the lease is released even if the act fails
+        RUNS.inc(result="fail")
         print(f"[fail] {sid[:8]}: {e}")
 
 
+def watch_sources(trees):
+    """Starts watching the Indexed Files sources, stops watching the rest."""
+    rows = tool("query", {"entity": "Source", "filter": {"kind": "Files"}, "limit": 1000}).get("records") or []
+    statuses = {r["id"]: r["values"].get("status") for r in rows}
+    live = {r["id"]: r["values"].get("path") or "" for r in rows
+            if r["values"].get("kind") == "Files" and statuses[r["id"]] == "Indexed"
+            and os.path.isdir(r["values"].get("path") or "")}
+    for sid in list(trees):
+        if trees[sid][0] != live.get(sid):
+            trees.pop(sid)[1].close()
+            print(f"[watch] {sid[:8]}: stopped (source is {statuses.get(sid, 'gone')})")
+    for sid, base in live.items():
+        if sid not in trees:
+            pending = watch.Debounce(WATCH_DEBOUNCE, WATCH_MAX_DELAY)
+            pending.add({""})  # catch up with what changed while nobody watched
+            trees[sid] = (base, watch.open_tree(base, wanted), pending)
+            print(f"[watch] {sid[:8]}: watching {base} ({type(trees[sid][1]).__name__})")
+
+
+def watch_sync(sid, paths):
+    """One watch run over the changed `paths`; "ok", "busy", "stopped" or "failed"."""
+    with source_lock(sid, wait=False) as held:
+        if not held:
+            return "busy"  # a task run has it
+        try:
+            src = tool("get_record", {"entity": "Source", "id": sid})
+            if src["values"].get("status") != "Indexed":
+                return "stopped"
+            r = sync_source(sid, src, only=paths, stop=status_guard(sid, ("Indexed",)))
+        except (ToolError, OSError, urllib.error.URLError, StoreError) as e:
+            RUNS.inc(result="fail")
+            print(f"[watch] {sid[:8]}: {e}")
+            return "failed"
+    if r["changed"]:
+        tool("update_record", {"entity": "Source", "id": sid, "basis": WATCH_BASIS, "values": {
+            "documents": r["docs"],
+            "last_indexed": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        }})
+        RUNS.inc(result="watch")
+        print(f"[watch] {sid[:8]}: {len(paths)} changed paths: {r['note']}")
+    return "stopped" if r["stopped"] else "ok"
+
+
+def watch_loop():
+    """Watch mode: keeps every Indexed Files source in step with its
+    directory between index tasks, changed paths only, debounced."""
+    trees, refreshed = {}, None
+    while True:
+        try:
+            if refreshed is None or time.monotonic() - refreshed >= WATCH_REFRESH:
+                watch_sources(trees)
+                refreshed = time.monotonic()
+            for sid, (_base, tree, pending) in list(trees.items()):
+                pending.add(tree.poll())
+                paths = pending.due()
+                if paths is None:
+                    continue
+                WATCHED.inc(len(paths))
+                try:
+                    outcome = watch_sync(sid, paths)
+                except BaseException:
+                    pending.add(paths)  # drained above: not lost with the run
+                    raise
+                if outcome in ("busy", "failed"):
+                    pending.add(paths)  # again after the next quiet spell
+                elif outcome == "stopped":
+                    trees.pop(sid)[1].close()
+                    print(f"[watch] {sid[:8]}: stopped (source left Indexed)")
+            time.sleep(WATCH_TICK)
+        except (ToolError, OSError, urllib.error.URLError) as e:
+            print(f"[watch] {e}; retrying in 5s")
+            time.sleep(5)
+        except Exception as e:  # the daemon thread must outlive whatever a run throws
+            print(f"[watch] unexpected {type(e).__name__}: {e}; retrying in 5s")
+            time.sleep(5)
+
+
 def main():
+    metrics.serve()
     me = tool("describe_system")
-    print(f"indexer up: pack={me.get('pack')} role={me.get('your_role')} id={me.get('your_id')}")
+    print(f"indexer up: pack={me.get('pack')} role={me.get('your_role')} id={me.get('your_id')}"
+          + (" (watching Files sources)" if WATCH else ""))
+    if WATCH:
+        threading.Thread(target=watch_loop, name="watch", daemon=True).start()
     while True:
         try:
             tasks = tool("wait_for_task", {"timeout_sec": 25}).get("tasks") or []
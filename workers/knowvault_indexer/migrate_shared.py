@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""Copy per-workspace kv_<workspace_id> collections into the shared collection.
+
+Run once before switching the indexer and search service to KV_LAYOUT=shared:
+every point is copied with its vector and the same id, its payload stamped
+with `workspace` (taken from the collection name), and the local manifests
+are re-pointed so the next index run skips unchanged files instead of
+re-embedding them. Qdrant only: with KV_VECTOR_BACKEND=local, switch the
+layout and re-index instead (the embedding cache makes that cheap).
+Run it with the same env as the indexer: the shared collection is created
+with its quantization and on-disk options, and payloads are copied compact
+(chunk text in the text store) or in full, as KV_COMPACT_PAYLOAD says.
+
+Usage:  python migrate_shared.py [--drop]   (--drop deletes each source collection after copying)
+Env:    as the indexer: KV_QDRANT, KV_QUANTIZATION, KV_RESCORE, KV_OVERSAMPLING,
+        KV_ON_DISK_VECTORS, KV_ON_DISK_PAYLOAD (see vectorstore.py), KV_COMPACT_PAYLOAD,
+        KV_TEXT_STORE (see textstore.py), KV_SHARED_COLLECTION, KV_STATE
+Zero dependencies: stdlib only.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import kvlayout  # noqa: E402
+import kvstate  # noqa: E402
+from httppool import POOL  # noqa: E402
+from textstore import open_texts  # noqa: E402
+from vectorstore import QdrantStore, open_store  # noqa: E402
+
+STORE = open_store()
+TEXTS = open_texts()
+PAGE = 256
+
+
+def http(url, body=None, method=None):
+    return POOL.json(url, body, None, method, timeout=120)
+
+
+def ensure_shared(dim):
+    STORE.ensure_collection(kvlayout.SHARED_COLLECTION, dim)
+    # also when the collection already existed: ensure_collection indexes only a new one
+    http(f"{STORE.url}/collections/{kvlayout.SHARED_COLLECTION}/index?wait=true", method="PUT",
+         body=kvlayout.WORKSPACE_INDEX)
+
+
+def stamp(payloads, workspace):
+    """`payloads` stamped with `workspace`, their chunk text moved to the text
+    store (compact on) or brought back from it (compact off)."""
+    out = [{**p, "workspace": workspace} for p in payloads]
+    if TEXTS.compact:
+        todo = [p for p in out if "text" in p]
+        for p, r in zip(todo, TEXTS.put([p["text"] for p in todo])):
+            p["text_ref"] = r
+            del p["text"]
+    else:
+        texts = TEXTS.get([p["text_ref"] for p in out if "text" not in p and "text_ref" in p])
+        for p in out:
+            if "text" not in p and p.get("text_ref") in texts:
+                p["text"] = texts[p.pop("text_ref")]
+    return out
+
+
+def copy_collection(name):
+    workspace = name[len("kv_"):]
+    info = http(f"{STORE.url}/collections/{name}")["result"]
+    ensure_shared(info["config"]["params"]["vectors"]["size"])
+    copied, offset = 0, None
+    while True:
+        page = http(f"{STORE.url}/collections/{name}/points/scroll", method="POST", body={
+            "limit": PAGE, "offset": offset, "with_payload": True, "with_vector": True})["result"]
+        payloads = stamp([p["payload"] or {} for p in page["points"]], workspace)
+        points = [{"id": p["id"], "vector": p["vector"], "payload": payload}
+                  for p, payload in zip(page["points"], payloads)]
+        if points:
+            STORE.upsert(kvlayout.SHARED_COLLECTION, points)
+            copied += len(points)
+        offset = page.get("next_page_offset")
+        if offset is None:
+            return copied
+
+
+def repoint_manifests(moved):
+    folder = os.path.join(kvstate.STATE, "manifests")
+    if not os.path.isdir(folder):
+        return 0
+    n = 0
+    for fname in os.listdir(folder):
+        p = os.path.join(folder, fname)
+        m = kvstate.load_json(p)
+        if m and m.get("collection") in moved:
+            m["collection"] = kvlayout.SHARED_COLLECTION
+            kvstate.save_json(p, m)
+            n += 1
+    return n
+
+
+def main():
+    if not isinstance(STORE, QdrantStore):
+        sys.exit("migrate_shared.py is Qdrant only: with KV_VECTOR_BACKEND=local, "
+                 "set KV_LAYOUT=shared and re-index")
+    drop = "--drop" in sys.argv[1:]
+    names = STORE.collections()
+    moved = []
+    for name in sorted(names):
+        if not name.startswith("kv_") or name == kvlayout.SHARED_COLLECTION:
+            continue
+        n = copy_collection(name)
+        moved.append(name)
+        print(f"{name}: {n} points -> {kvlayout.SHARED_COLLECTION}")
+        if drop:
+            http(f"{STORE.url}/collections/{name}", method="DELETE")
+            print(f"{name}: dropped")
+    print(f"{len(moved)} collections migrated, {repoint_manifests(set(moved))} manifests re-pointed")
+    print("now set KV_LAYOUT=shared for the indexer and the search service")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,547 @@
+"""Text out of a PDF, stdlib only — enough for indexing, not for rendering.
+
+Objects are found by scanning the file (no xref needed, so damaged files
+and incremental updates mostly work), compressed object streams included.
+Pages are walked from the catalog in reading order; each page's content
+stream is interpreted just far enough to collect shown strings (Tj, TJ, ',
+") and line/paragraph breaks from text positioning, recursing into form
+XObjects. Strings are decoded through the font's ToUnicode CMap when it has
+one, else through its simple encoding (WinAnsi/MacRoman/Standard plus
+/Differences). Composite fonts without a ToUnicode CMap, images and
+encrypted documents yield no text.
+
+Filters: FlateDecode (with PNG predictors), LZWDecode, ASCIIHexDecode,
+ASCII85Decode, RunLengthDecode.
+"""
+import base64
+import re
+import zlib
+
+_WS = b" \t\r\n\f\x00"
+_DELIM = b"()<>[]{}/%"
+_OBJ = re.compile(rb"(\d+)\s+(\d+)\s+obj\b")
+_NUM = re.compile(rb"[+-]?(?:\d+\.?\d*|\.\d+)")
+MAX_DEPTH = 8  # nested forms / page tree levels followed
+
+
+class Name(str):
+    pass
+
+
+class Op(str):
+    pass
+
+
+class Ref(tuple):
+    pass
+
+
+class PDFError(ValueError):
+    pass
+
+
+class _Lexer:
+    def __init__(self, data, pos=0):
+        self.data, self.pos = data, pos
+
+    def _skip(self):
+        data, n = self.data, len(self.data)
+        while self.pos < n:
+            c = data[self.pos]
+            if c in _WS:
+                self.pos += 1
+            elif c == 0x25:  # % comment
+                end = data.find(b"\n", self.pos)
+                self.pos = n if end < 0 else end + 1
+            else:
+                return
+
+    def token(self):
+        """Next token: int/float, Name, bytes (string), Op, or one of
+        "[", "]", "<<", ">>"; None at the end."""
+        self._skip()
+        data, p = self.data, self.pos
+        if p >= len(data):
+            return None
+        c = data[p:p + 1]
+        if c == b"/":
+            end = p + 1
+            while end < len(data) and data[end] not in _WS and data[end] not in _DELIM:
+                end += 1
+            self.pos = end
+            return Name(re.sub(rb"#([0-9a-fA-F]{2})", lambda m: bytes([int(m.group(1), 16)]),
+                               data[p + 1:end]).decode("latin-1"))
+        if c == b"(":
+            return self._literal()
+        if c == b"<":
+            if data[p + 1:p + 2] == b"<":
+                self.pos = p + 2
+                return "<<"
+            end = data.find(b">", p)
+            end = len(data) if end < 0 else end
+            self.pos = end + 1
+            digits = re.sub(rb"[^0-9a-fA-F]", b"", data[p + 1:end])
+            return bytes.fromhex((digits + b"0" * (len(digits) % 2)).decode())
+        if c == b">":
+            self.pos = p + (2 if data[p + 1:p + 2] == b">" else 1)
+            return ">>"
+        if c in (b"[", b"]", b"{", b"}"):
+            self.pos = p + 1
+            return c.decode()
+        m = _NUM.match(data, p)
+        if m and (m.end() == len(data) or data[m.end()] in _WS or data[m.end()] in _DELIM):
+            self.pos = m.end()
+            s = m.group()
+            return float(s) if b"." in s else int(s)
+        end = p + 1
+        while end < len(data) and data[end] not in _WS and data[end] not in _DELIM:
+            end += 1
+        self.pos = end
+        return Op(data[p:end].decode("latin-1"))
+
+    def _literal(self):
+        data, p, depth, out = self.data, self.pos + 1, 1, bytearray()
+        while p < len(data):
+            c = data[p]
+            if c == 0x5C:  # backslash
+                p += 1
+                e = data[p:p + 1]
+                if not e:
+                    break
+                if e in b"nrtbf":
+                    out += {b"n": b"\n", b"r": b"\r", b"t": b"\t", b"b": b"\b", b"f": b"\f"}[e]
+                elif e in b"01234567":
+                    m = re.match(rb"[0-7]{1,3}", data[p:p + 3])
+                    out.append(int(m.group(), 8) & 0xFF)
+                    p += len(m.group()) - 1
+                elif e == b"\r":
+                    p += 1 if data[p + 1:p + 2] == b"\n" else 0
+                elif e != b"\n":
+                    out += e
+            elif c == 0x28:
+                depth += 1
+                out.append(c)
+            elif c == 0x29:
+                depth -= 1
+                if depth == 0:
+                    break
+                out.append(c)
+            else:
+                out.append(c)
+            p += 1
+        self.pos = p + 1
+        return bytes(out)
+
+    def value(self, tok=None):
+        """One complete object (dict, list, Ref...) starting at `tok`."""
+        tok = self.token() if tok is None else tok
+        if tok == "[":
+            out = []
+            while True:
+                t = self.token()
+                if t in ("]", None):
+                    return out
+                out.append(self.value(t))
+        if tok == "<<":
+            out = {}
+            while True:
+                k = self.token()
+                if k in (">>", None):
+                    return out
+                out[k] = self.value()
+        if isinstance(tok, int):  # maybe "n g R"
+            save = self.pos
+            gen, r = self.token(), self.token()
+            if isinstance(gen, int) and isinstance(r, Op) and r == "R":
+                return Ref((tok, gen))
+            self.pos = save
+        if tok in ("true", "false"):
+            return tok == "true"
+        if tok == "null":
+            return None
+        return tok
+
+
+class Document:
+    def __init__(self, data):
+        if not data.startswith(b"%PDF") and b"%PDF" not in data[:1024]:
+            raise PDFError("not a PDF")
+        if re.search(rb"/Encrypt\s*\d+\s+\d+\s+R", data):
+            raise PDFError("encrypted PDF")
+        self.data = data
+        self.objects = {}  # num -> value; streams as (dict, raw bytes)
+        self._scan()
+
+    def _scan(self):
+        data, pos, packed = self.data, 0, []
+        while True:
+            m = _OBJ.search(data, pos)
+            if not m:
+                break
+            lex = _Lexer(data, m.end())
+            try:
+                obj = lex.value()
+            except (ValueError, IndexError, RecursionError):
+                pos = m.end()
+                continue
+            pos = lex.pos
+            if isinstance(obj, dict):
+                save = lex.pos
+                if lex.token() == "stream":
+                    start = lex.pos + (2 if data[lex.pos:lex.pos + 2] == b"\r\n" else 1)
+                    length = obj.get("Length")
+                    end = start + length if isinstance(length, int) else -1
+                    if end < 0 or data[end:end + 20].strip()[:9] != b"endstream":
+                        end = data.find(b"endstream", start)
+                        end = len(data) if end < 0 else end
+                    obj = (obj, data[start:end])
+                    pos = end
+                else:
+                    lex.pos = save
+            num = int(m.group(1))
+            self.objects[num] = obj
+            if isinstance(obj, tuple) and obj[0].get("Type") == "ObjStm":
+                packed.append(obj)
+        for head, raw in packed:
+            try:
+                body = self.decode((head, raw))
+            except (ValueError, zlib.error):
+                continue
+            lex = _Lexer(body)
+            nums = [lex.token() for _ in range(2 * int(head.get("N", 0)))]
+            first = int(head.get("First", 0))
+            for num, off in zip(nums[::2], nums[1::2]):
+                if isinstance(num, int) and isinstance(off, int) and num not in self.objects:
+                    self.objects[num] = _Lexer(body, first + off).value()
+
+    def get(self, v, depth=0):
+        while isinstance(v, Ref) and depth < 32:
+            v, depth = self.objects.get(v[0]), depth + 1
+        return v
+
+    def decode(self, stream):
+        head, raw = self.get(stream)
+        filters = self.get(head.get("Filter"))
+        parms = self.get(head.get("DecodeParms"))
+        filters = filters if isinstance(filters, list) else [filters] if filters else []
+        parms = parms if isinstance(parms, list) else [parms] * len(filters)
+        for f, p in zip(filters, parms):
+            raw = _filter(self.get(f), raw, self.get(p) or {})
+        return raw
+
+    def pages(self):
+        """(page dict, inherited resources) in reading order."""
+        root = next((o for o in self.objects.values() if isinstance(o, dict) and o.get("Type") == "Catalog"), None)
+        out = []
+        if root is not None:
+            self._walk(self.get(root.get("Pages")), {}, out, 0, set())
+        if not out:  # no usable page tree: every page object, in object order
+            out = [(o, {}) for _n, o in sorted(self.objects.items()) if isinstance(o, dict) and o.get("Type") == "Page"]
+        return out
+
+    def _walk(self, node, resources, out, depth, seen):
+        if not isinstance(node, dict) or depth > 64 or id(node) in seen:
+            return
+        seen.add(id(node))
+        resources = self.get(node.get("Resources")) or resources
+        if node.get("Type") == "Pages" or "Kids" in node:
+            for kid in self.get(node.get("Kids")) or []:
+                self._walk(self.get(kid), resources, out, depth + 1, seen)
+        else:
+            out.append((node, resources))
+
+    def text(self):
+        pages = []
+        for page, resources in self.pages():
+            contents = self.get(page.get("Contents"))
+            parts = contents if isinstance(contents, list) else [contents] if contents else []
+            body = b"\n".join(self._stream_bytes(p) for p in parts)
+            text = _Page(self).run(body, self.get(page.get("Resources")) or resources, 0)
+            if text.strip():
+                pages.append(text.strip())
+        return "\n\n".join(pages)
+
+    def _stream_bytes(self, ref):
+        s = self.get(ref)
+        if not isinstance(s, tuple):
+            return b""
+        try:
+            return self.decode(s)
+        except (ValueError, zlib.error, LookupError):
+            return b""
+
+
+def _filter(name, raw, parms):
+    if name in ("FlateDecode", "Fl"):
+        d, out = zlib.decompressobj(), []
+        try:
+            for i in range(0, len(raw), 1 << 16):
+                out.append(d.decompress(raw[i:i + (1 << 16)]))
+        except zlib.error:
+            if not any(out):
+                raise  # a damaged stream keeps what was inflated before the damage
+        return _predict(b"".join(out), parms)
+    if name in ("LZWDecode", "LZW"):
+        return _predict(_lzw(raw, parms.get("EarlyChange", 1)), parms)
+    if name in ("ASCIIHexDecode", "AHx"):
+        digits = re.sub(rb"[^0-9a-fA-F]", b"", raw.split(b">", 1)[0])
+        return bytes.fromhex((digits + b"0" * (len(digits) % 2)).decode())
+    if name in ("ASCII85Decode", "A85"):
+        body = raw.strip()
+        body = body[2:] if body.startswith(b"<~") else body
+        return base64.a85decode(body.split(b"~>", 1)[0], ignorechars=_WS)
+    if name in ("RunLengthDecode", "RL"):
+        out, i = bytearray(), 0
+        while i < len(raw) and raw[i] != 128:
+            n = raw[i]
+            if n < 128:
+                out += raw[i + 1:i + 2 + n]
+                i += n + 2
+            else:
+                out += raw[i + 1:i + 2] * (257 - n)
+                i += 2
+        return bytes(out)
+    raise PDFError(f"unsupported filter {name}")  # DCT, JBIG2...: images, no text
+
+
+def _predict(raw, parms):
+    pred = parms.get("Predictor", 1) if isinstance(parms, dict) else 1
+    if pred < 10:
+        return raw
+    colors, bpc, cols = parms.get("Colors", 1), parms.get("BitsPerComponent", 8), parms.get("Columns", 1)
+    bpp = max(1, colors * bpc // 8)
+    width = (colors * bpc * cols + 7) // 8
+    out, prev = bytearray(), bytearray(width)
+    for i in range(0, len(raw), width + 1):
+        kind, row = raw[i], bytearray(raw[i + 1:i + 1 + width].ljust(width, b"\0"))
+        for x in range(width):
+            a = row[x - bpp] if x >= bpp else 0
+            b, c = prev[x], prev[x - bpp] if x >= bpp else 0
+            if kind == 1:
+                row[x] = (row[x] + a) & 0xFF
+            elif kind == 2:
+                row[x] = (row[x] + b) & 0xFF
+            elif kind == 3:
+                row[x] = (row[x] + (a + b) // 2) & 0xFF
+            elif kind == 4:
+                p = a + b - c
+                pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                row[x] = (row[x] + (a if pa <= pb and pa <= pc else b if pb <= pc else c)) & 0xFF
+        out += row
+        prev = row
+    return bytes(out)
+
+
+def _lzw(raw, early=1):
+    out, table, bits, pos, prev = bytearray(), [bytes([i]) for i in range(256)] + [b"", b""], 9, 0, b""
+    total = len(raw) * 8
+    while pos + bits <= total:
+        word = int.from_bytes(raw[pos // 8:pos // 8 + 3].ljust(3, b"\0"), "big")
+        code = word >> (24 - bits - pos % 8) & ((1 << bits) - 1)
+        pos += bits
+        if code == 256:
+            table, bits, prev = table[:258], 9, b""
+            continue
+        if code == 257:
+            break
+        entry = table[code] if code < len(table) else prev + prev[:1]
+        out += entry
+        if prev:
+            table.append(prev + entry[:1])
+        prev = entry
+        if len(table) + early >= 1 << bits and bits < 12:
+            bits += 1
+    return bytes(out)
+
+
+class _Font:
+    def __init__(self, doc, font):
+        font = doc.get(font) if isinstance(font, Ref) else font
+        font = font if isinstance(font, dict) else {}
+        self.cmap, self.widths = {}, set()
+        self.composite = font.get("Subtype") == "Type0"
+        self.table = None
+        cmap = doc.get(font.get("ToUnicode"))
+        if isinstance(cmap, tuple):
+            self._read_cmap(doc._stream_bytes(cmap))
+        if not self.cmap:
+            self._read_encoding(doc, doc.get(font.get("Encoding")))
+
+    def _read_cmap(self, body):
+        lex, stack, mode = _Lexer(body), [], None
+        while True:
+            t = lex.token()
+            if t is None:
+                break
+            if t in ("beginbfchar", "beginbfrange", "begincodespacerange"):
+                mode, stack = t, []
+            elif t in ("endbfchar", "endbfrange", "endcodespacerange"):
+                mode = None
+            elif mode == "begincodespacerange" and isinstance(t, bytes):
+                self.widths.add(len(t))
+            elif mode == "beginbfchar" and isinstance(t, bytes):
+                stack.append(t)
+                if len(stack) == 2:
+                    src, dst = stack
+                    self.cmap[src] = _utf16(dst)
+                    self.widths.add(len(src))
+                    stack = []
+            elif mode == "beginbfrange":
+                stack.append(lex.value(t))
+                if len(stack) == 3:
+                    lo, hi, dst = stack
+                    stack = []
+                    if not (isinstance(lo, bytes) and isinstance(hi, bytes)) or not lo:
+                        continue
+                    a, b = int.from_bytes(lo, "big"), int.from_bytes(hi, "big")
+                    for i, code in enumerate(range(a, min(b, a + 65535) + 1)):
+                        key = code.to_bytes(len(lo), "big")
+                        if isinstance(dst, list):
+                            if i < len(dst) and isinstance(dst[i], bytes):
+                                self.cmap[key] = _utf16(dst[i])
+                        elif isinstance(dst, bytes) and dst:
+                            bump = int.from_bytes(dst[-2:], "big") + i
+                            self.cmap[key] = _utf16(dst[:-2] + (bump & 0xFFFF).to_bytes(2, "big"))
+                    self.widths.add(len(lo))
+
+    def _read_encoding(self, doc, enc):
+        base, diffs = enc, None
+        if isinstance(enc, dict):
+            base, diffs = enc.get("BaseEncoding"), doc.get(enc.get("Differences"))
+        codec = {"MacRomanEncoding": "mac_roman"}.get(base, "cp1252")
+        self.table = [bytes([i]).decode(codec, "replace") for i in range(256)]
+        code = 0
+        for d in diffs or []:
+            if isinstance(d, int):
+                code = d
+            elif isinstance(d, Name) and 0 <= code < 256:
+                self.table[code] = _glyph(d, self.table[code])
+                code += 1
+
+    def decode(self, s):
+        if self.cmap:
+            widths = sorted(self.widths or {1}, reverse=True)
+            out, i = [], 0
+            while i < len(s):
+                for w in widths:
+                    hit = self.cmap.get(s[i:i + w])
+                    if hit is not None:
+                        out.append(hit)
+                        i += w
+                        break
+                else:
+                    i += widths[-1]
+            return "".join(out)
+        if self.composite:
+            return ""  # CIDs without a map say nothing about the characters
+        return "".join(self.table[b] for b in s)
+
+
+def _utf16(b):
+    return b.decode("utf-16-be", "ignore") if len(b) % 2 == 0 else b.decode("latin-1")
+
+
+_GLYPHS = {"space": " ", "hyphen": "-", "period": ".", "comma": ",", "colon": ":", "semicolon": ";",
+           "quoteright": "’", "quoteleft": "‘", "quotedbl": '"', "quotesingle": "'",
+           "parenleft": "(", "parenright": ")", "slash": "/", "endash": "–", "emdash": "—",
+           "bullet": "•", "fi": "fi", "fl": "fl", "ff": "ff", "ffi": "ffi", "ffl": "ffl",
+           "zero": "0", "one": "1", "two": "2", "three": "3", "four": "4", "five": "5", "six": "6",
+           "seven": "7", "eight": "8", "nine": "9"}
+
+
+def _glyph(name, default):
+    if len(name) == 1:
+        return name
+    m = re.fullmatch(r"uni([0-9A-Fa-f]{4})+", name) or re.fullmatch(r"u([0-9A-Fa-f]{4,6})", name)
+    if m:
+        hexes = name[3:] if name.startswith("uni") else name[1:]
+        step = 4 if name.startswith("uni") else len(hexes)
+        return "".join(chr(int(hexes[i:i + step], 16)) for i in range(0, len(hexes), step))
+    return _GLYPHS.get(name.split(".")[0], default)
+
+
+class _Page:
+    """Shown text of one content stream, with breaks inferred from positioning."""
+
+    def __init__(self, doc):
+        self.doc, self.out, self.fonts = doc, [], {}
+
+    def run(self, body, resources, depth):
+        resources = self.doc.get(resources) or {}
+        fonts = self.doc.get(resources.get("Font")) or {}
+        xobjects = self.doc.get(resources.get("XObject")) or {}
+        lex, ops = _Lexer(body), []
+        font, size, y, scale = None, 12.0, None, 1.0
+        while True:
+            t = lex.token()
+            if t is None:
+                break
+            if not isinstance(t, Op):
+                ops.append(lex.value(t) if t in ("[", "<<") else t)
+                continue
+            if t == "BI":  # inline image: skip its binary data
+                end = re.compile(rb"\sEI(?=[\s]|$)").search(body, lex.pos)
+                lex.pos = end.end() if end else len(body)
+            elif t == "Tf" and len(ops) >= 2:
+                key = ops[-2]
+                if key not in self.fonts:
+                    self.fonts[key] = _Font(self.doc, fonts.get(key))
+                font = self.fonts[key]
+                size = abs(ops[-1]) if isinstance(ops[-1], (int, float)) and ops[-1] else size
+            elif t in ("Td", "TD") and len(ops) >= 2 and isinstance(ops[-1], (int, float)):
+                if ops[-1]:
+                    self._newline(abs(ops[-1]) > 1.8 * size)
+                elif isinstance(ops[-2], (int, float)) and ops[-2] > size:
+                    self._space()
+            elif t == "Tm" and len(ops) >= 6 and isinstance(ops[-1], (int, float)):
+                if y is not None and ops[-1] != y:
+                    self._newline(abs(ops[-1] - y) > 1.8 * size * scale)
+                y = ops[-1]
+                scale = abs(ops[-3]) if isinstance(ops[-3], (int, float)) and ops[-3] else 1.0
+            elif t == "T*":
+                self._newline(False)
+            elif t in ("Tj", "'", '"') and ops and isinstance(ops[-1], bytes):
+                if t != "Tj":
+                    self._newline(False)
+                self._show(font, ops[-1])
+            elif t == "TJ" and ops and isinstance(ops[-1], list):
+                for part in ops[-1]:
+                    if isinstance(part, bytes):
+                        self._show(font, part)
+                    elif isinstance(part, (int, float)) and part < -200:
+                        self._space()
+            elif t == "ET":
+                self._space()
+            elif t == "Do" and ops and depth < MAX_DEPTH:
+                form = self.doc.get(xobjects.get(ops[-1]))
+                if isinstance(form, tuple) and form[0].get("Subtype") == "Form":
+                    self._newline(False)
+                    saved = self.fonts
+                    self.fonts = {}
+                    self.run(self.doc._stream_bytes(form), form[0].get("Resources") or resources, depth + 1)
+                    self.fonts = saved
+            ops = []
+        return "".join(self.out)
+
+    def _show(self, font, s):
+        if font is None:
+            font = self.fonts.setdefault(None, _Font(self.doc, {}))
+        self.out.append(font.decode(s))
+
+    def _space(self):
+        if self.out and not self.out[-1].endswith((" ", "\n")):
+            self.out.append(" ")
+
+    def _newline(self, paragraph):
+        if not self.out:
+            return
+        tail = "".join(self.out[-2:])
+        if paragraph and not tail.endswith("\n\n"):
+            self.out.append("\n" if tail.endswith("\n") else "\n\n")
+        elif not tail.endswith("\n"):
+            self.out.append("\n")
+
+
+def pdf_text(path):
+    with open(path, "rb") as f:
+        return Document(f.read()).text()
@@ -0,0 +1,97 @@
+"""Bounded-queue thread pipeline: stage -> queue -> stage -> ...
+
+Each stage is `fn(item, emit)` run by N threads; `emit` hands a result to the
+next stage and blocks while its queue is full, so a slow stage throttles the
+ones before it (backpressure) and memory stays at ~depth items per queue no
+matter how large the source is. A stage may also take `flush(emit)`, called
+once after its input is exhausted — for stages that accumulate (batching).
+The first exception aborts the whole run and is re-raised from run().
+
+Stdlib only.
+"""
+import queue
+import threading
+
+_STOP = object()
+
+
+class Pipeline:
+    def __init__(self, depth=8):
+        self.depth = depth
+        self.stages = []  # (name, fn, workers, flush)
+        self._abort = threading.Event()
+        self._error = None
+        self._lock = threading.Lock()
+
+    def stage(self, name, fn, workers=1, flush=None):
+        self.stages.append((name, fn, max(1, int(workers)), flush))
+        return self
+
+    def _put(self, q, item):
+        while not self._abort.is_set():
+            try:
+                q.put(item, timeout=0.2)
+                return
+            except queue.Full:
+                continue
+
+    def _fail(self, e):
+        with self._lock:
+            if self._error is None:
+                self._error = e
+        self._abort.set()
+
+    def run(self, source):
+        """Feed every item of `source` through the stages; returns when drained."""
+        queues = [queue.Queue(self.depth) for _ in self.stages]
+        remaining = [w for _n, _f, w, _fl in self.stages]
+        threads = []
+
+        for i, (name, fn, workers, flush) in enumerate(self.stages):
+            nxt = queues[i + 1] if i + 1 < len(queues) else None
+            emit = (lambda item, q=nxt: self._put(q, item)) if nxt else (lambda item: None)
+
+            def work(i=i, fn=fn, emit=emit, nxt=nxt, flush=flush):
+                try:
+                    while not self._abort.is_set():
+                        try:
+                            item = queues[i].get(timeout=0.2)
+                        except queue.Empty:
+                            continue
+                        if item is _STOP:
+                            break
+                        fn(item, emit)
+                except BaseException as e:  # noqa: BLE001 — surfaced by run()
+                    self._fail(e)
+                finally:
+                    with self._lock:
+                        remaining[i] -= 1
+                        last = remaining[i] == 0
+                    if last:
+                        try:
+                            if flush is not None and not self._abort.is_set():
+                                flush(emit)
+                        except BaseException as e:  # noqa: BLE001
+                            self._fail(e)
+                        if nxt is not None:
+                            for _ in range(self.stages[i + 1][2]):
+                                self._put(nxt, _STOP)
+
+            for n in range(workers):
+                t = threading.Thread(target=work, name=f"{name}-{n}", daemon=True)
+                t.start()
+                threads.append(t)
+
+        try:
+            for item in source:
+                if self._abort.is_set():
+                    break
+                self._put(queues[0], item)
+        except BaseException as e:  # noqa: BLE001
+            self._fail(e)
+        for _ in range(self.stages[0][2]):
+            self._put(queues[0], _STOP)
+        for t in threads:
+            t.join()
+        if self._error is not None:
+            raise self._error
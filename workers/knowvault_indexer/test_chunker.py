@@ -0,0 +1,58 @@
+"""Regression: streaming iter_chunks() == the original whole-text chunk().
+
+Run: python -m unittest discover -s workers/knowvault_indexer -p "test_*.py"
+"""
+import random
+import unittest
+
+from chunker import chunk, iter_chunks
+
+
+def reference_chunk(text, size):
+    """The pre-streaming implementation, kept verbatim as the oracle."""
+    out, cur = [], ""
+    for para in text.split("\n\n"):
+        if len(cur) + len(para) + 2 <= size:
+            cur = (cur + "\n\n" + para).strip()
+            continue
+        if cur:
+            out.append(cur)
+        while len(para) > size:
+            out.append(para[:size])
+            para = para[size:]
+        cur = para
+    if cur.strip():
+        out.append(cur.strip())
+    return out
+
+
+def blocks_of(text, n):
+    return [text[i:i + n] for i in range(0, len(text), n)]
+
+
+class ChunkerTest(unittest.TestCase):
+    def test_examples(self):
+        for text in ["", "a", "\n\n", "a\n\nb", "a\n\n\nb", "a\n\n\n\nb", " \n\n x ",
+                     "x" * 25, "ab\n\n" + "y" * 31 + "\n\ncd", "\n" * 7, "p\n\n" * 9]:
+            for size in (1, 2, 5, 10, 30):
+                self.assertEqual(chunk(text, size), reference_chunk(text, size), (text, size))
+
+    def test_random_blocks(self):
+        rnd = random.Random(7)
+        alphabet = "ab \n"
+        for _ in range(400):
+            text = "".join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 200)))
+            size = rnd.randint(1, 40)
+            want = reference_chunk(text, size)
+            for n in (1, 2, 3, 17, 64, 1000):
+                self.assertEqual(list(iter_chunks(blocks_of(text, n), size)), want, (text, size, n))
+
+    def test_long_paragraph_streams(self):
+        # a paragraph far larger than the chunk size yields pieces before it ends
+        out = iter_chunks(("z" * 100 for _ in range(10 ** 6)), 512)
+        first = next(out)
+        self.assertEqual(first, "z" * 512)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+"""convert_collections.py on the local backend: compaction and the text-store GC.
+
+Run: python -m unittest discover -s workers/knowvault_indexer -p "test_*.py"
+"""
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import kvlayout
+
+
+class ConvertTest(unittest.TestCase):
+    def setUp(self):
+        state = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, state, True)
+        env = mock.patch.dict(os.environ, {
+            "KV_VECTOR_BACKEND": "local", "KV_LOCAL_VECTORS": os.path.join(state, "vectors"),
+            "KV_COMPACT_PAYLOAD": "on", "KV_TEXT_STORE": os.path.join(state, "texts.sqlite")})
+        env.start()
+        self.addCleanup(env.stop)
+        sys.modules.pop("convert_collections", None)  # reads its env at import
+        self.addCleanup(sys.modules.pop, "convert_collections", None)
+        self.convert = importlib.import_module("convert_collections")
+        self.addCleanup(self.convert.TEXTS._db.close)
+
+    def point(self, i, text, workspace):
+        return {"id": f"00000000-0000-0000-0000-00000000000{i}", "vector": [1.0, float(i)],
+                "payload": {"workspace": workspace, "file": f"{i}.txt", "text": text}}
+
+    def test_gc_keeps_texts_of_a_custom_shared_collection(self):
+        store, texts = self.convert.STORE, self.convert.TEXTS
+        with mock.patch.object(kvlayout, "SHARED_COLLECTION", "knowvault"):
+            for name, point in (("knowvault", self.point(1, "shared text", "ws1")),
+                                ("kv_ws2", self.point(2, "workspace text", "ws2")),
+                                ("other", self.point(3, "not ours", "ws3"))):
+                store.ensure_collection(name, 2)
+                store.upsert(name, [point])
+            self.assertEqual(self.convert.knowvault_collections(), ["knowvault", "kv_ws2"])
+            for name in self.convert.knowvault_collections():
+                self.assertEqual(self.convert.convert_payloads(name), (1, 0))
+            orphan = texts.put(["dropped from every collection"])[0]
+            self.assertEqual(self.convert.sweep(), 1)
+        payload = next(store.scroll("knowvault"))[0]["payload"]
+        self.assertNotIn("text", payload)
+        self.assertEqual(texts.get([payload["text_ref"]]), {payload["text_ref"]: "shared text"})
+        self.assertEqual(texts.get([orphan]), {})
+        self.assertEqual(texts.stats()["texts"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
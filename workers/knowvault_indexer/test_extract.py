@@ -0,0 +1,91 @@
+"""Extractors on small hand-built documents, and the process pool's failure modes.
+
+Run: python -m unittest discover -s workers/knowvault_indexer -p "test_*.py"
+"""
+import contextlib
+import os
+import tempfile
+import unittest
+import zipfile
+import zlib
+
+from extract import ExtractError, Extractor, FORMATS
+from pdftext import pdf_text
+
+
+def build_pdf(content):
+    """A one-page PDF; `content` is the page's content stream, compressed."""
+    stream = zlib.compress(content)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 /Resources << /Font << /F1 4 0 R >> >> >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 5 0 R >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+        b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream) + stream + b"\nendstream",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    for i, body in enumerate(objects, 1):
+        out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+    return bytes(out + b"trailer\n<< /Root 1 0 R >>\n%%EOF\n")
+
+
+class ExtractTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write(self, name, data):
+        p = os.path.join(self.tmp.name, name)
+        with open(p, "wb") as f:
+            f.write(data)
+        return p
+
+    def test_pdf(self):
+        p = self.write("a.pdf", build_pdf(
+            b"BT /F1 12 Tf 72 700 Td (Contract INV-7/1) Tj 0 -14 Td [(amo) 20 (unt) -400 (\\(due\\))] TJ "
+            b"0 -40 Td (Caf\\351) Tj ET"))
+        self.assertEqual(pdf_text(p), "Contract INV-7/1\namount (due)\n\nCafé")
+
+    def test_pdf_differences(self):
+        p = self.write("a.pdf", build_pdf(b"BT /F1 12 Tf (\\001b) Tj ET").replace(
+            b"/Encoding /WinAnsiEncoding", b"/Encoding << /Differences [1 /uni0416] >>"))
+        self.assertEqual(pdf_text(p), "Жb")
+
+    def test_docx(self):
+        w = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+        p = os.path.join(self.tmp.name, "a.docx")
+        with zipfile.ZipFile(p, "w") as z:
+            z.writestr("word/document.xml", f"<w:document {w}><w:body>"
+                       "<w:p><w:r><w:t>Contract</w:t><w:tab/><w:t>INV-7</w:t></w:r></w:p>"
+                       "<w:p><w:r><w:t>one</w:t><w:br/><w:t>two</w:t></w:r></w:p></w:body></w:document>")
+        self.assertEqual(FORMATS[".docx"][2](p), "Contract\tINV-7\n\none\ntwo")
+
+    def test_html(self):
+        p = self.write("a.html", '<html><head><meta charset="windows-1251"><title>Т</title>'
+                       "<style>p{}</style></head><body><h1>Head</h1><p>one  <b>two</b></p>"
+                       "<script>x()</script><ul><li>a</li><li>b</li></ul></body></html>".encode("cp1251"))
+        self.assertEqual(FORMATS[".html"][2](p), "Т\n\nHead\n\none two\n\na\nb")
+
+    def test_pool_caches_by_content(self):
+        ex = Extractor(os.path.join(self.tmp.name, "cache"), workers=1, timeout=30)
+        self.addCleanup(ex.close)
+        src = self.write("a.html", b"<p>hello</p>")
+        enter = lambda: contextlib.nullcontext(src)  # noqa: E731
+        first = ex.extract("ab" * 32, "a.html", enter)
+        with open(first, encoding="utf-8") as f:
+            self.assertEqual(f.read(), "hello")
+        self.assertEqual(ex.extract("ab" * 32, "copy.htm", enter), first)
+        self.assertEqual((ex.stats()["extracted"], ex.stats()["cached"]), (1, 1))
+
+    def test_pool_reports_broken_documents(self):
+        ex = Extractor(os.path.join(self.tmp.name, "cache"), workers=1, timeout=30)
+        self.addCleanup(ex.close)
+        src = self.write("a.pdf", b"not a pdf")
+        with self.assertRaises(ExtractError) as cm:
+            ex.extract("cd" * 32, "a.pdf", lambda: contextlib.nullcontext(src))
+        self.assertFalse(cm.exception.retry)
+        self.assertEqual(ex.stats()["killed"], 0)  # the process survives a bad document
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,214 @@
+"""The indexer against a fake node, on the local vector backend and a temporary state dir.
+
+Run: python -m unittest discover -s workers/knowvault_indexer -p "test_*.py"
+"""
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+import urllib.error
+from unittest import mock
+
+import kvstate
+
+SID = "11111111-2222-3333-4444-555555555555"
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+
+class Stop(BaseException):
+    """Ends watch_loop(), which outlives any Exception."""
+
+
+class IndexerCase(unittest.TestCase):
+    def setUp(self):
+        state = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, state, True)
+        self.docs = os.path.join(state, "docs")
+        os.makedirs(self.docs)
+        for patcher in (mock.patch.dict(os.environ, {
+                "KALITA_TOKEN": "t", "KV_VECTOR_BACKEND": "local", "KV_LOCAL_VECTORS": os.path.join(state, "vectors"),
+                "KV_STATE": state, "KV_EMBED_CACHE": "off", "KV_LEXICAL": "off", "KV_WATCH_BACKEND": "scan",
+                "KV_WATCH_DEBOUNCE": "0", "KV_WATCH_MAX_DELAY": "0", "KV_RETRIES": "0"}),
+                mock.patch.object(kvstate, "STATE", state)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        sys.modules.pop("indexer", None)  # reads its env at import
+        self.addCleanup(sys.modules.pop, "indexer", None)
+        self.indexer = importlib.import_module("indexer")
+        self.addCleanup(self.indexer.TEXTS._db.close)
+        self.source = {"id": SID, "values": {"kind": "Files", "path": self.docs, "workspace": "ws1",
+                                             "status": "Indexed"}}
+        self.calls, self.failures = [], {}
+        self.embedded = []
+        for name, fake in (("tool", self.tool), ("embed_request", self.embed_request)):
+            patcher = mock.patch.object(self.indexer, name, fake)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tool(self, name, args=None):
+        """The node: one Source, default VaultSettings; failures[name] errors to raise first."""
+        self.calls.append((name, args))
+        if self.failures.get(name):
+            raise self.failures[name].pop(0)
+        if name == "query":
+            return {"records": [self.source] if args["entity"] == "Source" else []}
+        if name == "get_record":
+            return self.source
+        return {}
+
+    def embed_request(self, model, texts):
+        self.embedded += texts
+        return [[1.0, float(len(t) % 7)] for t in texts]
+
+    def points(self):
+        """{file: chunk count} of what the collection holds."""
+        out = {}
+        if "kv_ws1" not in self.indexer.STORE.collections():
+            return out
+        for page in self.indexer.STORE.scroll("kv_ws1"):
+            for p in page:
+                out[p["payload"]["file"]] = out.get(p["payload"]["file"], 0) + 1
+        return out
+
+
+class ManifestTest(IndexerCase):
+    def test_second_run_indexes_only_what_changed(self):
+        for name, text in (("a.txt", "alpha contract"), ("b.txt", "beta invoice"), ("sub/c.txt", "gamma memo")):
+            write(os.path.join(self.docs, name), text)
+        first = self.indexer.sync_source(SID, self.source)
+        self.assertEqual((first["embedded"], first["skipped"], first["removed"]), (3, 0, 0))
+        self.assertEqual(self.points(), {"a.txt": 1, "b.txt": 1, "c.txt": 1})
+
+        write(os.path.join(self.docs, "b.txt"), "beta invoice, amended twice")
+        os.remove(os.path.join(self.docs, "sub", "c.txt"))
+        self.embedded.clear()
+        second = self.indexer.sync_source(SID, self.source)
+        self.assertEqual((second["embedded"], second["skipped"], second["removed"]), (1, 1, 1))
+        self.assertEqual(self.embedded, ["beta invoice, amended twice"])
+        self.assertEqual(self.points(), {"a.txt": 1, "b.txt": 1})
+        self.assertEqual(second["docs"], 2)
+
+        self.embedded.clear()
+        third = self.indexer.sync_source(SID, self.source)
+        self.assertEqual((third["embedded"], third["skipped"], third["removed"], third["changed"]), (0, 2, 0, False))
+        self.assertEqual(self.embedded, [])
+
+    def test_same_name_in_two_directories(self):
+        # point ids come from the file name: deleting x/n.txt must not take y/n.txt's points
+        write(os.path.join(self.docs, "x", "n.txt"), "first note")
+        write(os.path.join(self.docs, "y", "n.txt"), "second note")
+        self.indexer.sync_source(SID, self.source)
+        os.remove(os.path.join(self.docs, "x", "n.txt"))
+        r = self.indexer.sync_source(SID, self.source)
+        self.assertEqual(r["removed"], 1)
+        self.assertEqual(self.points(), {"n.txt": 1})
+
+
+class CheckpointTest(IndexerCase):
+    def setUp(self):
+        # one chunk per embedding request, in file order, every settled file saved at once
+        patcher = mock.patch.dict(os.environ, {"KV_EMBED_BATCH": "1", "KV_READ_WORKERS": "1",
+                                               "KV_CHUNK_WORKERS": "1", "KV_EMBED_CONCURRENCY": "1",
+                                               "KV_CHECKPOINT_SECONDS": "0"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        super().setUp()
+
+    def test_interrupted_run_resumes(self):
+        for i in range(5):
+            write(os.path.join(self.docs, f"{i}.txt"), f"document number {i}")
+        embed_request = self.embed_request
+
+        def crashing(model, texts):
+            if len(self.embedded) == 4:  # the fifth file: let the other four land, then break off
+                deadline = time.monotonic() + 5
+                while sum(self.points().values()) < 4 and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                raise urllib.error.HTTPError("http://lm/v1/embeddings", 400, "model unloaded", {}, None)
+            return embed_request(model, texts)
+
+        with mock.patch.object(self.indexer, "embed_request", crashing), self.assertRaises(urllib.error.HTTPError):
+            self.indexer.sync_source(SID, self.source, tid="task-1")
+        checkpoint = kvstate.load_json(self.indexer.checkpoint_path(SID))
+        self.assertEqual(checkpoint["task"], "task-1")
+        self.assertEqual(len(checkpoint["files"]), 4)
+        self.assertFalse(os.path.exists(self.indexer.manifest_path(SID)))
+
+        done = set(checkpoint["files"])
+        self.embedded.clear()
+        r = self.indexer.sync_source(SID, self.source, tid="task-2")  # retry_index
+        self.assertEqual((r["embedded"], r["docs"]), (1, 5))
+        self.assertIn("resumed 4 from a checkpoint", r["note"])
+        self.assertEqual(self.embedded, [f"document number {i}" for i in range(5) if f"{i}.txt" not in done])
+        self.assertEqual(self.points(), {f"{i}.txt": 1 for i in range(5)})
+        self.assertFalse(os.path.exists(self.indexer.checkpoint_path(SID)))  # the manifest has it all now
+
+    def test_checkpoint_of_other_vectors_is_ignored(self):
+        write(os.path.join(self.docs, "a.txt"), "alpha contract")
+        self.indexer.sync_source(SID, self.source)
+        manifest = kvstate.load_json(self.indexer.manifest_path(SID))
+        kvstate.save_json(self.indexer.checkpoint_path(SID), {
+            "model": "another-model", "chunk_size": 512, "collection": "kv_ws1", "lexical": False,
+            "files": manifest["files"]})
+        os.remove(self.indexer.manifest_path(SID))
+        self.embedded.clear()
+        r = self.indexer.sync_source(SID, self.source)
+        self.assertEqual(r["embedded"], 1)  # re-embedded with this run's model, not taken as done
+        self.assertEqual(self.embedded, ["alpha contract"])
+
+
+class EmbedSplitTest(IndexerCase):
+    def test_timed_out_batch_is_split(self):
+        sent = []
+
+        def embed_request(model, texts):
+            sent.append(len(texts))
+            if len(texts) > 1:  # as the pool reports it
+                raise urllib.error.URLError(TimeoutError("timed out"))
+            return [[float(len(texts[0])), 1.0]]
+
+        with mock.patch.object(self.indexer, "embed_request", embed_request):
+            self.assertEqual(self.indexer.embed_split("m", ["a", "bb", "ccc"]), [[1.0, 1.0], [2.0, 1.0], [3.0, 1.0]])
+            self.assertEqual(sent, [3, 1, 2, 1, 1])
+            with self.assertRaises(urllib.error.URLError):  # down, not too big: not split
+                with mock.patch.object(self.indexer, "embed_request", mock.Mock(
+                        side_effect=urllib.error.URLError(ConnectionRefusedError()))):
+                    self.indexer.embed_split("m", ["a", "bb"])
+
+
+class WatchTest(IndexerCase):
+    def test_paths_of_a_failed_run_are_retried(self):
+        write(os.path.join(self.docs, "a.txt"), "the contract is due in May")
+        runs = []
+        watch_sync = self.indexer.watch_sync
+
+        def counted(sid, paths):
+            runs.append(set(paths))
+            return watch_sync(sid, paths)
+
+        rounds = []
+
+        def sleep(_seconds):
+            rounds.append(1)
+            if len(rounds) > 20 or self.points():
+                raise Stop
+
+        # the node is unreachable, then fails in a way no handler expects
+        self.failures["get_record"] = [urllib.error.URLError("node down"), RuntimeError("bad response")]
+        with mock.patch.object(self.indexer, "watch_sync", counted), \
+                mock.patch.object(self.indexer.time, "sleep", sleep), self.assertRaises(Stop):
+            self.indexer.watch_loop()
+        self.assertEqual(runs, [{""}] * 3)  # the initial catch-up, twice failed, then done
+        self.assertEqual(self.points(), {"a.txt": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+"""Watch mode's change feeds and debounce, on a temporary directory.
+
+Run: python -m unittest discover -s workers/knowvault_indexer -p "test_*.py"
+"""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from watch import Debounce, InotifyTree, ScanTree, _libc
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+
+class TreeCases:
+    def setUp(self):
+        self.base = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.base)
+        write(os.path.join(self.base, "a.txt"), "one")
+        write(os.path.join(self.base, "d", "b.txt"), "two")
+        self.tree = self.open()
+        self.addCleanup(self.tree.close)
+
+    def changes(self):
+        return self.tree.poll(1.0) | self.tree.poll(0.2)
+
+    def test_written_created_and_deleted(self):
+        write(os.path.join(self.base, "a.txt"), "one, longer now")
+        write(os.path.join(self.base, "new", "c.txt"), "three")
+        os.remove(os.path.join(self.base, "d", "b.txt"))
+        write(os.path.join(self.base, "ignored.swp"), "junk")
+        changed = self.changes()
+        self.assertIn("a.txt", changed)
+        self.assertIn(os.path.join("d", "b.txt"), changed)
+        self.assertTrue({"new", os.path.join("new", "c.txt")} & changed)
+        self.assertNotIn("ignored.swp", changed)
+        self.assertEqual(self.tree.poll(0.1), set())
+
+
+class ScanTreeTest(TreeCases, unittest.TestCase):
+    def open(self):
+        return ScanTree(self.base, interval=0.5, wanted=lambda name: name.endswith(".txt"))
+
+
+@unittest.skipIf(_libc() is None, "no inotify here")
+class InotifyTreeTest(TreeCases, unittest.TestCase):
+    def open(self):
+        return InotifyTree(self.base, _libc(), wanted=lambda name: name.endswith(".txt"))
+
+    def test_files_in_a_new_directory_are_followed(self):
+        os.makedirs(os.path.join(self.base, "later"))
+        self.changes()
+        write(os.path.join(self.base, "later", "x.txt"), "x")
+        self.assertIn(os.path.join("later", "x.txt"), self.changes())
+
+
+class DebounceTest(unittest.TestCase):
+    def test_waits_for_quiet_but_not_forever(self):
+        d = Debounce(quiet=2, max_delay=10)
+        now = time.monotonic()
+        d.add({"a.txt"}, now)
+        d.add({"b.txt"}, now + 1.5)
+        self.assertIsNone(d.due(now + 3))
+        self.assertEqual(d.due(now + 3.6), {"a.txt", "b.txt"})
+        self.assertIsNone(d.due(now + 10))
+        for t in range(12):  # written without pause: released after max_delay anyway
+            d.add({"log.txt"}, now + 20 + t)
+            if d.due(now + 20 + t):
+                break
+        self.assertEqual(t, 10)
+        d.add({"a.txt", ""}, now + 40)
+        self.assertEqual(d.due(now + 50), {""})
+
+
+if __name__ == "__main__":
+    unittest.main()
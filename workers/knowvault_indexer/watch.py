@@ -0,0 +1,201 @@
+"""Change feeds for the indexer's watch mode: which paths under a Files source moved.
+
+Two implementations of the same poll(), picked by open_tree():
+  inotify  Linux, through ctypes: a watch on every directory of the tree,
+           events read without blocking. New directories are watched as they
+           appear. A queue overflow asks for a rescan.
+  scan     everywhere else, or when inotify is unavailable or its watch limit
+           (fs.inotify.max_user_watches) is hit: every KV_WATCH_SCAN_SECONDS
+           the tree is listed with os.scandir and (size, mtime) compared with
+           the previous listing — a stat per file, no reads, no hashing.
+
+poll() returns the relative paths that changed since the last call (files
+or directories, created, written, moved or deleted); "" stands for the whole
+tree. Debounce collects them until the tree has been quiet for a moment, so
+a copy of a thousand files is one index run, not a thousand.
+
+Env: KV_WATCH_BACKEND (auto | inotify | scan), KV_WATCH_SCAN_SECONDS (default 30)
+Stdlib only.
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import time
+
+IN_MODIFY, IN_ATTRIB, IN_CLOSE_WRITE = 0x2, 0x4, 0x8
+IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE, IN_DELETE = 0x40, 0x80, 0x100, 0x200
+IN_DELETE_SELF, IN_MOVE_SELF = 0x400, 0x800
+IN_Q_OVERFLOW, IN_IGNORED, IN_ONLYDIR, IN_ISDIR = 0x4000, 0x8000, 0x01000000, 0x40000000
+MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+        | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+EVENT = struct.Struct("iIII")  # wd, mask, cookie, len; then len bytes of name
+
+
+def _libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    except OSError:
+        return None
+    return libc if all(hasattr(libc, f) for f in ("inotify_init1", "inotify_add_watch", "inotify_rm_watch")) else None
+
+
+class InotifyTree:
+    def __init__(self, base, libc, wanted=lambda name: True):
+        self.base, self._libc, self.wanted = base, libc, wanted
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self._dirs = {}  # wd -> relative dir
+        try:
+            self._watch_tree("")
+        except OSError:
+            self.close()
+            raise
+
+    def _watch_tree(self, rel):
+        for root, _dirs, _files in os.walk(os.path.join(self.base, rel) if rel else self.base):
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(root), MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err == errno.ENOENT:  # gone again already
+                    continue
+                raise OSError(err, f"inotify_add_watch {root}: {os.strerror(err)}")
+            rel = os.path.relpath(root, self.base)
+            self._dirs[wd] = "" if rel == "." else rel
+
+    def _unwatch(self, rel):
+        for wd, d in list(self._dirs.items()):
+            if d == rel or d.startswith(rel + os.sep):
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._dirs[wd]
+
+    def poll(self, timeout=0.0):
+        changed = set()
+        while select.select([self._fd], [], [], timeout)[0]:
+            timeout = 0
+            try:
+                buf = os.read(self._fd, 1 << 16)
+            except BlockingIOError:
+                break
+            off = 0
+            while off < len(buf):
+                wd, mask, _cookie, n = EVENT.unpack_from(buf, off)
+                name = os.fsdecode(buf[off + EVENT.size:off + EVENT.size + n].rstrip(b"\0"))
+                off += EVENT.size + n
+                if mask & IN_Q_OVERFLOW:
+                    changed.add("")  # events were lost: rescan it all
+                    continue
+                d = self._dirs.get(wd)
+                if d is None:
+                    continue
+                if mask & IN_IGNORED:
+                    del self._dirs[wd]
+                    continue
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    changed.add(d)
+                    continue
+                rel = os.path.join(d, name) if d else name
+                if not mask & IN_ISDIR and not self.wanted(name):
+                    continue  # editor swap files and the like
+                changed.add(rel)
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        self._watch_tree(rel)
+                    elif mask & IN_MOVED_FROM:
+                        self._unwatch(rel)  # its watches would follow it out of the tree
+        return changed
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class ScanTree:
+    def __init__(self, base, interval=30.0, wanted=lambda name: True):
+        self.base, self.interval, self.wanted = base, interval, wanted
+        self._seen = self._listing()
+        self._next = time.monotonic() + interval
+
+    def _listing(self):
+        out, todo = {}, [""]
+        while todo:
+            rel = todo.pop()
+            try:
+                entries = list(os.scandir(os.path.join(self.base, rel)))
+            except OSError:
+                continue
+            for e in entries:
+                path = os.path.join(rel, e.name) if rel else e.name
+                try:
+                    if e.is_dir(follow_symlinks=False):
+                        todo.append(path)
+                    elif self.wanted(e.name):
+                        st = e.stat()
+                        out[path] = (st.st_size, st.st_mtime_ns)
+                except OSError:
+                    continue  # vanished between the listing and the stat
+        return out
+
+    def poll(self, timeout=0.0):
+        wait = self._next - time.monotonic()
+        if wait > timeout:
+            time.sleep(max(timeout, 0))
+            return set()
+        time.sleep(max(wait, 0))
+        now = self._listing()
+        self._next = time.monotonic() + self.interval
+        changed = {p for p in now.keys() | self._seen.keys() if now.get(p) != self._seen.get(p)}
+        self._seen = now
+        return changed
+
+    def close(self):
+        pass
+
+
+def open_tree(base, wanted=lambda name: True):
+    """The change feed for `base`: inotify when it can, else scanning."""
+    backend = os.environ.get("KV_WATCH_BACKEND", "auto")
+    if backend not in ("auto", "inotify", "scan"):
+        raise SystemExit(f"KV_WATCH_BACKEND must be auto, inotify or scan, not {backend!r}")
+    libc = _libc() if backend != "scan" else None
+    if libc is not None:
+        try:
+            return InotifyTree(base, libc, wanted)
+        except OSError as e:
+            if backend == "inotify":
+                raise
+            print(f"[watch] {base}: inotify unavailable ({e}); scanning instead")
+    return ScanTree(base, float(os.environ.get("KV_WATCH_SCAN_SECONDS", "30")), wanted)
+
+
+class Debounce:
+    """Changed paths, released once no new ones came for `quiet` seconds —
+    or `max_delay` after the first, so a constantly written tree still gets indexed."""
+    def __init__(self, quiet=2.0, max_delay=30.0):
+        self.quiet, self.max_delay = quiet, max_delay
+        self.paths, self._first = set(), None
+        self._last = 0.0
+
+    def add(self, paths, now=None):
+        if not paths:
+            return
+        now = time.monotonic() if now is None else now
+        self.paths |= set(paths)
+        self._first = self._first if self._first is not None else now
+        self._last = now
+
+    def due(self, now=None):
+        """The collected paths if it is time to index them (then forgotten), else None."""
+        now = time.monotonic() if now is None else now
+        if not self.paths or (now - self._last < self.quiet and now - self._first < self.max_delay):
+            return None
+        paths = {""} if "" in self.paths else self.paths
+        self.paths, self._first = set(), None
+        return paths
@@ -0,0 +1,157 @@
+"""Admission control for the search service.
+
+ThreadingHTTPServer starts a thread per connection: a burst of questions
+becomes a burst of concurrent chat completions against one local model, and
+everybody waits longer. Here a fixed pool of workers serves requests; up to
+`queue_max` more wait their turn; anything beyond that is turned away at
+once with 503 + Retry-After (the node can say "busy, retry" instead of
+timing out). One that waited in the queue longer than `queue_timeout` gets
+504 + Retry-After instead of being served: its caller has likely given up
+already. Inside a request each stage — embed, search, chat — takes a
+slot from its own limit; not getting one within `wait` seconds is the same
+503, raised as Overloaded.
+
+stats() on the server and on each Limit reports depth, rejects, expiries and waits.
+"""
+import collections
+import contextlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer
+
+
+_REFUSALS = {
+    503: ("SEARCH_BUSY", "search service is at capacity", b"Service Unavailable"),
+    504: ("SEARCH_TIMEOUT", "waited too long for a search worker", b"Gateway Timeout"),
+}
+
+
+class Overloaded(Exception):
+    """No capacity for this request right now; answer 503, retry later."""
+
+
+def _waits(samples):
+    if not samples:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+    s = sorted(samples)
+    return {"p50_ms": round(s[len(s) // 2], 1), "p95_ms": round(s[int(len(s) * 0.95)], 1),
+            "max_ms": round(s[-1], 1)}
+
+
+class Limit:
+    """A named concurrency limit: `with limit():` holds one slot."""
+    def __init__(self, name, slots, wait=30.0):
+        self.name, self.slots, self.wait = name, slots, wait
+        self._sem = threading.BoundedSemaphore(slots)
+        self._lock = threading.Lock()
+        self._waits = collections.deque(maxlen=1000)
+        self.busy = self.waiting = self.timeouts = 0
+
+    @contextlib.contextmanager
+    def __call__(self):
+        t = time.monotonic()
+        with self._lock:
+            self.waiting += 1
+        got = self._sem.acquire(timeout=self.wait)
+        with self._lock:
+            self.waiting -= 1
+            if not got:
+                self.timeouts += 1
+            else:
+                self.busy += 1
+                self._waits.append((time.monotonic() - t) * 1000)
+        if not got:
+            raise Overloaded(f"no free {self.name} slot within {self.wait:g}s")
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.busy -= 1
+            self._sem.release()
+
+    def stats(self):
+        with self._lock:
+            return {"slots": self.slots, "busy": self.busy, "waiting": self.waiting,
+                    "timeouts": self.timeouts, "wait": _waits(self._waits)}
+
+
+class BoundedHTTPServer(HTTPServer):
+    """HTTPServer with `workers` handler threads and at most `queue_max`
+    accepted connections waiting for one; the rest get an immediate 503, and
+    one that waited over `queue_timeout` seconds (None: no limit) a 504."""
+    daemon_threads = True
+
+    def __init__(self, address, handler, workers=8, queue_max=32, retry_after=5, queue_timeout=None):
+        super().__init__(address, handler)
+        self.workers, self.queue_max, self.retry_after = workers, queue_max, retry_after
+        self.queue_timeout = queue_timeout
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="search")
+        self._lock = threading.Lock()
+        self._waits = collections.deque(maxlen=1000)
+        self.queued = self.active = self.served = self.rejected = self.expired = 0
+
+    def process_request(self, request, client_address):
+        with self._lock:
+            admit = self.queued < self.queue_max
+            if admit:
+                self.queued += 1
+            else:
+                self.rejected += 1
+        if not admit:
+            self.refuse(request, 503)
+            return
+        self._pool.submit(self._serve, request, client_address, time.monotonic())
+
+    def _serve(self, request, client_address, enqueued):
+        waited = time.monotonic() - enqueued
+        expired = self.queue_timeout is not None and waited > self.queue_timeout
+        with self._lock:
+            self.queued -= 1
+            self._waits.append(waited * 1000)
+            if expired:
+                self.expired += 1
+            else:
+                self.active += 1
+        if expired:
+            self.refuse(request, 504)
+            return
+        try:
+            self.finish_request(request, client_address)
+        except Exception:  # noqa: BLE001 — same as socketserver: log, keep serving
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self._lock:
+                self.active -= 1
+                self.served += 1
+
+    def refuse(self, request, status):
+        """503 (queue full) or 504 (queued too long) without parsing anything:
+        refusing must stay cheaper than serving."""
+        code, message, reason = _REFUSALS[status]
+        body = json.dumps({"code": code, "message": message, "retry_after": self.retry_after}).encode()
+        try:
+            request.settimeout(0.05)
+            request.recv(65536)  # take the request off the socket so close() does not reset it
+        except OSError:
+            pass
+        try:
+            request.sendall(b"HTTP/1.1 %d %s\r\nContent-Type: application/json\r\n"
+                            b"Retry-After: %d\r\nContent-Length: %d\r\nConnection: close\r\n\r\n%s"
+                            % (status, reason, self.retry_after, len(body), body))
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=False)
+
+    def stats(self):
+        with self._lock:
+            return {"workers": self.workers, "active": self.active, "queued": self.queued,
+                    "queue_max": self.queue_max, "served": self.served, "rejected": self.rejected,
+                    "expired": self.expired,
+                    "queue_wait": _waits(self._waits)}
@@ -0,0 +1,71 @@
+"""In-process answer cache for the search service.
+
+The same questions come in over and over; each costs an embed, a vector
+fan-out and a multi-second chat completion. A cached answer is keyed by what
+it was built from: the normalized question, the exact scope (sorted
+scope_ids — two users with different permissions never share an entry), the
+chat and embedding models, and the index generation of every workspace in
+scope. The indexer bumps a workspace's generation (kvstate.bump_generation)
+whenever it changes its points, so an answer never outlives its documents;
+TTL and LRU bound the rest.
+
+Env: KV_ANSWER_CACHE_TTL (default 600 seconds), KV_ANSWER_CACHE_MAX (default 1000 answers; 0 disables)
+"""
+import collections
+import re
+import threading
+import time
+
+import kvstate
+
+_SPACE = re.compile(r"\s+")
+
+
+def normalize(question):
+    return _SPACE.sub(" ", question.casefold()).strip().rstrip("?!.").strip()
+
+
+class AnswerCache:
+    def __init__(self, ttl=600.0, max_entries=1000):
+        self.ttl, self.max_entries = ttl, max_entries
+        self._entries = collections.OrderedDict()  # key -> (expires, cost_ms, result)
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+        self.saved_ms = 0.0
+
+    def key(self, question, scope_ids, chat_model, embed_model):
+        scope = tuple(sorted(set(scope_ids)))
+        return (normalize(question), scope, chat_model, embed_model,
+                tuple(kvstate.generation(ws) for ws in scope))
+
+    def get(self, key):
+        if not self.max_entries:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is None or hit[0] < now:
+                if hit is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_ms += hit[1]
+            return hit[2]
+
+    def put(self, key, result, cost_ms):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, cost_ms, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                    "saved_ms": round(self.saved_ms, 1), "entries": len(self._entries)}
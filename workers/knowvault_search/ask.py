@@ -1,32 +1,30 @@
 #!/usr/bin/env python3
 """KnowVault Q&A — the Searcher worker: ask a question over perimeter documents.
 
-Flow: embed the question (LM Studio) -> vector search across the Qdrant
+Flow: embed the question (LM Studio) -> vector search across the
 collections of every workspace this actor may read -> answer with the chat
 model using retrieved context -> journal the query as a SearchQuery record.
 
 Usage:  py ask.py "What is the amount in the contract with Vector?"
-Env:    KALITA_URL, KALITA_TOKEN (role Searcher), KV_QDRANT, KV_LM, KV_CHAT_MODEL
+Env:    KALITA_URL, KALITA_TOKEN (role Searcher), KV_LM, KV_CHAT_MODEL,
+        KV_VECTOR_BACKEND, KV_QDRANT, KV_EMBED_CACHE, KV_TEXT_STORE, KV_SEARCH_FANOUT, KV_SEARCH_DEADLINE (embedding and
+        the concurrent collection fan-out are the search service's, see service.py)
 """
 import json
 import os
 import sys
-import urllib.request
+
+from contextpack import SEPARATOR, entry
+from service import POOL, TEXTS, embed, search_collections
 
 NODE = os.environ.get("KALITA_URL", "http://127.0.0.1:8095")
 TOKEN = os.environ.get("KALITA_TOKEN") or sys.exit("KALITA_TOKEN is required")
-QDRANT = os.environ.get("KV_QDRANT", "http://192.168.1.4:6333")
 LM = os.environ.get("KV_LM", "http://localhost:1234")
 CHAT_MODEL = os.environ.get("KV_CHAT_MODEL", "openai/gpt-oss-20b")
-EMBED_MODEL = os.environ.get("KV_EMBED_MODEL", "text-embedding-nomic-embed-text-v1.5")
 
 
 def http(url, body=None, headers=None, method=None):
-    data = json.dumps(body).encode() if body is not None else None
-    req = urllib.request.Request(url, data=data, method=method,
-                                 headers={"Content-Type": "application/json", **(headers or {})})
-    with urllib.request.urlopen(req, timeout=180) as resp:
-        return json.load(resp)
+    return POOL.json(url, body, headers, method, timeout=180)
 
 
 def tool(name, args=None):
@@ -50,24 +48,17 @@ def main():
     if not workspaces:
         sys.exit("no workspaces visible to this actor")
 
-    qvec = http(LM + "/v1/embeddings", {"model": EMBED_MODEL, "input": [question]})["data"][0]["embedding"]
-
-    hits = []
-    for ws in workspaces:
-        col = f"kv_{ws['id']}"
-        try:
-            res = http(f"{QDRANT}/collections/{col}/points/search", method="POST",
-                       body={"vector": qvec, "limit": 4, "with_payload": True})
-            for p in res.get("result", []):
-                hits.append((p["score"], ws, p["payload"]))
-        except urllib.error.HTTPError:
-            continue  # workspace not indexed yet
+    qvec = embed([question])[0]
+
+    # workspaces not indexed yet (or too slow to answer) are simply dropped
+    hits, _dropped = search_collections(qvec, [ws["id"] for ws in workspaces])
     hits.sort(key=lambda h: -h[0])
-    top = hits[:5]
+    best = hits[:5]
+    top = TEXTS.resolve([p for _s, _ws, p in best])  # compact payloads carry only a text_ref
     if not top:
         sys.exit("nothing indexed yet — point the indexer at a source first")
 
-    context = "\n\n---\n\n".join(f"[{p['file']}]\n{p['text']}" for _s, _w, p in top)
+    context = SEPARATOR.join(entry(p) for p in top)
     answer = http(LM + "/v1/chat/completions", {
         "model": CHAT_MODEL,
         "messages": [
@@ -81,12 +72,12 @@ def main():
 
     # the query is journaled — "who searched for what" is a record like any other
     tool("create_record", {"entity": "SearchQuery", "basis": {"type": "human", "id": "searcher"},
-                           "values": {"workspace": top[0][1]["id"], "query": question,
+                           "values": {"workspace": best[0][1], "query": question,
                                       "actor_role": "Searcher", "results": len(top)}})
 
     print(f"\nQ: {question}\n")
     print(answer)
-    print("\nsources:", ", ".join(sorted({p["file"] for _s, _w, p in top})))
+    print("\nsources:", ", ".join(sorted({p["file"] for p in top})))
 
 
 if __name__ == "__main__":
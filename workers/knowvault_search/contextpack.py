@@ -0,0 +1,127 @@
+"""Post-retrieval context packing for the search service.
+
+Prompt tokens are the main per-query cost on a local chat model, and the
+fused hits are not all worth their tokens: a file indexed twice, a paragraph
+repeated across versions of a document, or neighbouring chunks that
+overlap all take separate slots. pack() turns the fused candidates (best
+first) into the context that is actually sent:
+
+  1. de-duplicate: a candidate whose word 3-shingles are mostly (KV_DEDUP,
+     containment, default 0.8) inside a better-ranked one is dropped —
+     near-identical and overlapping chunks alike;
+  2. optionally rerank with maximal marginal relevance (KV_MMR_LAMBDA, e.g.
+     0.7; off by default): each next pick trades rank against word overlap
+     with what is already picked, so the context covers more of the answer;
+  3. fill a token budget (KV_CONTEXT_TOKENS) in that order, at most
+     KV_CONTEXT_CHUNKS chunks; a chunk that does not fit is skipped for a
+     smaller one further down, and the best one always goes in.
+
+Tokens are estimated as characters / KV_CHARS_PER_TOKEN (no tokenizer in
+the worker). Every query reports its context tokens against the baseline —
+the first KV_CONTEXT_CHUNKS candidates verbatim, as sent before packing —
+and the difference as saved_tokens (negative when the budget lets more in).
+
+Env: KV_CONTEXT_TOKENS (default 800), KV_CONTEXT_CHUNKS (default 5),
+     KV_DEDUP (default 0.8; 1 drops only chunks wholly inside a better one), KV_MMR_LAMBDA (default off),
+     KV_CHARS_PER_TOKEN (default 4)
+"""
+import math
+import os
+import re
+import threading
+
+SEPARATOR = "\n\n---\n\n"
+_WORD = re.compile(r"\w+")
+
+
+def entry(p):
+    """How a chunk appears in the prompt."""
+    return f"[{p['file']}]\n{p['text']}"
+
+
+def shingles(text, n=3):
+    words = _WORD.findall(text.casefold())
+    if len(words) <= n:
+        return {tuple(words)}
+    return {tuple(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+
+def containment(a, b):
+    """How much of the smaller shingle set lies inside the other."""
+    return len(a & b) / (min(len(a), len(b)) or 1)
+
+
+def jaccard(a, b):
+    return len(a & b) / (len(a | b) or 1)
+
+
+class ContextPacker:
+    def __init__(self, budget=800, max_chunks=5, dedup=0.8, mmr_lambda=None, chars_per_token=4.0):
+        self.budget, self.max_chunks, self.dedup = budget, max_chunks, dedup
+        self.mmr_lambda, self.chars_per_token = mmr_lambda, chars_per_token
+        self._lock = threading.Lock()
+        self.queries = self.sent = self.baseline = self.duplicates = 0
+
+    def tokens(self, parts):
+        """Estimated prompt tokens of `parts` joined into the context."""
+        chars = sum(len(p) for p in parts) + len(SEPARATOR) * max(len(parts) - 1, 0)
+        return math.ceil(chars / self.chars_per_token)
+
+    def pack(self, candidates):
+        """(context payloads, report) for `candidates` (payloads with text, best first)."""
+        kept, seen, duplicates = [], [], 0
+        for p in candidates:
+            sh = shingles(p["text"])
+            if any(containment(sh, other) >= self.dedup for other in seen):
+                duplicates += 1
+                continue
+            kept.append((p, sh))
+            seen.append(sh)
+        if self.mmr_lambda is not None:
+            kept = self._mmr(kept)
+        chosen, parts = [], []
+        for p, _sh in kept:
+            if len(chosen) == self.max_chunks:
+                break
+            part = entry(p)
+            if chosen and self.tokens(parts + [part]) > self.budget:
+                continue
+            chosen.append(p)
+            parts.append(part)
+        sent = self.tokens(parts)
+        baseline = self.tokens([entry(p) for p in candidates[:self.max_chunks]])
+        with self._lock:
+            self.queries += 1
+            self.sent += sent
+            self.baseline += baseline
+            self.duplicates += duplicates
+        return chosen, {"chunks": len(chosen), "duplicates": duplicates, "tokens": sent,
+                        "baseline_tokens": baseline, "saved_tokens": baseline - sent}
+
+    def _mmr(self, kept):
+        """Greedy maximal marginal relevance; relevance is the fused rank,
+        similarity the word overlap (Jaccard) of the chunks."""
+        n = len(kept)
+        words = [set(_WORD.findall(p["text"].casefold())) for p, _sh in kept]
+        todo, order = list(range(n)), []
+        while todo:
+            best = max(todo, key=lambda i: self.mmr_lambda * (n - i) / n - (1 - self.mmr_lambda) * max(
+                (jaccard(words[i], words[j]) for j in order), default=0.0))
+            order.append(best)
+            todo.remove(best)
+        return [kept[i] for i in order]
+
+    def stats(self):
+        with self._lock:
+            return {"queries": self.queries, "tokens_sent": self.sent, "tokens_saved": self.baseline - self.sent,
+                    "duplicates_dropped": self.duplicates}
+
+
+def open_packer():
+    """The packer configured by env."""
+    mmr = os.environ.get("KV_MMR_LAMBDA", "off")
+    return ContextPacker(int(os.environ.get("KV_CONTEXT_TOKENS", "800")),
+                         int(os.environ.get("KV_CONTEXT_CHUNKS", "5")),
+                         float(os.environ.get("KV_DEDUP", "0.8")),
+                         None if mmr.lower() in ("", "off", "none") else float(mmr),
+                         float(os.environ.get("KV_CHARS_PER_TOKEN", "4")))
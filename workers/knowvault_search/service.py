@@ -3,52 +3,249 @@
 
 The node (which owns permissions and journaling) POSTs /search with
 {question, scope_ids}; this service does the heavy, untrusted work: embed the
-question, vector-search ONLY the given workspace collections, answer with the
-chat model over retrieved context. It never decides who may see what — that
+question, vector-search ONLY the given workspace collections (Qdrant or the
+local backend, see vectorstore.py), answer with the chat model over retrieved
+context. It never decides who may see what — that
 boundary already happened in the node.
 
-Env: KV_QDRANT, KV_LM, KV_CHAT_MODEL, KV_EMBED_MODEL, KV_LISTEN (default :8200)
+Question vectors go through the shared embedding cache (embedcache.py), so a
+popular question is embedded once. GET /stats reports the cache counters.
+Workspace collections are searched concurrently (bounded pool, per-query
+deadline); a slow or missing collection is dropped, not waited for. With
+KV_LAYOUT=shared it is a single search filtered to scope_ids instead (see
+kvlayout.py). The question is also ranked with BM25 over the workspaces'
+lexical indexes (lexical.py) — exact tokens like contract numbers or error
+codes — and both rankings are fused with reciprocal rank fusion. The best
+KV_CONTEXT_CANDIDATES fused chunks are then packed into the prompt
+(contextpack.py): near-duplicates dropped, optionally reranked for
+diversity (MMR), filled up to a token budget; each answer's `context` reports
+the estimated prompt tokens against the unpacked top chunks and GET /stats the
+running totals. Each answer carries its timings (embed, search, lexical,
+merge, pack, chat). Points indexed with KV_COMPACT_PAYLOAD carry a text ref
+instead of the chunk text; only the candidates' texts are read from the
+local text store (textstore.py).
+Complete answers are kept in an in-process cache keyed by question, scope,
+models and index generation (answercache.py); GET /stats shows its hit rate
+and the latency it saved.
+
+Streaming (opt-in: {"stream": true} or Accept: text/event-stream) answers
+with server-sent events: `sources` right after retrieval, then `token` events
+relayed from a streaming chat completion, then `done` with the full result.
+The default stays a single JSON body.
+
+Admission control (admission.py): a fixed pool of KV_SEARCH_WORKERS serves
+requests, KV_SEARCH_QUEUE more may wait, the rest get 503 + Retry-After at
+once; one left waiting over KV_SEARCH_QUEUE_TIMEOUT seconds gets 504 +
+Retry-After instead of a late answer. Embedding, vector search and chat each have their own slot limit
+(KV_EMBED_SLOTS, KV_SEARCH_SLOTS, KV_CHAT_SLOTS); no slot within
+KV_SLOT_WAIT seconds is also a 503. Failures carry a real status: 503 busy,
+504 upstream timeout, 502 upstream error. GET /stats shows queue depth,
+slot use and wait times.
+
+GET /metrics is the same in Prometheus text format (metrics.py), plus
+latency histograms: per query stage (kalita_search_stage_seconds), per LM
+call (kalita_llm_call_seconds) and per vector store call.
+
+Env: KV_LM, KV_CHAT_MODEL, KV_EMBED_MODEL, KV_LISTEN (default :8200),
+     KV_VECTOR_BACKEND, KV_QDRANT, KV_LOCAL_VECTORS, KV_RESCORE, KV_OVERSAMPLING (see vectorstore.py),
+     KV_TEXT_STORE (see textstore.py),
+     KV_EMBED_CACHE, KV_EMBED_CACHE_MAX, KV_LAYOUT, KV_SHARED_COLLECTION,
+     KV_SEARCH_FANOUT (default 8 concurrent collection searches),
+     KV_SEARCH_DEADLINE (default 5 seconds for the whole fan-out),
+     KV_ANSWER_CACHE_TTL, KV_ANSWER_CACHE_MAX, KV_STATE (index generations),
+     KV_LEXICAL (default on), KV_LEXICAL_LIMIT (default 8 BM25 hits fused), KV_RRF_K (default 60),
+     KV_CONTEXT_CANDIDATES (default 12 fused chunks packed), KV_CONTEXT_TOKENS, KV_CONTEXT_CHUNKS,
+     KV_DEDUP, KV_MMR_LAMBDA, KV_CHARS_PER_TOKEN (see contextpack.py),
+     KV_SEARCH_WORKERS (default 8), KV_SEARCH_QUEUE (default 32), KV_SEARCH_QUEUE_TIMEOUT (default 60 seconds),
+     KV_RETRY_AFTER (default 5 seconds),
+     KV_EMBED_SLOTS (default 4), KV_SEARCH_SLOTS (default 8), KV_CHAT_SLOTS (default 2),
+     KV_SLOT_WAIT (default 30 seconds)
+Outbound HTTP goes through the shared keep-alive pool (httppool.py).
 Zero dependencies: stdlib only.
 """
 import json
 import os
-import urllib.request
+import sys
+import time
 import urllib.error
-from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from embedcache import open_cache  # noqa: E402
+import kvlayout  # noqa: E402
+from httppool import POOL  # noqa: E402
+from answercache import AnswerCache  # noqa: E402
+from contextpack import SEPARATOR, entry, open_packer  # noqa: E402
+from admission import BoundedHTTPServer, Limit, Overloaded  # noqa: E402
+from vectorstore import StoreError, open_store  # noqa: E402
+from lexical import open_lexical, rrf  # noqa: E402
+import textstore  # noqa: E402
+import metrics  # noqa: E402
 
-QDRANT = os.environ.get("KV_QDRANT", "http://192.168.1.4:6333")
 LM = os.environ.get("KV_LM", "http://localhost:1234")
 CHAT_MODEL = os.environ.get("KV_CHAT_MODEL", "openai/gpt-oss-20b")
 EMBED_MODEL = os.environ.get("KV_EMBED_MODEL", "text-embedding-nomic-embed-text-v1.5")
 LISTEN = os.environ.get("KV_LISTEN", "127.0.0.1:8200")
+SEARCH_DEADLINE = float(os.environ.get("KV_SEARCH_DEADLINE", "5"))
+CACHE = open_cache()
+STORE = open_store()
+LEXICAL = open_lexical()
+TEXTS = textstore.open_texts()
+LEXICAL_LIMIT = int(os.environ.get("KV_LEXICAL_LIMIT", "8"))
+RRF_K = int(os.environ.get("KV_RRF_K", "60"))
+CANDIDATES = int(os.environ.get("KV_CONTEXT_CANDIDATES", "12"))
+PACKER = open_packer()
+FANOUT = ThreadPoolExecutor(int(os.environ.get("KV_SEARCH_FANOUT", "8")), thread_name_prefix="fanout")
+ANSWERS = AnswerCache(float(os.environ.get("KV_ANSWER_CACHE_TTL", "600")),
+                      int(os.environ.get("KV_ANSWER_CACHE_MAX", "1000")))
+SLOT_WAIT = float(os.environ.get("KV_SLOT_WAIT", "30"))
+EMBED_SLOTS = Limit("embed", int(os.environ.get("KV_EMBED_SLOTS", "4")), SLOT_WAIT)
+SEARCH_SLOTS = Limit("search", int(os.environ.get("KV_SEARCH_SLOTS", "8")), SLOT_WAIT)
+CHAT_SLOTS = Limit("chat", int(os.environ.get("KV_CHAT_SLOTS", "2")), SLOT_WAIT)
+NOTHING_FOUND = "Nothing found in indexed documents."
+STAGES = metrics.histogram("kalita_search_stage_seconds",
+                           "Search stage latency (embed, search, lexical, merge, pack, chat)", ["stage"])
+CONTEXT_TOKENS = metrics.counter("kalita_search_context_tokens_total",
+                                 "Estimated prompt context tokens: sent, and the unpacked baseline", ["kind"])
+REQUESTS = metrics.counter("kalita_search_requests_total", "POST /search requests, by response status", ["status"])
 
 
-def http(url, body=None, method=None):
-    data = json.dumps(body).encode() if body is not None else None
-    req = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
-    with urllib.request.urlopen(req, timeout=180) as resp:
-        return json.load(resp)
+def http(url, body=None, method=None, timeout=180, idempotent=None):
+    return POOL.json(url, body, None, method, timeout, idempotent)
 
 
-def answer_question(question, scope_ids):
-    qvec = http(LM + "/v1/embeddings", {"model": EMBED_MODEL, "input": [question]})["data"][0]["embedding"]
-    hits = []
-    for ws_id in scope_ids:
-        col = f"kv_{ws_id}"
+def embed(texts):
+    return CACHE.embed(EMBED_MODEL, texts, embed_request)
+
+
+def embed_request(texts):
+    with EMBED_SLOTS(), metrics.LLM_CALLS.time(op="embed"):  # cache hits never take a slot
+        return [d["embedding"] for d in http(
+            LM + "/v1/embeddings", {"model": EMBED_MODEL, "input": texts}, idempotent=True)["data"]]
+
+
+def search_collections(qvec, ws_ids, limit=4, top=5):
+    """Search kv_<ws> for every workspace at once (`limit` hits each); returns
+    ([(score, ws_id, payload)], dropped ws_ids). Whatever has not answered by
+    the deadline — or failed (not indexed yet, vector store error) — is dropped.
+    In the shared layout it is one filtered search for the best `top`."""
+    if kvlayout.shared():
         try:
-            res = http(f"{QDRANT}/collections/{col}/points/search", method="POST",
-                       body={"vector": qvec, "limit": 4, "with_payload": True})
-            for p in res.get("result", []):
-                hits.append((p["score"], p["payload"]))
-        except urllib.error.HTTPError:
-            continue
-    hits.sort(key=lambda h: -h[0])
-    top = [p for _s, p in hits[:5]]
+            res = STORE.search(kvlayout.SHARED_COLLECTION, qvec, top, kvlayout.scope_filter(ws_ids),
+                               timeout=SEARCH_DEADLINE)
+        except (OSError, urllib.error.URLError, StoreError):
+            return [], list(ws_ids)
+        return [(p["score"], p["payload"].get("workspace"), p["payload"]) for p in res], []
+
+    def one(ws_id):
+        res = STORE.search(f"kv_{ws_id}", qvec, limit, timeout=SEARCH_DEADLINE)
+        return [(p["score"], ws_id, p["payload"]) for p in res]
+
+    futures = {FANOUT.submit(one, ws_id): ws_id for ws_id in ws_ids}
+    done, late = wait(futures, timeout=SEARCH_DEADLINE)
+    hits, dropped = [], []
+    for f in done:
+        if f.exception() is None:
+            hits += f.result()
+        else:
+            dropped.append(futures[f])
+    for f in late:
+        f.cancel()
+        dropped.append(futures[f])
+    return hits, dropped
+
+
+class Timer:
+    """Per-query lap timings, reported as <stage>_ms."""
+    def __init__(self):
+        self.timings, self._t = {}, time.monotonic()
+
+    def lap(self, name):
+        now = time.monotonic()
+        self.timings[name + "_ms"] = round((now - self._t) * 1000, 1)
+        STAGES.observe(now - self._t, stage=name)
+        self._t = now
+
+
+def answer_question(question, scope_ids):
+    started = time.monotonic()
+    key = ANSWERS.key(question, scope_ids, CHAT_MODEL, EMBED_MODEL)
+    hit = ANSWERS.get(key)
+    if hit is not None:
+        return {**hit, "cached": True, "timings": {"total_ms": round((time.monotonic() - started) * 1000, 1)}}
+    result = compute_answer(question, scope_ids)
+    remember(key, result, started)
+    return result
+
+
+def answer_stream(question, scope_ids):
+    """answer_question as events: ("sources", ...) as soon as retrieval is
+    done, then ("token", text) while the model generates, then ("done", result)."""
+    started = time.monotonic()
+    key = ANSWERS.key(question, scope_ids, CHAT_MODEL, EMBED_MODEL)
+    hit = ANSWERS.get(key)
+    if hit is not None:
+        yield "sources", {"sources": hit["sources"], "dropped": hit["dropped"]}
+        yield "token", {"text": hit["answer"]}
+        yield "done", {**hit, "cached": True, "timings": {"total_ms": round((time.monotonic() - started) * 1000, 1)}}
+        return
+    timer = Timer()
+    top, dropped, context = retrieve(question, scope_ids, timer)
+    sources = sorted({p["file"] for p in top})
+    yield "sources", {"sources": sources, "dropped": len(dropped)}
     if not top:
-        return {"answer": "Nothing found in indexed documents.", "sources": []}
+        result = {"answer": NOTHING_FOUND, "sources": [], "timings": timer.timings, "dropped": len(dropped),
+                  "context": context}
+    else:
+        parts = []
+        for text in chat_stream(question, top):
+            if not parts:
+                timer.lap("first_token")
+            parts.append(text)
+            yield "token", {"text": text}
+        timer.lap("chat")
+        result = {"answer": "".join(parts), "sources": sources, "timings": timer.timings, "dropped": len(dropped),
+                  "context": context}
+    remember(key, result, started)
+    yield "done", result
+
 
-    context = "\n\n---\n\n".join(f"[{p['file']}]\n{p['text']}" for p in top)
-    reply = http(LM + "/v1/chat/completions", {
+def remember(key, result, started):
+    if not result["dropped"]:  # a partial answer (collections timed out) is not worth keeping
+        ANSWERS.put(key, result, (time.monotonic() - started) * 1000)
+
+
+def retrieve(question, scope_ids, timer):
+    qvec = embed([question])[0]
+    timer.lap("embed")
+    with SEARCH_SLOTS():
+        hits, dropped = search_collections(qvec, scope_ids, CANDIDATES, CANDIDATES)
+        timer.lap("search")
+        hits.sort(key=lambda h: -h[0])
+        if LEXICAL is not None:
+            lexical = LEXICAL.search(scope_ids, question, LEXICAL_LIMIT)
+            timer.lap("lexical")
+            hits = rrf([hits, lexical], key=chunk_key, k=RRF_K)
+    candidates = TEXTS.resolve([p for _s, _ws, p in hits[:CANDIDATES]])  # compact payloads: text only for these
+    timer.lap("merge")
+    top, report = PACKER.pack(candidates)
+    CONTEXT_TOKENS.inc(report["tokens"], kind="sent")
+    CONTEXT_TOKENS.inc(report["baseline_tokens"], kind="baseline")
+    timer.lap("pack")
+    return top, dropped, report
+
+
+def chunk_key(hit):
+    """The same chunk found by both retrievers is one context entry — whether
+    its payload carries the text or only its ref (textstore.py)."""
+    _score, ws_id, p = hit
+    return ws_id, p.get("source"), p.get("file"), p.get("text_ref") or textstore.ref(p.get("text", ""))
+
+
+def chat_request(question, top, **extra):
+    context = SEPARATOR.join(entry(p) for p in top)
+    return {
         "model": CHAT_MODEL,
         "messages": [
             {"role": "system", "content":
@@ -57,38 +254,147 @@ def answer_question(question, scope_ids):
             {"role": "user", "content": f"Context:\n{context}\n\nQuestion: {question}"},
         ],
         "temperature": 0.1,
-    })["choices"][0]["message"]["content"]
-    return {"answer": reply, "sources": sorted({p["file"] for p in top})}
+        **extra,
+    }
+
+
+def chat_stream(question, top):
+    """Token deltas of a streaming (SSE) chat completion, as they arrive."""
+    body = json.dumps(chat_request(question, top, stream=True)).encode()
+    with CHAT_SLOTS(), metrics.LLM_CALLS.time(op="chat"), POOL.stream("POST", LM + "/v1/chat/completions", body,
+                     {"Content-Type": "application/json"}, timeout=180) as resp:
+        for line in resp:
+            line = line.strip()
+            if not line.startswith(b"data:"):
+                continue
+            data = line[5:].strip()
+            if data == b"[DONE]":
+                break
+            delta = (json.loads(data).get("choices") or [{}])[0].get("delta", {}).get("content")
+            if delta:
+                yield delta
+        resp.read()  # drain, so the connection can be reused
+
+
+def compute_answer(question, scope_ids):
+    timer = Timer()
+    top, dropped, context = retrieve(question, scope_ids, timer)
+    if not top:
+        return {"answer": NOTHING_FOUND, "sources": [], "timings": timer.timings, "dropped": len(dropped),
+                "context": context}
+    with CHAT_SLOTS(), metrics.LLM_CALLS.time(op="chat"):
+        reply = http(LM + "/v1/chat/completions", chat_request(question, top))["choices"][0]["message"]["content"]
+    timer.lap("chat")
+    return {"answer": reply, "sources": sorted({p["file"] for p in top}),
+            "timings": timer.timings, "dropped": len(dropped), "context": context}
+
+
+def failure(e):
+    """(HTTP status, code) for an exception raised while answering."""
+    if isinstance(e, Overloaded):
+        return 503, "SEARCH_BUSY"
+    if isinstance(e, TimeoutError) or isinstance(getattr(e, "reason", None), TimeoutError):
+        return 504, "SEARCH_TIMEOUT"
+    if isinstance(e, OSError):  # URLError / HTTPError from the LM or the vector store
+        return 502, "UPSTREAM_ERROR"
+    return 500, "SEARCH_ERROR"
 
 
 class Handler(BaseHTTPRequestHandler):
     def log_message(self, *_):
         pass
 
+    def do_GET(self):
+        if self.path == "/metrics":
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if self.path != "/stats":
+            self.send_error(404)
+            return
+        self.send_json(200, {"admission": self.server.stats(),
+                             "limits": {s.name: s.stats() for s in (EMBED_SLOTS, SEARCH_SLOTS, CHAT_SLOTS)},
+                             "answer_cache": ANSWERS.stats(), "embed_cache": CACHE.stats(),
+                             "context": PACKER.stats(),
+                             "http_pool": POOL.stats()})
+
     def do_POST(self):
         if self.path != "/search":
             self.send_error(404)
             return
         try:
             payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
-            result = answer_question(payload["question"], payload.get("scope_ids", []))
-            body = json.dumps(result, ensure_ascii=False).encode()
-            self.send_response(200)
-            self.send_header("Content-Type", "application/json")
-            self.end_headers()
-            self.wfile.write(body)
-        except Exception as e:  # noqa: BLE001 — return the error to the node
-            body = json.dumps({"answer": f"Search error: {e}", "sources": []}).encode()
-            self.send_response(200)
-            self.send_header("Content-Type", "application/json")
-            self.end_headers()
-            self.wfile.write(body)
+            question, scope_ids = payload["question"], payload.get("scope_ids", [])
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_failure(400, "VALIDATION_ERROR", e)
+            return
+        try:
+            if payload.get("stream") or "text/event-stream" in self.headers.get("Accept", ""):
+                events = answer_stream(question, scope_ids)
+                first = next(events)  # retrieval runs here, before any header is out
+                REQUESTS.inc(status=200)
+                self.stream_answer(first, events)
+                return
+            result = answer_question(question, scope_ids)
+        except Exception as e:  # noqa: BLE001 — return the error to the node, with a status
+            self.send_failure(*failure(e), e)
+            return
+        REQUESTS.inc(status=200)
+        self.send_json(200, result)
+
+    def send_json(self, status, obj, headers=()):
+        body = json.dumps(obj, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_failure(self, status, code, e):
+        REQUESTS.inc(status=status)
+        headers = [("Retry-After", str(self.server.retry_after))] if status == 503 else []
+        self.send_json(status, {"code": code, "message": str(e),
+                                "answer": f"Search error: {e}", "sources": []}, headers)
+
+    def stream_answer(self, first, events):
+        """Server-sent events: sources, token..., done (or error). Opt-in via
+        {"stream": true} or Accept: text/event-stream; JSON stays the default."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        try:
+            self.send_event(*first)
+            for event, data in events:
+                self.send_event(event, data)
+        except (BrokenPipeError, ConnectionResetError):
+            return  # the client went away
+        except Exception as e:  # noqa: BLE001 — headers are out; report in-band
+            self.send_event("error", {"code": failure(e)[1], "answer": f"Search error: {e}", "sources": []})
+
+    def send_event(self, event, data):
+        self.wfile.write(f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode())
+        self.wfile.flush()
 
 
 def main():
     host, port = LISTEN.rsplit(":", 1)
-    srv = ThreadingHTTPServer((host, int(port)), Handler)
-    print(f"knowvault search service on {LISTEN} -> qdrant {QDRANT}, chat {CHAT_MODEL}")
+    srv = BoundedHTTPServer((host, int(port)), Handler,
+                            workers=int(os.environ.get("KV_SEARCH_WORKERS", "8")),
+                            queue_max=int(os.environ.get("KV_SEARCH_QUEUE", "32")),
+                            retry_after=int(os.environ.get("KV_RETRY_AFTER", "5")),
+                            queue_timeout=float(os.environ.get("KV_SEARCH_QUEUE_TIMEOUT", "60")))
+    metrics.callback("kalita_search_queued", "Requests waiting for a worker", lambda: srv.stats()["queued"])
+    metrics.callback("kalita_search_active", "Requests being served", lambda: srv.stats()["active"])
+    metrics.callback("kalita_search_rejected_total", "Requests turned away with 503 at admission",
+                     lambda: srv.stats()["rejected"], kind="counter")
+    print(f"knowvault search service on {LISTEN} -> {type(STORE).__name__}, chat {CHAT_MODEL}")
     srv.serve_forever()
 
 
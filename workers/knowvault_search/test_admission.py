@@ -0,0 +1,87 @@
+"""Admission control: 503 on a full queue, 504 after a queue timeout, slot limits.
+
+Run: python -m unittest discover -s workers/knowvault_search -p "test_*.py"
+"""
+import http.client
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler
+
+from admission import BoundedHTTPServer, Limit, Overloaded
+
+RELEASE = threading.Event()
+
+
+class Slow(BaseHTTPRequestHandler):
+    def log_message(self, *_):
+        pass
+
+    def do_GET(self):
+        RELEASE.wait(10)
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+
+def until(cond, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not cond():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached")
+        time.sleep(0.01)
+
+
+class AdmissionTest(unittest.TestCase):
+    def test_full_queue_is_503_and_a_stale_one_504(self):
+        RELEASE.clear()
+        srv = BoundedHTTPServer(("127.0.0.1", 0), Slow, workers=1, queue_max=1, retry_after=7, queue_timeout=0.2)
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        self.addCleanup(srv.server_close)
+        self.addCleanup(srv.shutdown)
+        results = {}
+
+        def get(name):
+            conn = http.client.HTTPConnection(*srv.server_address, timeout=10)
+            conn.request("GET", "/")
+            resp = conn.getresponse()
+            results[name] = (resp.status, resp.getheader("Retry-After"), resp.read())
+            conn.close()
+
+        first = threading.Thread(target=get, args=("served",))
+        first.start()
+        until(lambda: srv.stats()["active"] == 1)  # the only worker is busy
+        second = threading.Thread(target=get, args=("queued",))
+        second.start()
+        until(lambda: srv.stats()["queued"] == 1)  # the queue is full
+        get("rejected")
+        status, retry_after, body = results["rejected"]
+        self.assertEqual((status, retry_after), (503, "7"))
+        self.assertEqual(json.loads(body)["code"], "SEARCH_BUSY")
+
+        time.sleep(0.3)  # the queued request outlives queue_timeout before a worker frees up
+        RELEASE.set()
+        first.join(5)
+        second.join(5)
+        self.assertEqual(results["served"][0], 200)
+        status, retry_after, body = results["queued"]
+        self.assertEqual((status, retry_after), (504, "7"))
+        self.assertEqual(json.loads(body)["code"], "SEARCH_TIMEOUT")
+        stats = srv.stats()
+        self.assertEqual((stats["served"], stats["rejected"], stats["expired"]), (1, 1, 1))
+
+    def test_limit_times_out_with_overloaded(self):
+        limit = Limit("chat", 1, wait=0.05)
+        with limit():
+            with self.assertRaises(Overloaded):
+                with limit():
+                    pass
+        with limit():  # the slot is back
+            pass
+        self.assertEqual((limit.stats()["timeouts"], limit.stats()["busy"]), (1, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+"""Answer cache keys: a bumped index generation misses, the current one hits.
+
+Run: python -m unittest discover -s workers/knowvault_search -p "test_*.py"
+"""
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import kvstate
+from answercache import AnswerCache
+
+MODELS = ("chat-model", "embed-model")
+
+
+class AnswerCacheTest(unittest.TestCase):
+    def setUp(self):
+        state = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, state, True)
+        patcher = mock.patch.object(kvstate, "STATE", state)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_generation_bump_invalidates(self):
+        cache = AnswerCache()
+        key = cache.key("What is due under INV-7?", ["ws2", "ws1"], *MODELS)
+        cache.put(key, {"answer": "May 1"}, 1200)
+        # same question, normalized, same scope in another order: same generations, a hit
+        self.assertEqual(cache.get(cache.key("what is due under  inv-7", ["ws1", "ws2"], *MODELS)),
+                         {"answer": "May 1"})
+
+        kvstate.bump_generation("ws2")  # the indexer changed ws2's points
+        stale = cache.key("What is due under INV-7?", ["ws1", "ws2"], *MODELS)
+        self.assertNotEqual(stale, key)
+        self.assertIsNone(cache.get(stale))
+        cache.put(stale, {"answer": "June 1"}, 1300)
+        self.assertEqual(cache.get(cache.key("What is due under INV-7?", ["ws1", "ws2"], *MODELS)),
+                         {"answer": "June 1"})
+
+        kvstate.bump_generation("ws3")  # outside the scope: no effect
+        self.assertIsNotNone(cache.get(cache.key("What is due under INV-7?", ["ws1", "ws2"], *MODELS)))
+        self.assertEqual((cache.stats()["hits"], cache.stats()["misses"]), (3, 1))
+
+    def test_expired_and_evicted(self):
+        cache = AnswerCache(ttl=-1)
+        key = cache.key("q", ["ws1"], *MODELS)
+        cache.put(key, {"answer": "a"}, 10)
+        self.assertIsNone(cache.get(key))
+        cache = AnswerCache(max_entries=1)
+        first, second = cache.key("q1", ["ws1"], *MODELS), cache.key("q2", ["ws1"], *MODELS)
+        cache.put(first, {"answer": "1"}, 10)
+        cache.put(second, {"answer": "2"}, 10)
+        self.assertIsNone(cache.get(first))
+        self.assertEqual(cache.get(second), {"answer": "2"})
+
+
+if __name__ == "__main__":
+    unittest.main()
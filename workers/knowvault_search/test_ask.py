@@ -0,0 +1,86 @@
+"""The ask.py CLI over compact payloads: chunk text comes from the text store.
+
+Run: python -m unittest discover -s workers/knowvault_search -p "test_*.py"
+"""
+import contextlib
+import importlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+CONTRACT = "Contract INV-7 between Vector LLC and Orion is due on the first of May for 100000 rubles."
+PENALTY = "Late payment of an invoice carries a penalty of 0.1 percent per day of the outstanding amount."
+
+
+class AskTest(unittest.TestCase):
+    def setUp(self):
+        state = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, state, True)
+        env = mock.patch.dict(os.environ, {
+            "KALITA_TOKEN": "t", "KV_VECTOR_BACKEND": "local", "KV_LOCAL_VECTORS": os.path.join(state, "vectors"),
+            "KV_COMPACT_PAYLOAD": "on", "KV_TEXT_STORE": os.path.join(state, "texts.sqlite"),
+            "KV_STATE": state, "KV_EMBED_CACHE": "off", "KV_LEXICAL": "off"})
+        env.start()
+        self.addCleanup(env.stop)
+        # both read their env at import: a fresh copy each, dropped again afterwards
+        for name in ("ask", "service"):
+            sys.modules.pop(name, None)
+            self.addCleanup(sys.modules.pop, name, None)
+        self.ask, self.service = importlib.import_module("ask"), importlib.import_module("service")
+        self.addCleanup(self.service.FANOUT.shutdown)
+        self.addCleanup(self.service.TEXTS._db.close)
+
+    def seed(self, payloads):
+        self.service.STORE.ensure_collection("kv_ws1", 2)
+        self.service.STORE.upsert("kv_ws1", [
+            {"id": f"00000000-0000-0000-0000-00000000000{i}", "vector": vec, "payload": payload}
+            for i, (vec, payload) in enumerate(zip([[1.0, 0.0], [0.6, 0.8]], payloads))])
+
+    def run_ask(self):
+        """(calls to the node, chat request bodies, stdout) of one `ask.py "When is INV-7 due?"`."""
+        ask = self.ask
+        calls, sent = [], []
+
+        def tool(name, args=None):
+            calls.append((name, args))
+            return {"records": [{"id": "ws1", "values": {}}]} if name == "query" else {}
+
+        def http(url, body=None, headers=None, method=None):
+            sent.append(body)
+            return {"choices": [{"message": {"content": "100000 rubles, due on the first of May."}}]}
+
+        out = io.StringIO()
+        with mock.patch.object(ask, "tool", tool), mock.patch.object(ask, "http", http), \
+                mock.patch.object(ask, "embed", lambda texts: [[1.0, 0.0]]), \
+                mock.patch.object(sys, "argv", ["ask.py", "When is INV-7 due?"]), contextlib.redirect_stdout(out):
+            ask.main()
+        return calls, sent, out.getvalue()
+
+    def test_compact_payloads_are_resolved(self):
+        refs = self.service.TEXTS.put([CONTRACT, PENALTY])
+        self.seed([{"source": "s1", "workspace": "ws1", "file": file, "text_ref": ref}
+                   for file, ref in zip(["a.txt", "b.txt"], refs)])
+        calls, sent, out = self.run_ask()
+        context = sent[0]["messages"][1]["content"]
+        self.assertIn(CONTRACT, context)
+        self.assertLess(context.index(CONTRACT), context.index(PENALTY))
+        self.assertEqual(calls[-1][1]["values"]["workspace"], "ws1")
+        self.assertIn("sources: a.txt, b.txt", out)
+
+    def test_payloads_without_workspace(self):
+        # indexed before payloads were stamped with their workspace: it comes from the collection
+        self.seed([{"source": "s1", "file": file, "text": text}
+                   for file, text in zip(["a.txt", "b.txt"], [CONTRACT, PENALTY])])
+        calls, sent, out = self.run_ask()
+        self.assertEqual(calls[-1], ("create_record", {
+            "entity": "SearchQuery", "basis": {"type": "human", "id": "searcher"},
+            "values": {"workspace": "ws1", "query": "When is INV-7 due?", "actor_role": "Searcher", "results": 2}}))
+        self.assertIn("100000 rubles", out)
+
+
+if __name__ == "__main__":
+    unittest.main()
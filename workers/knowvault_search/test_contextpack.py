@@ -0,0 +1,53 @@
+"""Context packing: duplicates out, diversity with MMR, the token budget held.
+
+Run: python -m unittest discover -s workers/knowvault_search -p "test_*.py"
+"""
+import unittest
+
+from contextpack import ContextPacker
+
+CONTRACT = "Contract INV-7 between Vector LLC and Orion is due on the first of May for 100000 rubles."
+PENALTY = "Late payment of an invoice carries a penalty of 0.1 percent per day of the outstanding amount."
+CONTACTS = "The account manager for Vector LLC is Anna, reachable through the billing desk."
+
+
+def hit(file, text):
+    return {"file": file, "text": text}
+
+
+class PackTest(unittest.TestCase):
+    def test_drops_near_duplicates_and_overlaps(self):
+        packer = ContextPacker(budget=10000)
+        top, report = packer.pack([
+            hit("a.txt", CONTRACT),
+            hit("a-copy.txt", CONTRACT.replace("100000", "100 000")),  # near-identical
+            hit("b.txt", PENALTY),
+            hit("a.txt", CONTRACT + " " + PENALTY),  # overlaps both
+            hit("c.txt", CONTACTS),
+        ])
+        self.assertEqual([p["file"] for p in top], ["a.txt", "b.txt", "c.txt"])
+        self.assertEqual(report["duplicates"], 2)
+        self.assertGreater(report["saved_tokens"], 0)
+        self.assertEqual(report["tokens"] + report["saved_tokens"], report["baseline_tokens"])
+
+    def test_budget_skips_what_does_not_fit(self):
+        long = hit("long.txt", PENALTY * 20)
+        packer = ContextPacker(budget=60)
+        top, report = packer.pack([hit("a.txt", CONTRACT), long, hit("c.txt", CONTACTS)])
+        self.assertEqual([p["file"] for p in top], ["a.txt", "c.txt"])
+        self.assertLessEqual(report["tokens"], 60)
+        # the best chunk goes in even alone over budget
+        top, _ = ContextPacker(budget=10).pack([long, hit("a.txt", CONTRACT)])
+        self.assertEqual([p["file"] for p in top], ["long.txt"])
+
+    def test_mmr_prefers_new_information(self):
+        similar = CONTRACT.replace("first of May", "fifteenth of June").replace("Orion", "Sirius")
+        cands = [hit("a.txt", CONTRACT), hit("b.txt", similar), hit("c.txt", PENALTY)]
+        top, _ = ContextPacker(budget=10000, max_chunks=2, dedup=1.0).pack(cands)
+        self.assertEqual([p["file"] for p in top], ["a.txt", "b.txt"])
+        top, _ = ContextPacker(budget=10000, max_chunks=2, dedup=1.0, mmr_lambda=0.5).pack(cands)
+        self.assertEqual([p["file"] for p in top], ["a.txt", "c.txt"])
+
+
+if __name__ == "__main__":
+    unittest.main()
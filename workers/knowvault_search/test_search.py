@@ -0,0 +1,90 @@
+"""Retrieval stays inside the caller's scope: the shared collection's filter
+and the per-workspace fan-out, on the local vector backend.
+
+Run: python -m unittest discover -s workers/knowvault_search -p "test_*.py"
+"""
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import kvlayout
+import kvstate
+
+QUESTION = "When is the invoice due?"
+# ws2's chunk is the closest to the question: it must still never reach a ws1/ws3 caller
+CHUNKS = [("ws1", "a.txt", "The ws1 invoice is due in May.", [0.9, 0.1]),
+          ("ws1", "b.txt", "The ws1 office moved to the third floor.", [0.2, 0.8]),
+          ("ws2", "c.txt", "The ws2 invoice is due in June.", [1.0, 0.0]),
+          ("ws3", "d.txt", "The ws3 invoice is due in July.", [0.7, 0.3])]
+
+
+class ScopeCase(unittest.TestCase):
+    layout = None
+
+    def setUp(self):
+        state = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, state, True)
+        for patcher in (mock.patch.dict(os.environ, {
+                "KV_VECTOR_BACKEND": "local", "KV_LOCAL_VECTORS": os.path.join(state, "vectors"),
+                "KV_TEXT_STORE": os.path.join(state, "texts.sqlite"), "KV_EMBED_CACHE": "off"}),
+                mock.patch.object(kvstate, "STATE", state), mock.patch.object(kvlayout, "LAYOUT", self.layout)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        sys.modules.pop("service", None)  # reads its env at import
+        self.addCleanup(sys.modules.pop, "service", None)
+        self.service = importlib.import_module("service")
+        self.addCleanup(self.service.FANOUT.shutdown)
+        self.addCleanup(self.service.TEXTS._db.close)
+        store = self.service.STORE
+        for i, (ws, file, text, vec) in enumerate(CHUNKS):
+            point = {"id": f"00000000-0000-0000-0000-00000000000{i}", "vector": vec,
+                     "payload": {"source": f"s-{ws}", "workspace": ws, "file": file, "text": text}}
+            name = kvlayout.collection(ws)
+            store.ensure_collection(name, 2, kvlayout.indexes())
+            store.upsert(name, [point])
+            self.service.LEXICAL.add(ws, [point])
+
+    def retrieve(self, scope_ids):
+        with mock.patch.object(self.service, "embed", lambda texts: [[1.0, 0.0]]):
+            top, dropped, _report = self.service.retrieve(QUESTION, scope_ids, self.service.Timer())
+        return top, dropped
+
+    def check_scope(self):
+        top, dropped = self.retrieve(["ws1", "ws3"])
+        self.assertEqual(dropped, [])
+        self.assertEqual({p["workspace"] for p in top}, {"ws1", "ws3"})
+        self.assertEqual(top[0]["file"], "a.txt")
+        self.assertNotIn("c.txt", [p["file"] for p in top])
+        hits, _dropped = self.service.search_collections([1.0, 0.0], ["ws1"], limit=10, top=10)
+        self.assertEqual({ws for _s, ws, _p in hits}, {"ws1"})
+        self.assertEqual({p["workspace"] for _s, _ws, p in hits}, {"ws1"})
+        top, _dropped = self.retrieve(["ws2"])
+        self.assertEqual([p["file"] for p in top], ["c.txt"])
+
+
+class SharedLayoutTest(ScopeCase):
+    layout = "shared"
+
+    def test_no_hits_outside_scope(self):
+        self.assertEqual(self.service.STORE.collections(), [kvlayout.SHARED_COLLECTION])
+        self.check_scope()
+
+
+class WorkspaceLayoutTest(ScopeCase):
+    layout = "workspace"
+
+    def test_no_hits_outside_scope(self):
+        self.check_scope()
+
+    def test_unindexed_workspace_is_dropped(self):
+        top, dropped = self.retrieve(["ws1", "ws9"])
+        self.assertEqual(dropped, ["ws9"])
+        self.assertEqual({p["workspace"] for p in top}, {"ws1"})
+
+
+if __name__ == "__main__":
+    unittest.main()
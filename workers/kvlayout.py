@@ -0,0 +1,41 @@
+"""How KnowVault vectors are laid out in collections — shared by the indexer and searchers.
+
+Two layouts:
+  workspace (default)  one collection per workspace, kv_<workspace_id>;
+                       a question is searched in N collections.
+  shared               every workspace in ONE collection, `workspace` an
+                       indexed keyword payload field; a question is one
+                       search filtered to the caller's scope_ids.
+
+The permission boundary is the same either way: the node decides scope_ids,
+the worker only ever searches inside them. Every point carries its
+`workspace` in the payload, in both layouts, so a switch is a copy
+(knowvault_indexer/migrate_shared.py), not a re-index.
+
+Env: KV_LAYOUT (workspace | shared), KV_SHARED_COLLECTION (default kv_shared)
+"""
+import os
+
+LAYOUT = os.environ.get("KV_LAYOUT", "workspace")
+SHARED_COLLECTION = os.environ.get("KV_SHARED_COLLECTION", "kv_shared")
+
+
+def shared():
+    return LAYOUT == "shared"
+
+
+def collection(workspace_id):
+    return SHARED_COLLECTION if shared() else f"kv_{workspace_id}"
+
+
+def indexes():
+    """Payload keys a collection indexes: the shared layout filters on `workspace`."""
+    return ("workspace",) if shared() else ()
+
+
+def scope_filter(workspace_ids):
+    """Filter (Qdrant syntax, see vectorstore.py) restricting a shared-collection search to the given workspaces."""
+    return {"must": [{"key": "workspace", "match": {"any": list(workspace_ids)}}]}
+
+
+WORKSPACE_INDEX = {"field_name": "workspace", "field_schema": "keyword"}
@@ -0,0 +1,61 @@
+"""Local worker state for KnowVault: manifests and other bookkeeping that must
+survive a restart but is NOT business data. Business data lives on the node;
+this directory is a cache of what the worker already did, safe to delete (the
+next run just does the work again).
+
+Env: KV_STATE (default ~/.kalita/knowvault)
+"""
+import json
+import os
+import tempfile
+import time
+
+STATE = os.environ.get("KV_STATE", os.path.join(os.path.expanduser("~"), ".kalita", "knowvault"))
+
+
+def path(*parts):
+    """A path under the state dir; parent directories are created on demand."""
+    p = os.path.join(STATE, *parts)
+    os.makedirs(os.path.dirname(p), exist_ok=True)
+    return p
+
+
+def load_json(p, default=None):
+    try:
+        with open(p, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def save_json(p, obj):
+    """Atomic write: a crash mid-write leaves the previous version, never half a file."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(p), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(obj, f, ensure_ascii=False)
+        os.replace(tmp, p)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def bump_generation(workspace):
+    """Mark a workspace's index as changed. Readers holding anything derived
+    from it (cached answers) compare generations and drop what is older."""
+    p = path("generations", workspace)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(p), prefix=".tmp-")
+    with os.fdopen(fd, "w") as f:
+        f.write(str(time.time_ns()))
+    os.replace(tmp, p)
+
+
+def generation(workspace):
+    try:
+        with open(os.path.join(STATE, "generations", workspace)) as f:
+            return f.read()
+    except OSError:
+        return "0"
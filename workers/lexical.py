@@ -0,0 +1,178 @@
+"""Lexical (BM25) index over KnowVault chunks — the exact-token half of retrieval.
+
+Dense vectors are good at meaning and bad at exact strings: contract numbers,
+SKUs, error codes. The indexer feeds every chunk it upserts into a per-
+workspace inverted index as well; the search service ranks the question with
+BM25 too and fuses both rankings with reciprocal rank fusion (rrf()).
+
+On disk: <KV_STATE>/bm25/<workspace>.sqlite (WAL; the indexer writes while the
+search service reads), a posting list per term — postings(term, doc, tf),
+clustered by term — plus each chunk's length and payload. A workspace's file
+is opened on first use; a workspace never indexed simply has no hits.
+
+Tokens are casefolded words; a code like INV-2024/17 is indexed whole and as
+its parts, so both the full code and a fragment of it match. Removing a chunk
+re-tokenizes its stored text to find its postings, so tokenize() must stay
+stable (change it and the index has to be rebuilt).
+
+Env: KV_LEXICAL (default on; "off" disables indexing and fusion), KV_STATE
+"""
+import collections
+import heapq
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+
+import kvstate
+
+K1, B = 1.2, 0.75
+MAX_TERMS = 32
+_TOKEN = re.compile(r"\w+(?:[-./:#]\w+)*")
+_PART = re.compile(r"\w+")
+
+
+def tokenize(text):
+    out = []
+    for tok in _TOKEN.findall(text.casefold()):
+        out.append(tok)
+        parts = _PART.findall(tok)
+        if len(parts) > 1:
+            out += parts
+    return out
+
+
+def rrf(rankings, key, k=60):
+    """Reciprocal rank fusion: every ranking gives an item 1 / (k + rank);
+    items are returned best first, each as it first appeared."""
+    scores, items = {}, {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            kk = key(item)
+            scores[kk] = scores.get(kk, 0.0) + 1.0 / (k + rank)
+            items.setdefault(kk, item)
+    return [items[kk] for kk in sorted(scores, key=scores.get, reverse=True)]
+
+
+def _chunks(seq, n=500):  # SQLite caps the number of bound parameters
+    for i in range(0, len(seq), n):
+        yield seq[i:i + n]
+
+
+class LexicalIndex:
+    def __init__(self, root):
+        self.root = root
+        self._dbs = {}  # workspace -> (connection, lock)
+        self._lock = threading.Lock()
+
+    def _open(self, workspace, create=False):
+        with self._lock:
+            hit = self._dbs.get(workspace)
+            if hit is None:
+                p = os.path.join(self.root, f"{workspace}.sqlite")
+                if not create and not os.path.exists(p):
+                    return None, None
+                os.makedirs(self.root, exist_ok=True)
+                db = sqlite3.connect(p, timeout=30, check_same_thread=False, isolation_level=None)
+                db.execute("PRAGMA journal_mode=WAL")
+                db.execute("PRAGMA synchronous=NORMAL")
+                db.execute("CREATE TABLE IF NOT EXISTS postings (term TEXT, doc TEXT, tf INTEGER, "
+                           "PRIMARY KEY (term, doc)) WITHOUT ROWID")
+                db.execute("CREATE TABLE IF NOT EXISTS docs (id TEXT PRIMARY KEY, len INTEGER, payload TEXT)")
+                db.execute("CREATE TABLE IF NOT EXISTS meta (docs INTEGER, length INTEGER)")
+                if db.execute("SELECT COUNT(*) FROM meta").fetchone()[0] == 0:
+                    db.execute("INSERT INTO meta VALUES (0, 0)")
+                hit = self._dbs[workspace] = (db, threading.Lock())
+            return hit
+
+    def add(self, workspace, points):
+        """Index (or re-index) chunks: [{"id", "payload": {"text", ...}}]."""
+        latest = {str(p["id"]): p["payload"] for p in points}
+        db, lock = self._open(workspace, create=True)
+        with lock:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                self._remove(db, list(latest))
+                total = 0
+                for pid, payload in latest.items():
+                    terms = collections.Counter(tokenize(payload.get("text", "")))
+                    total += sum(terms.values())
+                    db.execute("INSERT INTO docs VALUES (?, ?, ?)",
+                               (pid, sum(terms.values()), json.dumps(payload, ensure_ascii=False)))
+                    db.executemany("INSERT INTO postings VALUES (?, ?, ?)", [(t, pid, tf) for t, tf in terms.items()])
+                db.execute("UPDATE meta SET docs = docs + ?, length = length + ?", (len(latest), total))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def remove(self, workspace, ids):
+        if not ids:
+            return
+        db, lock = self._open(workspace)
+        if db is None:
+            return
+        with lock:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                self._remove(db, [str(i) for i in ids])
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def _remove(self, db, ids):
+        n = total = 0
+        for part in _chunks(ids):
+            rows = db.execute(f"SELECT id, len, payload FROM docs WHERE id IN ({','.join('?' * len(part))})",
+                              part).fetchall()
+            for pid, length, payload in rows:
+                db.executemany("DELETE FROM postings WHERE term = ? AND doc = ?",
+                               [(t, pid) for t in set(tokenize(json.loads(payload).get("text", "")))])
+                n, total = n + 1, total + length
+            db.executemany("DELETE FROM docs WHERE id = ?", [(r[0],) for r in rows])
+        if n:
+            db.execute("UPDATE meta SET docs = docs - ?, length = length - ?", (n, total))
+
+    def search(self, workspace_ids, query, limit=8):
+        """[(bm25 score, workspace, payload)] of the `limit` best chunks."""
+        terms = list(dict.fromkeys(tokenize(query)))[:MAX_TERMS]
+        hits = []
+        for ws in workspace_ids if terms else ():
+            db, lock = self._open(ws)
+            if db is not None:
+                with lock:
+                    hits += self._search_one(db, ws, terms, limit)
+        return heapq.nlargest(limit, hits, key=lambda h: h[0])
+
+    def _search_one(self, db, workspace, terms, limit):
+        db.execute("BEGIN")
+        try:
+            n, total = db.execute("SELECT docs, length FROM meta").fetchone()
+            if not n:
+                return []
+            avgdl = total / n or 1.0
+            dfs = {t: db.execute("SELECT COUNT(*) FROM postings WHERE term = ?", (t,)).fetchone()[0] for t in terms}
+            # a term in most chunks says little and costs a long posting list
+            useful = [t for t in terms if dfs[t] and dfs[t] <= n / 2] or [t for t in terms if dfs[t]]
+            scores = collections.defaultdict(float)
+            for t in useful:
+                idf = math.log(1 + (n - dfs[t] + 0.5) / (dfs[t] + 0.5))
+                for doc, tf, dl in db.execute("SELECT p.doc, p.tf, d.len FROM postings p JOIN docs d ON d.id = p.doc "
+                                              "WHERE p.term = ?", (t,)):
+                    scores[doc] += idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * dl / avgdl))
+            best = heapq.nlargest(limit, scores.items(), key=lambda kv: kv[1])
+            payloads = dict(db.execute(f"SELECT id, payload FROM docs WHERE id IN ({','.join('?' * len(best))})",
+                                       [doc for doc, _s in best]).fetchall()) if best else {}
+        finally:
+            db.execute("COMMIT")
+        return [(score, workspace, json.loads(payloads[doc])) for doc, score in best if doc in payloads]
+
+
+def open_lexical():
+    """The process-wide lexical index, or None when KV_LEXICAL=off."""
+    if os.environ.get("KV_LEXICAL", "on").lower() == "off":
+        return None
+    return LexicalIndex(os.path.join(kvstate.STATE, "bm25"))
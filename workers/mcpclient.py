@@ -0,0 +1,50 @@
+"""Batched MCP tool calls — shared by the indexer and the agent runner.
+
+Bookkeeping calls that do not need each other's results (report_progress +
+complete_task, act + fail_task, take_task for several offered tasks) go to
+the node's /mcp as ONE JSON-RPC batch instead of one round-trip each. The
+node runs a batch's calls in order and answers with an array; responses are
+matched back by id, and each call keeps its own error — one failed call does
+not fail the others.
+
+  batch(url, token, [(tool, arguments), ...]) -> [(payload, is_error), ...]
+
+in call order; payload is the tool's JSON (its structured error when
+is_error), or the JSON-RPC error object of a call the node could not run. A
+node that predates batches answers the array with a single parse error; the
+calls are then sent one by one. Transport errors raise, as for a single call.
+
+Timed into kalita_mcp_call_seconds{tool="batch"} (metrics.py).
+Stdlib only.
+"""
+import json
+
+import metrics
+from httppool import POOL
+
+
+def batch(url, token, calls, timeout=60):
+    if not calls:
+        return []
+    body = [{"jsonrpc": "2.0", "id": i, "method": "tools/call", "params": {"name": name, "arguments": args or {}}}
+            for i, (name, args) in enumerate(calls)]
+    with metrics.MCP_CALLS.time(tool="batch"):
+        out = POOL.json(url, body, {"Authorization": "Bearer " + token}, timeout=timeout)
+    if isinstance(out, dict):  # no batch support: the array was rejected whole
+        return [one(url, token, rpc, timeout) for rpc in body]
+    by_id = {r.get("id"): r for r in out}
+    return [decode(by_id.get(i, {"error": {"code": -32603, "message": "no response for this call"}}))
+            for i in range(len(calls))]
+
+
+def one(url, token, rpc, timeout):
+    with metrics.MCP_CALLS.time(tool=rpc["params"]["name"]):
+        return decode(POOL.json(url, rpc, {"Authorization": "Bearer " + token}, timeout=timeout))
+
+
+def decode(rpc):
+    if "error" in rpc:
+        return rpc["error"], True
+    res = rpc.get("result", {})
+    content = res.get("content", [])
+    return (json.loads(content[0]["text"]) if content else {}), bool(res.get("isError"))
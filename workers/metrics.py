@@ -0,0 +1,225 @@
+"""Counters and latency histograms for kalita workers, in Prometheus text format.
+
+One registry per process (REGISTRY). Metrics are created once at import
+time and then only updated, under a lock, so recording costs a dict update:
+
+    STAGE = metrics.histogram("kalita_index_stage_seconds", "...", ["stage"])
+    with STAGE.time(stage="embed"):
+        ...
+    run = metrics.Tally(STAGE)       # per-run breakdown, even with runs overlapping:
+    with run.time(stage="embed"):    # recorded in STAGE and in the run's own totals
+        ...
+    run.breakdown()
+
+render() is the text for a /metrics endpoint; the search service serves it
+itself, other workers (indexer, runner) can start a tiny one with serve().
+
+Env: KALITA_METRICS_LISTEN (host:port of serve()'s /metrics; empty = off)
+"""
+import bisect
+import contextlib
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(v):
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=""):
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labels)
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._lines()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, n=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + n
+
+    def _lines(self):
+        with self._lock:
+            return [f"{self.name}{_labels(self.labels, k)} {v}" for k, v in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, seconds, **labels):
+        key = self._key(labels)
+        with self._lock:
+            v = self._values.get(key)
+            if v is None:
+                v = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            v[0][bisect.bisect_left(self.buckets, seconds)] += 1
+            v[1] += seconds
+            v[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t, **labels)
+
+    def totals(self):
+        """{label values: (count, seconds)} — process-wide; a run's own share is a Tally's."""
+        with self._lock:
+            return {k: (v[2], v[1]) for k, v in self._values.items()}
+
+    def _lines(self):
+        out = []
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+        for key, (counts, total, n) in items:
+            cum = 0
+            for le, c in zip(self.buckets + ("+Inf",), counts):
+                cum += c
+                bound = 'le="%s"' % le
+                out.append(f"{self.name}_bucket{_labels(self.labels, key, bound)} {cum}")
+            out.append(f"{self.name}_sum{_labels(self.labels, key)} {total:.6f}")
+            out.append(f"{self.name}_count{_labels(self.labels, key)} {n}")
+        return out
+
+
+class Callback(_Metric):
+    """A value read when rendered: fn() -> number (queue depth, cache size...)."""
+    def __init__(self, name, help, fn, kind="gauge"):
+        super().__init__(name, help)
+        self.fn, self.kind = fn, kind
+
+    def _lines(self):
+        return [f"{self.name} {self.fn()}"]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def callback(self, name, help, fn, kind="gauge"):
+        with self._lock:  # replaced, not kept: the newest owner of the value wins
+            self._metrics[name] = Callback(name, help, fn, kind)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for m in metrics for line in m.render()) + "\n"
+
+
+REGISTRY = Registry()
+counter, histogram, callback, render = REGISTRY.counter, REGISTRY.histogram, REGISTRY.callback, REGISTRY.render
+
+# shared by every worker that makes these calls
+MCP_CALLS = histogram("kalita_mcp_call_seconds", "MCP tool call latency, by tool", ["tool"])
+LLM_CALLS = histogram("kalita_llm_call_seconds", "LM server call latency, by operation (embed, chat)", ["op"])
+
+
+class Tally:
+    """One run's share of a histogram: what is observed through it goes to
+    the histogram and to the tally's own totals, so concurrent runs do not
+    see each other's time in their breakdown."""
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def observe(self, seconds, **labels):
+        self.histogram.observe(seconds, **labels)
+        key = self.histogram._key(labels)
+        with self._lock:
+            n, secs = self._totals.get(key, (0, 0.0))
+            self._totals[key] = (n + 1, secs + seconds)
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t, **labels)
+
+    def totals(self):
+        with self._lock:
+            return dict(self._totals)
+
+    def breakdown(self):
+        return breakdown({}, self.totals())
+
+
+def breakdown(before, after):
+    """Text like "embed 4.12s/12, upsert 0.80s/12" (seconds / observations)
+    from two Histogram.totals() snapshots, slowest first."""
+    parts = []
+    for key, (n, secs) in after.items():
+        n0, s0 = before.get(key, (0, 0.0))
+        if n > n0:
+            parts.append((secs - s0, f"{'/'.join(key)} {secs - s0:.2f}s/{n - n0}"))
+    return ", ".join(text for _s, text in sorted(parts, reverse=True))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *_):
+        pass
+
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(listen=None):
+    """Serve /metrics from a background thread at KALITA_METRICS_LISTEN (or
+    `listen`); None when not configured."""
+    listen = listen or os.environ.get("KALITA_METRICS_LISTEN", "")
+    if not listen:
+        return None
+    host, port = listen.rsplit(":", 1)
+    srv = ThreadingHTTPServer((host, int(port)), _Handler)
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, daemon=True, name="metrics").start()
+    return srv
@@ -0,0 +1,114 @@
+"""Keep-alive pool: which requests are replayed when the server drops a reused connection.
+
+Run: python -m unittest discover -s workers -p "test_httppool.py"
+"""
+import socket
+import threading
+import time
+import unittest
+import urllib.error
+
+from httppool import Pool
+
+
+class Server:
+    """A raw HTTP server. Per connection it answers the first request; then,
+    by `mode`, it reads the next one and hangs up without an answer ("race")
+    or closes the idle connection right after the first answer ("idle")."""
+    def __init__(self, mode):
+        self.mode, self.received = mode, []
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(8)
+        self.url = "http://127.0.0.1:%d/x" % self.sock.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _read(self, f):
+        line = f.readline()
+        if not line:
+            return None
+        length = 0
+        while True:
+            h = f.readline()
+            if h in (b"\r\n", b""):
+                break
+            name, _, value = h.partition(b":")
+            if name.strip().lower() == b"content-length":
+                length = int(value)
+        f.read(length)
+        self.received.append(line.split()[0].decode())
+        return line
+
+    def _serve(self, conn):
+        with conn, conn.makefile("rb") as f:
+            if self._read(f) is None:
+                return
+            conn.sendall(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 4\r\n\r\n"ok"')
+            if self.mode == "race":
+                self._read(f)
+
+    def close(self):
+        self.sock.close()
+
+
+class PoolTest(unittest.TestCase):
+    def serve(self, mode):
+        srv = Server(mode)
+        self.addCleanup(srv.close)
+        return srv, Pool(backoff=0.01)
+
+    def test_idempotent_request_is_replayed_once(self):
+        srv, pool = self.serve("race")
+        self.assertEqual(pool.json(srv.url), "ok")
+        self.assertEqual(pool.json(srv.url, {"points": []}, method="PUT"), "ok")  # reused, dropped, replayed
+        self.assertEqual(srv.received, ["GET", "PUT", "PUT"])
+        self.assertEqual(pool.stats()["retried"], 1)
+
+    def test_post_that_went_out_is_not_replayed(self):
+        srv, pool = self.serve("race")
+        self.assertEqual(pool.json(srv.url, {"q": 1}), "ok")
+        with self.assertRaises(urllib.error.URLError):
+            pool.json(srv.url, {"q": 2})  # the server may have acted on it: the caller decides
+        self.assertEqual(srv.received, ["POST", "POST"])
+        self.assertEqual(pool.stats()["retried"], 0)
+        self.assertEqual(pool.json(srv.url, {"q": 3}, idempotent=True), "ok")
+
+    def test_caller_retries_sends_once(self):
+        srv, pool = self.serve("race")
+        self.assertEqual(pool.json(srv.url), "ok")
+        with pool.caller_retries(), self.assertRaises(urllib.error.URLError):
+            pool.json(srv.url, {"points": []}, method="PUT")  # the caller's loop tries again, not the pool
+        self.assertEqual(srv.received, ["GET", "PUT"])
+        self.assertEqual(pool.stats()["retried"], 0)
+        self.assertEqual(pool.json(srv.url, {"points": []}, method="PUT"), "ok")  # outside: a fresh connection
+
+    def test_timeout_is_a_urlerror(self):
+        mute = socket.socket()  # connects (the backlog accepts), never answers
+        mute.bind(("127.0.0.1", 0))
+        mute.listen(8)
+        self.addCleanup(mute.close)
+        pool = Pool(retries=0)
+        with self.assertRaises(urllib.error.URLError) as cm:
+            pool.json("http://127.0.0.1:%d/x" % mute.getsockname()[1], {"q": 1}, timeout=0.2)
+        self.assertIsInstance(cm.exception.reason, TimeoutError)  # what the workers' handlers look at
+        self.assertEqual(pool.stats()["idle"], 0)
+
+    def test_connection_closed_while_idle_is_not_reused(self):
+        srv, pool = self.serve("idle")
+        self.assertEqual(pool.json(srv.url, {"q": 1}), "ok")
+        time.sleep(0.1)  # the server's FIN arrives while the connection sits in the pool
+        self.assertEqual(pool.json(srv.url, {"q": 2}), "ok")
+        self.assertEqual(srv.received, ["POST", "POST"])
+        self.assertEqual((pool.stats()["opened"], pool.stats()["reused"], pool.stats()["retried"]), (2, 0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+"""BM25 ranking over a fixed corpus, and reciprocal rank fusion.
+
+Run: python -m unittest discover -s workers -p "test_lexical.py"
+"""
+import shutil
+import tempfile
+import unittest
+
+from lexical import LexicalIndex, rrf, tokenize
+
+CORPUS = {
+    "c1": "Invoice INV-2024/17 for Vector LLC is due on the first of May.",
+    "c2": "Invoices are due thirty days after delivery unless the contract says otherwise.",
+    "c3": "Vector LLC signed the supply contract with Orion in March.",
+    "c4": "A penalty of 0.1 percent per day applies to late invoices.",
+    "c5": "Invoice INV-2024/18 for Orion was paid in full.",
+    "c6": "The warehouse in Tver ships orders twice a week.",
+}
+
+
+class LexicalTest(unittest.TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        self.index = LexicalIndex(root)
+        self.index.add("ws", [{"id": cid, "payload": {"file": f"{cid}.txt", "text": text}}
+                              for cid, text in CORPUS.items()])
+
+    def ranked(self, query, limit=8):
+        return [p["file"] for _score, _ws, p in self.index.search(["ws", "never-indexed"], query, limit)]
+
+    def test_exact_term_ranks_first(self):
+        self.assertEqual(self.ranked("When is INV-2024/17 due?")[0], "c1.txt")
+        self.assertEqual(self.ranked("inv-2024/18")[0], "c5.txt")
+        self.assertEqual(self.ranked("Tver warehouse"), ["c6.txt"])
+        self.assertIn("inv-2024/17", tokenize("INV-2024/17"))
+        self.assertIn("17", tokenize("INV-2024/17"))  # a fragment of a code matches too
+
+    def test_removed_chunks_are_gone(self):
+        self.index.remove("ws", ["c1"])
+        self.assertNotIn("c1.txt", self.ranked("INV-2024/17 Vector"))
+        self.assertEqual(self.ranked("nothing like this"), [])
+
+    def test_rrf_is_stable(self):
+        dense = ["a", "b", "c", "e"]
+        lexical = ["b", "a", "d"]
+        fused = rrf([dense, lexical], key=lambda x: x)
+        # a and b tie, as do c and d: ties keep the order they were first seen in
+        self.assertEqual(fused, ["a", "b", "c", "d", "e"])
+        self.assertEqual(rrf([dense, lexical], key=lambda x: x), fused)
+        first = [("a", 1), ("b", 1)]
+        self.assertIs(rrf([first, [("a", 2)]], key=lambda x: x[0])[0], first[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
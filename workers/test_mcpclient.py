@@ -0,0 +1,86 @@
+"""mcpclient.batch: results in call order, per-call errors, the fallback for nodes without batches.
+
+Run: python -m unittest discover -s workers -p "test_mcpclient.py"
+"""
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import mcpclient
+
+
+def answer(rpc):
+    name, args = rpc["params"]["name"], rpc["params"]["arguments"]
+    if name == "fail_task":
+        out, err = {"code": "NOT_FOUND", "message": f"no task {args['task_id']}"}, True
+    else:
+        out, err = {"tool": name, **args}, False
+    return {"jsonrpc": "2.0", "id": rpc["id"],
+            "result": {"content": [{"type": "text", "text": json.dumps(out)}], "isError": err}}
+
+
+class Node(BaseHTTPRequestHandler):
+    batches = True  # False: a node from before batches, which cannot parse an array
+
+    def log_message(self, *_):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.bodies.append(body)
+        if isinstance(body, list):
+            if not self.batches:
+                out = {"jsonrpc": "2.0", "id": None, "error": {"code": -32700, "message": "parse error"}}
+            else:  # answered out of order, one call with no response at all
+                out = [answer(rpc) for rpc in reversed(body) if rpc["params"]["name"] != "lost"]
+        else:
+            out = answer(body)
+        data = json.dumps(out).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+CALLS = [("report_progress", {"task_id": "t1", "note": "3 docs"}),
+         ("fail_task", {"task_id": "t9"}),
+         ("complete_task", {"task_id": "t1", "result": "done"})]
+
+
+class BatchTest(unittest.TestCase):
+    def node(self, batches):
+        handler = type("N", (Node,), {"batches": batches})
+        srv = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        srv.bodies = []
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        self.addCleanup(srv.server_close)
+        self.addCleanup(srv.shutdown)
+        return srv, "http://%s:%d/mcp" % srv.server_address
+
+    def check(self, results):
+        self.assertEqual([r[1] for r in results], [False, True, False])
+        self.assertEqual(results[0][0], {"tool": "report_progress", "task_id": "t1", "note": "3 docs"})
+        self.assertEqual(results[1][0]["code"], "NOT_FOUND")
+        self.assertEqual(results[2][0]["tool"], "complete_task")
+
+    def test_one_round_trip_in_call_order(self):
+        srv, url = self.node(batches=True)
+        self.check(mcpclient.batch(url, "t", CALLS))
+        self.assertEqual(len(srv.bodies), 1)
+        self.assertEqual([rpc["params"]["name"] for rpc in srv.bodies[0]], [c[0] for c in CALLS])
+        payload, is_error = mcpclient.batch(url, "t", [("lost", {})])[0]
+        self.assertTrue(is_error)
+        self.assertEqual(payload["code"], -32603)
+        self.assertEqual(mcpclient.batch(url, "t", []), [])
+
+    def test_falls_back_to_single_calls(self):
+        srv, url = self.node(batches=False)
+        self.check(mcpclient.batch(url, "t", CALLS))
+        self.assertIsInstance(srv.bodies[0], list)
+        self.assertEqual([b["params"]["name"] for b in srv.bodies[1:]], [c[0] for c in CALLS])
+
+
+if __name__ == "__main__":
+    unittest.main()
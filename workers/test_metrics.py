@@ -0,0 +1,27 @@
+"""Per-run tallies: overlapping runs each see their own stage times.
+
+Run: python -m unittest discover -s workers -p "test_metrics.py"
+"""
+import unittest
+
+import metrics
+
+
+class TallyTest(unittest.TestCase):
+    def test_overlapping_runs_do_not_mix(self):
+        hist = metrics.Histogram("test_stage_seconds", "test", ["stage"])
+        task, watch = metrics.Tally(hist), metrics.Tally(hist)
+        task.observe(2.0, stage="embed")
+        watch.observe(0.5, stage="embed")
+        with watch.time(stage="delete"):
+            pass
+        task.observe(1.0, stage="upsert")
+        self.assertEqual(task.totals(), {("embed",): (1, 2.0), ("upsert",): (1, 1.0)})
+        self.assertEqual(task.breakdown(), "embed 2.00s/1, upsert 1.00s/1")
+        self.assertEqual(watch.totals()[("embed",)], (1, 0.5))
+        self.assertNotIn(("upsert",), watch.totals())
+        self.assertEqual(hist.totals()[("embed",)], (2, 2.5))  # the process-wide histogram has both
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+"""LocalStore: round trips in every quantization, filters, deletes, compaction.
+
+Run: python -m unittest discover -s workers -p "test_vectorstore.py"
+"""
+import random
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import vectorstore
+from vectorstore import LocalStore
+
+DIM = 24
+
+
+def points(n, seed=7):
+    rng = random.Random(seed)
+    return [{"id": f"00000000-0000-0000-0000-{i:012d}", "vector": [rng.gauss(0, 1) for _ in range(DIM)],
+             "payload": {"workspace": f"ws{i % 3}", "file": f"f{i}.txt", "lang": "en" if i % 2 else "ru"}}
+            for i in range(n)]
+
+
+class LocalStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+
+    def store(self, quantize="none", rescore=True):
+        return LocalStore(self.root, quantize, rescore)
+
+    def test_round_trip_in_each_quantization(self):
+        pts = points(60)
+        for quantize, min_score in (("none", 0.9999), ("int8", 0.98), ("binary", 0.9999)):
+            with self.subTest(quantize=quantize):
+                store = self.store(quantize)
+                name = f"kv_{quantize}"
+                store.ensure_collection(name, DIM)
+                store.upsert(name, pts)
+                for p in pts[::7]:
+                    best = store.search(name, p["vector"], 3)
+                    self.assertEqual(best[0]["id"], p["id"])
+                    self.assertGreaterEqual(best[0]["score"], min_score)
+                    self.assertEqual(best[0]["payload"], p["payload"])
+                    self.assertEqual(len(best), 3)
+                self.assertEqual(sum(len(page) for page in store.scroll(name)), len(pts))
+
+    def test_filtered_search(self):
+        store, pts = self.store(), points(30)
+        store.ensure_collection("kv_shared", DIM, ("workspace",))
+        store.upsert("kv_shared", pts)
+        flt = {"must": [{"key": "workspace", "match": {"any": ["ws1", "ws2"]}},
+                        {"key": "lang", "match": {"value": "en"}}]}  # lang is not indexed: read from the payload
+        hits = store.search("kv_shared", pts[0]["vector"], 30, flt)
+        expected = {p["id"] for p in pts if p["payload"]["workspace"] != "ws0" and p["payload"]["lang"] == "en"}
+        self.assertEqual({h["id"] for h in hits}, expected)
+        with self.assertRaises(vectorstore.StoreError):
+            store.search("kv_shared", pts[0]["vector"], 3, {"should": []})
+
+    def test_delete_then_search(self):
+        pts = points(40)
+        for compact_min in (1024, 0):  # 0: the deletes below trigger a compaction
+            with self.subTest(compact_min=compact_min), mock.patch.object(vectorstore, "COMPACT_MIN", compact_min):
+                store, name = self.store("int8"), f"kv_del{compact_min}"
+                store.ensure_collection(name, DIM)
+                store.upsert(name, pts)
+                gone = [p["id"] for p in pts[:25]]
+                store.delete(name, gone)
+                for p in pts[:25:5]:
+                    self.assertNotIn(p["id"], {h["id"] for h in store.search(name, p["vector"], 40)})
+                for p in pts[25:]:
+                    self.assertEqual(store.search(name, p["vector"], 1)[0]["id"], p["id"])
+                self.assertEqual(len(store.search(name, pts[0]["vector"], 40)), 15)
+
+    def test_missing_collection(self):
+        store = self.store()
+        with self.assertRaises(FileNotFoundError):
+            store.search("kv_nothing", [0.0] * DIM, 3)
+        with self.assertRaises(FileNotFoundError):
+            store.upsert("kv_nothing", points(1))
+        store.delete("kv_nothing", ["x"])  # nothing to delete from is not an error
+        self.assertEqual(store.collections(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+"""Chunk text kept out of the vector store — shared by the indexer and searchers.
+
+With KV_COMPACT_PAYLOAD on, the indexer upserts points whose payload carries
+a `text_ref` instead of the chunk `text`, and the text goes here: one SQLite
+file (WAL, shared like the embedding cache) of zlib-compressed texts keyed by
+a digest of their content, so a duplicate paragraph is stored once and
+Qdrant holds only what it filters and ranks on. The search service resolves
+the references of the final top chunks only; payloads that still carry their
+text (indexed before the switch, or with it off) are left as they are, so
+a collection may hold both kinds while knowvault_indexer/convert_collections.py
+moves it over.
+
+Texts are never dropped by the indexer (another point may share one):
+convert_collections.py --gc sweeps those no collection references anymore.
+
+Env: KV_COMPACT_PAYLOAD (default off), KV_TEXT_STORE (default <KV_STATE>/texts.sqlite)
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+import kvstate
+
+
+def ref(text):
+    """The content address of `text`: 128 bits of its SHA-256, hex."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+class TextStore:
+    def __init__(self, path, compact=False):
+        self.compact = compact
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS texts (ref TEXT PRIMARY KEY, body BLOB, added REAL) "
+                         "WITHOUT ROWID")
+
+    def put(self, texts):
+        """Stores `texts`; returns their refs, in order."""
+        refs = [ref(t) for t in texts]
+        now = time.time()
+        with self._lock:
+            # `added` moves on every put, so a sweep never drops a text an index run is still writing
+            self._db.executemany("INSERT INTO texts VALUES (?, ?, ?) ON CONFLICT (ref) DO UPDATE SET added = ?",
+                                 [(r, zlib.compress(t.encode("utf-8")), now, now)
+                                  for r, t in dict(zip(refs, texts)).items()])
+        return refs
+
+    def get(self, refs):
+        """{ref: text} of those that are stored."""
+        keys, out = list(set(refs)), {}
+        with self._lock:
+            for i in range(0, len(keys), 500):  # SQLite host-parameter limit
+                part = keys[i:i + 500]
+                out.update((r, zlib.decompress(body).decode("utf-8")) for r, body in self._db.execute(
+                    f"SELECT ref, body FROM texts WHERE ref IN ({','.join('?' * len(part))})", part))
+        return out
+
+    def resolve(self, payloads):
+        """`payloads` with `text` filled in from their `text_ref`; one whose
+        text is gone (swept too early, another state dir) is dropped."""
+        texts = self.get([p["text_ref"] for p in payloads if "text" not in p and "text_ref" in p])
+        out = []
+        for p in payloads:
+            if "text" not in p and "text_ref" in p:
+                if p["text_ref"] not in texts:
+                    continue
+                p = {**p, "text": texts[p["text_ref"]]}
+            out.append(p)
+        return out
+
+    def sweep(self, live, before):
+        """Deletes texts not in `live` that were last stored before `before`; returns how many."""
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                dead = [r for (r,) in self._db.execute("SELECT ref FROM texts WHERE added < ?", (before,))
+                        if r not in live]
+                self._db.executemany("DELETE FROM texts WHERE ref = ?", [(r,) for r in dead])
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return len(dead)
+
+    def stats(self):
+        with self._lock:
+            n, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(body)), 0) FROM texts").fetchone()
+        return {"texts": n, "bytes": size}
+
+
+def open_texts():
+    """The process-wide text store configured by env."""
+    return TextStore(os.environ.get("KV_TEXT_STORE") or kvstate.path("texts.sqlite"),
+                     os.environ.get("KV_COMPACT_PAYLOAD", "off").lower() in ("1", "on", "true", "yes"))
@@ -0,0 +1,585 @@
+"""Where KnowVault vectors are stored — shared by the indexer and searchers.
+
+Two backends behind the same four calls:
+  qdrant (default)  the Qdrant REST API at KV_QDRANT, as before.
+  local             in-process, no server: per collection a flat file of
+                    fixed-width vector rows (memory-mapped for search) and a
+                    SQLite file mapping point id -> row, payload. Search is
+                    brute force over the rows (numpy when installed, plain
+                    Python otherwise) — meant for small deployments and CI.
+
+  ensure_collection(name, dim, indexes=())  create if missing; `indexes` are
+                                            payload keys searches filter on
+  upsert(name, points)                      [{"id", "vector", "payload"}], replaces by id
+  delete(name, ids)                         a missing collection has nothing to delete
+  search(name, vector, limit, flt=None, timeout=None) -> [{"id", "score", "payload"}]
+
+and, for maintenance tools (knowvault_indexer/convert_collections.py):
+  collections()                 names of the existing collections
+  scroll(name)                  every point, [{"id", "payload"}] one page at a time
+  set_payloads(name, payloads)  {id: payload}, replacing each point's payload
+  configure(name)               apply this store's collection options to an
+                                existing collection; -> what changed
+
+Scores are cosine similarity in both. Filters use Qdrant's syntax; the local
+backend understands `must` with `match: {any | value}` (kvlayout.scope_filter).
+A missing collection fails search with an OSError in both (HTTPError 404 /
+FileNotFoundError), i.e. "not indexed yet"; a vector of the wrong size is
+an HTTPError 400 from Qdrant and a StoreError from the local backend.
+
+Collection options (worker config, applied when a collection is created —
+configure() converts an existing one):
+  KV_QUANTIZATION   none | scalar | binary. Qdrant keeps the quantized
+                    vectors in RAM and the originals for rescoring; scalar
+                    (int8) is 4x smaller, binary (1 bit per dimension) 32x and
+                    meant for wide embedding models. Searches over-fetch
+                    KV_OVERSAMPLING times the limit on the quantized vectors
+                    and rescore them with the originals (KV_RESCORE, default on).
+  KV_ON_DISK_VECTORS / KV_ON_DISK_PAYLOAD  (Qdrant) keep the original
+                    vectors / the payloads memory-mapped on disk instead of RAM.
+Chunk text can leave the payload altogether, see textstore.py.
+
+Local layout, KV_LOCAL_VECTORS/<collection>/: points.sqlite (WAL; safe for the
+indexer writing while the search service reads) and vectors-<n>.bin. Rows are
+unit-length float32; scalar rows are a float32 scale plus int8 components
+(without originals: no rescoring); binary rows are the sign bits followed by
+the float32 originals, so a search scans the bits and rescores the best. The
+rows are memory-mapped either way, so the on-disk options do not apply.
+Writes append rows; replaced and deleted rows are garbage until the file is
+compacted, which happens once they outnumber the live ones.
+
+Every call is timed into kalita_vector_call_seconds{op, backend} (metrics.py).
+
+Env: KV_VECTOR_BACKEND (qdrant | local), KV_QDRANT,
+     KV_LOCAL_VECTORS (default <KV_STATE>/vectors), KV_LOCAL_QUANTIZE (int8: the
+     older spelling of KV_QUANTIZATION=scalar for the local backend),
+     KV_QUANTIZATION (none | scalar | binary), KV_RESCORE (default on),
+     KV_OVERSAMPLING (default 2), KV_ON_DISK_VECTORS / KV_ON_DISK_PAYLOAD (default off)
+"""
+import array
+import contextlib
+import heapq
+import json
+import math
+import mmap
+import operator
+import os
+import sqlite3
+import struct
+import threading
+import time
+import urllib.error
+
+import kvstate
+import metrics
+from httppool import POOL
+
+try:
+    import numpy
+except ImportError:  # optional: plain Python scoring is fine for small collections
+    numpy = None
+
+COMPACT_MIN = 1024  # garbage rows tolerated regardless of collection size
+_POPCOUNT = numpy.array([bin(i).count("1") for i in range(256)], numpy.uint8) if numpy is not None else None
+CALLS = metrics.histogram("kalita_vector_call_seconds", "Vector store call latency, by operation and backend",
+                          ["op", "backend"])
+
+
+class StoreError(Exception):
+    """The local backend refused a request (wrong dimensions, unsupported filter)."""
+
+
+class QdrantStore:
+    def __init__(self, url, quantization="none", rescore=True, oversampling=2.0,
+                 on_disk_vectors=False, on_disk_payload=False):
+        self.url = url
+        self.quantization, self.rescore, self.oversampling = quantization, rescore, oversampling
+        self.on_disk_vectors, self.on_disk_payload = on_disk_vectors, on_disk_payload
+
+    def _http(self, path, body=None, method=None, timeout=120, idempotent=None):
+        return POOL.json(self.url + path, body, None, method, timeout, idempotent)
+
+    def _quantization_config(self):
+        if self.quantization == "scalar":
+            return {"scalar": {"type": "int8", "quantile": 0.99, "always_ram": True}}
+        if self.quantization == "binary":
+            return {"binary": {"always_ram": True}}
+        return None
+
+    def ensure_collection(self, name, dim, indexes=()):
+        body = {"vectors": {"size": dim, "distance": "Cosine", "on_disk": self.on_disk_vectors},
+                "on_disk_payload": self.on_disk_payload}
+        quantization = self._quantization_config()
+        if quantization:
+            body["quantization_config"] = quantization
+        try:
+            self._http(f"/collections/{name}", method="PUT", body=body)
+        except urllib.error.HTTPError as e:
+            if e.code != 409:  # already exists
+                raise
+            return
+        for key in indexes:
+            self._http(f"/collections/{name}/index?wait=true", method="PUT",
+                       body={"field_name": key, "field_schema": "keyword"})
+
+    def upsert(self, name, points):
+        with CALLS.time(op="upsert", backend="qdrant"):
+            self._http(f"/collections/{name}/points?wait=true", method="PUT", body={"points": points})
+
+    def delete(self, name, ids):
+        if not ids:
+            return
+        try:
+            with CALLS.time(op="delete", backend="qdrant"):
+                self._http(f"/collections/{name}/points/delete?wait=true", method="POST",
+                           body={"points": ids}, idempotent=True)
+        except urllib.error.HTTPError as e:
+            if e.code != 404:  # collection never created — nothing to delete
+                raise
+
+    def search(self, name, vector, limit, flt=None, timeout=None):
+        # quantization params are ignored by a collection that is not quantized
+        body = {"vector": vector, "limit": limit, "with_payload": True,
+                "params": {"quantization": {"rescore": self.rescore, "oversampling": self.oversampling}}}
+        if flt:
+            body["filter"] = flt
+        with CALLS.time(op="search", backend="qdrant"):
+            return self._http(f"/collections/{name}/points/search", body, "POST",
+                              timeout or 120, idempotent=True).get("result", [])
+
+    def collections(self):
+        return [c["name"] for c in self._http("/collections")["result"]["collections"]]
+
+    def scroll(self, name, page=256):
+        offset = None
+        while True:
+            res = self._http(f"/collections/{name}/points/scroll", method="POST", idempotent=True, body={
+                "limit": page, "offset": offset, "with_payload": True, "with_vector": False})["result"]
+            if res["points"]:
+                yield [{"id": p["id"], "payload": p.get("payload") or {}} for p in res["points"]]
+            offset = res.get("next_page_offset")
+            if offset is None:
+                return
+
+    def set_payloads(self, name, payloads):
+        if payloads:
+            self._http(f"/collections/{name}/points/batch?wait=true", method="POST", idempotent=True, body={
+                "operations": [{"overwrite_payload": {"payload": payload, "points": [pid]}}
+                               for pid, payload in payloads.items()]})
+
+    def configure(self, name):
+        config = self._http(f"/collections/{name}")["result"]["config"]
+        vectors, params = config["params"]["vectors"], config["params"]
+        was = {"quantization": next(iter(config.get("quantization_config") or {"none": None})),
+               "on_disk_vectors": bool(vectors.get("on_disk")),
+               "on_disk_payload": bool(params.get("on_disk_payload"))}
+        want = {"quantization": self.quantization, "on_disk_vectors": self.on_disk_vectors,
+                "on_disk_payload": self.on_disk_payload}
+        changed = {k: (was[k], want[k]) for k in want if was[k] != want[k]}
+        if changed:
+            self._http(f"/collections/{name}", method="PATCH", body={
+                "vectors": {"": {"on_disk": self.on_disk_vectors}},
+                "params": {"on_disk_payload": self.on_disk_payload},
+                "quantization_config": self._quantization_config() or "Disabled"})
+        return changed
+
+
+class LocalStore:
+    def __init__(self, root, quantize="none", rescore=True, oversampling=2.0):
+        self.root, self.quantize = root, quantize
+        self.rescore, self.oversampling = rescore, oversampling
+        self._cols = {}
+        self._lock = threading.Lock()
+
+    def _col(self, name, create=False):
+        with self._lock:
+            col = self._cols.get(name)
+            if col is None:
+                folder = os.path.join(self.root, name)
+                if not create and not os.path.exists(os.path.join(folder, "points.sqlite")):
+                    raise FileNotFoundError(f"collection {name} does not exist")
+                os.makedirs(folder, exist_ok=True)
+                col = self._cols[name] = _Collection(folder)
+            return col
+
+    def ensure_collection(self, name, dim, indexes=()):
+        self._col(name, create=True).init(dim, self.quantize, indexes)
+
+    def upsert(self, name, points):
+        with CALLS.time(op="upsert", backend="local"):
+            self._col(name).upsert(points)
+
+    def delete(self, name, ids):
+        if not ids:
+            return
+        try:
+            col = self._col(name)
+        except FileNotFoundError:
+            return
+        with CALLS.time(op="delete", backend="local"):
+            col.delete(ids)
+
+    def search(self, name, vector, limit, flt=None, timeout=None):
+        with CALLS.time(op="search", backend="local"):
+            return self._col(name).search(vector, limit, flt, self.rescore, self.oversampling)
+
+    def collections(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(n for n in os.listdir(self.root) if os.path.exists(os.path.join(self.root, n, "points.sqlite")))
+
+    def scroll(self, name, page=256):
+        return self._col(name).scroll(page)
+
+    def set_payloads(self, name, payloads):
+        if payloads:
+            self._col(name).set_payloads(payloads)
+
+    def configure(self, name):
+        """Re-packs the rows in the store's quantization. Rows that were int8
+        convert to approximations of the originals — re-index for exact ones."""
+        was = self._col(name).convert(self.quantize)
+        return {"quantization": (was, self.quantize)} if was != self.quantize else {}
+
+
+def _unit(vector):
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+def _bitsize(dim):
+    return (dim + 31) // 32 * 4  # whole float32 words, so the originals stay aligned
+
+
+def _rowsize(dim, quantize):
+    if quantize == "int8":
+        return 4 + dim
+    if quantize == "binary":
+        return _bitsize(dim) + 4 * dim
+    return 4 * dim
+
+
+def _signs(unit, dim):
+    bits = bytearray(_bitsize(dim))
+    for i, x in enumerate(unit):
+        if x > 0:
+            bits[i >> 3] |= 0x80 >> (i & 7)  # numpy.packbits order
+    return bytes(bits)
+
+
+def _pack(vector, dim, quantize):
+    if len(vector) != dim:
+        raise StoreError(f"vector has {len(vector)} dimensions, the collection {dim}")
+    unit = _unit(vector)
+    if quantize == "binary":
+        return _signs(unit, dim) + array.array("f", unit).tobytes()
+    if quantize != "int8":
+        return array.array("f", unit).tobytes()
+    scale = max(abs(x) for x in unit) / 127 or 1.0
+    return struct.pack("f", scale) + array.array("b", [round(x / scale) for x in unit]).tobytes()
+
+
+def _unpack(row, dim, quantize):
+    """The unit vector a row stores (an approximation for int8 rows)."""
+    if quantize == "int8":
+        scale = struct.unpack_from("f", row)[0]
+        return [scale * x for x in array.array("b", row[4:])]
+    return array.array("f", row[_bitsize(dim) if quantize == "binary" else 0:]).tolist()
+
+
+def _chunks(seq, n=500):  # SQLite caps the number of bound parameters
+    for i in range(0, len(seq), n):
+        yield seq[i:i + n]
+
+
+class _Collection:
+    def __init__(self, folder):
+        self.folder = folder
+        self._db = sqlite3.connect(os.path.join(folder, "points.sqlite"), timeout=30,
+                                   check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS points (id TEXT PRIMARY KEY, slot INTEGER, "
+                         "tags TEXT, payload TEXT)")
+        self._lock = threading.Lock()
+        self._writes = 0  # data_version does not move for this connection's own commits
+        self._seen = None
+        self._snap = None
+
+    def _meta(self):
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'collection'").fetchone()
+        return json.loads(row[0]) if row else None
+
+    @contextlib.contextmanager
+    def _write(self):
+        """One write transaction; IMMEDIATE so a second writer process waits
+        instead of appending rows at the same offset."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                meta = self._meta() or {}
+                yield meta
+                if meta:
+                    self._db.execute("INSERT OR REPLACE INTO meta VALUES ('collection', ?)", (json.dumps(meta),))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._writes += 1
+
+    def init(self, dim, quantize, indexes):
+        with self._write() as meta:
+            if not meta:
+                meta.update(dim=dim, quantize=quantize, file="vectors-0.bin", rows=0, dead=0, indexes=[])
+            meta["indexes"] = sorted(set(meta["indexes"]) | set(indexes))
+
+    def upsert(self, points):
+        latest = {str(p["id"]): p for p in points}  # within a batch the last one wins
+        with self._write() as meta:
+            if not meta:
+                raise FileNotFoundError(f"collection {os.path.basename(self.folder)} does not exist")
+            dim, quantize = meta["dim"], meta["quantize"]
+            replaced = sum(self._db.execute(
+                f"SELECT COUNT(*) FROM points WHERE id IN ({','.join('?' * len(part))})", part).fetchone()[0]
+                for part in _chunks(list(latest)))
+            buf, rows = bytearray(), []
+            for slot, (pid, p) in enumerate(latest.items(), meta["rows"]):
+                buf += _pack(p["vector"], dim, quantize)
+                payload = p.get("payload") or {}
+                rows.append((pid, slot, json.dumps({k: payload[k] for k in meta["indexes"] if k in payload}),
+                             json.dumps(payload, ensure_ascii=False)))
+            path = os.path.join(self.folder, meta["file"])
+            # rows go to the file before the commit that makes them visible
+            with open(path, "r+b" if os.path.exists(path) else "w+b") as f:
+                f.seek(meta["rows"] * _rowsize(dim, quantize))
+                f.write(buf)
+            self._db.executemany("INSERT OR REPLACE INTO points VALUES (?, ?, ?, ?)", rows)
+            meta["rows"] += len(rows)
+            meta["dead"] += replaced
+        self._maybe_compact(meta)
+
+    def delete(self, ids):
+        with self._write() as meta:
+            if not meta:
+                return
+            before = self._db.total_changes
+            for part in _chunks([str(i) for i in ids]):
+                self._db.execute(f"DELETE FROM points WHERE id IN ({','.join('?' * len(part))})", part)
+            meta["dead"] += self._db.total_changes - before
+        self._maybe_compact(meta)
+
+    def _maybe_compact(self, meta):
+        if not meta or meta["dead"] < max(COMPACT_MIN, meta["rows"] - meta["dead"]):
+            return
+        with self._write() as meta:
+            old = self._rewrite(meta, meta["quantize"])
+        self._unlink(old)
+
+    def convert(self, quantize):
+        """Rewrites every live row in `quantize`; returns the previous one."""
+        with self._write() as meta:
+            if not meta:
+                raise FileNotFoundError(f"collection {os.path.basename(self.folder)} does not exist")
+            was = meta["quantize"]
+            old = self._rewrite(meta, quantize) if was != quantize else None
+        if old:
+            self._unlink(old)
+        return was
+
+    def _rewrite(self, meta, quantize):
+        """Copies the live rows, in slot order, into a new file (re-packed if
+        `quantize` changes); returns the old file's name. Inside _write()."""
+        dim, rs = meta["dim"], _rowsize(meta["dim"], meta["quantize"])
+        old, new = meta["file"], f"vectors-{time.time_ns()}.bin"
+        live = self._db.execute("SELECT id, slot FROM points ORDER BY slot").fetchall()
+        with open(os.path.join(self.folder, old), "rb") as src, \
+                open(os.path.join(self.folder, new), "wb") as dst:
+            for _pid, slot in live:
+                src.seek(slot * rs)
+                row = src.read(rs)
+                if quantize != meta["quantize"]:
+                    row = _pack(_unpack(row, dim, meta["quantize"]), dim, quantize)
+                dst.write(row)
+        self._db.executemany("UPDATE points SET slot = ? WHERE id = ?",
+                             [(i, pid) for i, (pid, _slot) in enumerate(live)])
+        meta.update(file=new, rows=len(live), dead=0, quantize=quantize)
+        return old
+
+    def _unlink(self, name):
+        try:
+            os.unlink(os.path.join(self.folder, name))
+        except OSError:
+            pass  # still mapped by a reader on Windows; harmless leftover
+
+    def scroll(self, page):
+        after = ""
+        while True:
+            with self._lock:
+                rows = self._db.execute("SELECT id, payload FROM points WHERE id > ? ORDER BY id LIMIT ?",
+                                        (after, page)).fetchall()
+            if not rows:
+                return
+            yield [{"id": pid, "payload": json.loads(payload)} for pid, payload in rows]
+            after = rows[-1][0]
+
+    def set_payloads(self, payloads):
+        with self._write() as meta:
+            if not meta:
+                raise FileNotFoundError(f"collection {os.path.basename(self.folder)} does not exist")
+            self._db.executemany("UPDATE points SET tags = ?, payload = ? WHERE id = ?", [
+                (json.dumps({k: payload[k] for k in meta["indexes"] if k in payload}),
+                 json.dumps(payload, ensure_ascii=False), str(pid)) for pid, payload in payloads.items()])
+
+    def _snapshot(self):
+        with self._lock:
+            seen = (self._db.execute("PRAGMA data_version").fetchone()[0], self._writes)
+            if seen != self._seen:
+                self._db.execute("BEGIN")
+                try:
+                    meta = self._meta()
+                    rows = self._db.execute("SELECT slot, id, tags FROM points").fetchall()
+                finally:
+                    self._db.execute("COMMIT")
+                if not meta:
+                    raise FileNotFoundError(f"collection {os.path.basename(self.folder)} does not exist")
+                self._snap, self._seen = _Snapshot(self.folder, meta, rows), seen
+            return self._snap
+
+    def _payloads(self, ids):
+        out = {}
+        with self._lock:
+            for part in _chunks(ids):
+                out.update((pid, json.loads(p)) for pid, p in self._db.execute(
+                    f"SELECT id, payload FROM points WHERE id IN ({','.join('?' * len(part))})", part))
+        return out
+
+    def search(self, vector, limit, flt=None, rescore=True, oversampling=2.0):
+        snap = self._snapshot()
+        if len(vector) != snap.dim:
+            raise StoreError(f"query has {len(vector)} dimensions, the collection {snap.dim}")
+        cands = self._filter(snap, snap.live, flt) if flt else snap.live
+        if snap.quantize == "binary":
+            best = snap.top_binary(_unit(vector), cands, limit, rescore, oversampling)
+        else:
+            best = snap.top(_unit(vector), cands, limit)
+        payloads = self._payloads([snap.ids[s] for _score, s in best])
+        return [{"id": snap.ids[s], "score": score, "payload": payloads[snap.ids[s]]}
+                for score, s in best if snap.ids[s] in payloads]  # deleted since the snapshot
+
+    def _filter(self, snap, cands, flt):
+        if set(flt) - {"must"}:
+            raise StoreError("the local vector store only supports `must` filters")
+        for cond in flt["must"]:
+            key, match = cond["key"], cond["match"]
+            allowed = set(match["any"]) if "any" in match else {match["value"]}
+            # rows written before `key` was indexed have no tag for it: read their payload
+            untagged = [s for s in cands if key not in snap.tags[s]]
+            payloads = self._payloads([snap.ids[s] for s in untagged]) if untagged else {}
+            cands = [s for s in cands
+                     if (snap.tags[s][key] if key in snap.tags[s]
+                         else payloads.get(snap.ids[s], {}).get(key)) in allowed]
+        return cands
+
+
+class _Snapshot:
+    """What one search reads: the rows committed when it was taken, mapped."""
+    def __init__(self, folder, meta, rows):
+        self.dim, self.quantize = meta["dim"], meta["quantize"]
+        self.rowsize = _rowsize(self.dim, self.quantize)
+        n = meta["rows"]
+        self.ids, self.tags = [None] * n, [None] * n
+        for slot, pid, tags in rows:
+            self.ids[slot], self.tags[slot] = pid, json.loads(tags)
+        self.live = [s for s, pid in enumerate(self.ids) if pid is not None]
+        self.mm = None
+        if n:
+            with open(os.path.join(folder, meta["file"]), "rb") as f:
+                self.mm = mmap.mmap(f.fileno(), n * self.rowsize, access=mmap.ACCESS_READ)
+
+    def top(self, q, cands, limit):
+        """[(score, slot)] of the `limit` best candidates, best first."""
+        if not cands or self.mm is None:
+            return []
+        if numpy is not None:
+            return self._top_numpy(q, cands, limit)
+        dim, rs, mm = self.dim, self.rowsize, self.mm
+        view = memoryview(mm)
+        if self.quantize == "int8":
+            def score(s):
+                off = s * rs
+                scale = struct.unpack_from("f", mm, off)[0]
+                return scale * sum(map(operator.mul, view[off + 4:off + rs].cast("b"), q))
+        else:
+            floats = view.cast("f")
+
+            def score(s):
+                return sum(map(operator.mul, floats[s * dim:(s + 1) * dim], q))
+        return heapq.nlargest(limit, ((score(s), s) for s in cands))
+
+    def _top_numpy(self, q, cands, limit):
+        idx = numpy.asarray(cands)
+        qv = numpy.asarray(q, dtype=numpy.float32)
+        if self.quantize == "int8":
+            raw = numpy.frombuffer(self.mm, numpy.uint8).reshape(-1, self.rowsize)[idx]
+            scores = (raw[:, 4:].view(numpy.int8) @ qv) * raw[:, :4].copy().view(numpy.float32).ravel()
+        else:
+            scores = numpy.frombuffer(self.mm, numpy.float32).reshape(-1, self.dim)[idx] @ qv
+        k = min(limit, len(idx))
+        best = numpy.argpartition(-scores, k - 1)[:k]
+        best = best[numpy.argsort(-scores[best])]
+        return [(float(scores[i]), int(idx[i])) for i in best]
+
+    def top_binary(self, q, cands, limit, rescore, oversampling):
+        """top() for binary rows: the candidates closest in sign bits (Hamming
+        distance), `oversampling` x `limit` of them rescored with the originals."""
+        if not cands or self.mm is None:
+            return []
+        dim, rs, nb = self.dim, self.rowsize, _bitsize(self.dim)
+        qbits = _signs(q, dim)
+        keep = min(len(cands), max(limit, math.ceil(limit * oversampling))) if rescore else limit
+        if numpy is not None:
+            raw = numpy.frombuffer(self.mm, numpy.uint8).reshape(-1, rs)
+            idx = numpy.asarray(cands)
+            dist = _POPCOUNT[raw[idx, :nb] ^ numpy.frombuffer(qbits, numpy.uint8)].sum(axis=1, dtype=numpy.int32)
+            k = min(keep, len(idx))
+            part = numpy.argpartition(dist, k - 1)[:k]
+            if not rescore:
+                part = part[numpy.argsort(dist[part], kind="stable")]
+                return [(1 - 2 * int(dist[i]) / dim, int(idx[i])) for i in part]
+            near = idx[part]
+            scores = raw[near, nb:].copy().view(numpy.float32) @ numpy.asarray(q, dtype=numpy.float32)
+            order = numpy.argsort(-scores)[:limit]
+            return [(float(scores[i]), int(near[i])) for i in order]
+        mm, qint = self.mm, int.from_bytes(qbits, "big")
+        near = heapq.nsmallest(keep, ((bin(int.from_bytes(mm[s * rs:s * rs + nb], "big") ^ qint).count("1"), s)
+                                      for s in cands))
+        if not rescore:
+            return [(1 - 2 * d / dim, s) for d, s in near]
+        floats = memoryview(mm)
+        return heapq.nlargest(limit, ((sum(map(operator.mul, floats[s * rs + nb:(s + 1) * rs].cast("f"), q)), s)
+                                      for _d, s in near))
+
+
+def _flag(name, default):
+    return os.environ.get(name, default).lower() in ("1", "on", "true", "yes")
+
+
+def open_store():
+    backend = os.environ.get("KV_VECTOR_BACKEND", "qdrant")
+    quantization = os.environ.get("KV_QUANTIZATION", "none")
+    if quantization not in ("none", "scalar", "binary"):
+        raise SystemExit(f"KV_QUANTIZATION must be none, scalar or binary, not {quantization!r}")
+    rescore, oversampling = _flag("KV_RESCORE", "on"), float(os.environ.get("KV_OVERSAMPLING", "2"))
+    if backend == "qdrant":
+        return QdrantStore(os.environ.get("KV_QDRANT", "http://192.168.1.4:6333"), quantization, rescore, oversampling,
+                           _flag("KV_ON_DISK_VECTORS", "off"), _flag("KV_ON_DISK_PAYLOAD", "off"))
+    if backend == "local":
+        legacy = os.environ.get("KV_LOCAL_QUANTIZE", "none")
+        if legacy not in ("none", "int8"):
+            raise SystemExit(f"KV_LOCAL_QUANTIZE must be none or int8, not {legacy!r}")
+        if quantization == "none" and legacy == "int8":
+            quantization = "scalar"
+        return LocalStore(os.environ.get("KV_LOCAL_VECTORS") or os.path.join(kvstate.STATE, "vectors"),
+                          {"scalar": "int8"}.get(quantization, quantization), rescore, oversampling)
+    raise SystemExit(f"KV_VECTOR_BACKEND must be qdrant or local, not {backend!r}")